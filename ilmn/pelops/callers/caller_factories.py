@@ -1,8 +1,8 @@
 import abc
 import enum
-from typing import FrozenSet, Optional
+from typing import FrozenSet, Optional, Type
 
-from ilmn.pelops import entities, notifications, repositories, selectors
+from ilmn.pelops import entities, notifications, repositories, selectors, stores
 from ilmn.pelops.callers import (
     read_callers,
     rearrangement_callers,
@@ -28,8 +28,14 @@ class CallerType(enum.Enum):
 
 class CallerFeature(enum.Enum):
     WITH_PROVIDED_READ_COUNT = enum.auto()
+    WITH_INDEX_READ_COUNT = enum.auto()
+    WITH_HISTOGRAM_READ_COUNT = enum.auto()
+    WITH_ESTIMATED_READ_COUNT = enum.auto()
+    WITH_METRICS_READ_COUNT = enum.auto()
     WITH_BLACKLIST = enum.auto()
     WITH_NOTIFICATIONS = enum.auto()
+    WITH_SPLIT_FROM_TAGS = enum.auto()
+    WITH_DISCORDANT_INDEX = enum.auto()
 
 
 class CandidateRegionCallerFactory:
@@ -69,6 +75,16 @@ class CandidateRegionCallerFactory:
             result.append(repositories.SegmentRepoFeature.WITH_NOTIFICATION)
         if CallerFeature.WITH_PROVIDED_READ_COUNT in caller_features:
             result.append(repositories.SegmentRepoFeature.BUILTIN)
+        if CallerFeature.WITH_INDEX_READ_COUNT in caller_features:
+            result.append(repositories.SegmentRepoFeature.INDEX_STATISTICS)
+        if CallerFeature.WITH_HISTOGRAM_READ_COUNT in caller_features:
+            result.append(repositories.SegmentRepoFeature.FLAG_HISTOGRAM)
+        if CallerFeature.WITH_ESTIMATED_READ_COUNT in caller_features:
+            result.append(repositories.SegmentRepoFeature.SAMPLING)
+        if CallerFeature.WITH_METRICS_READ_COUNT in caller_features:
+            result.append(repositories.SegmentRepoFeature.METRICS_FILE)
+        if CallerFeature.WITH_DISCORDANT_INDEX in caller_features:
+            result.append(repositories.SegmentRepoFeature.DISCORDANT_INDEX)
         return frozenset(result)
 
     def __get_selector_feature(
@@ -94,6 +110,10 @@ class ReadCallerFactory:
     __converter = {
         CallerFeature.WITH_NOTIFICATIONS: repositories.SegmentRepoFeature.WITH_NOTIFICATION,
         CallerFeature.WITH_PROVIDED_READ_COUNT: repositories.SegmentRepoFeature.BUILTIN,
+        CallerFeature.WITH_INDEX_READ_COUNT: repositories.SegmentRepoFeature.INDEX_STATISTICS,
+        CallerFeature.WITH_HISTOGRAM_READ_COUNT: repositories.SegmentRepoFeature.FLAG_HISTOGRAM,
+        CallerFeature.WITH_ESTIMATED_READ_COUNT: repositories.SegmentRepoFeature.SAMPLING,
+        CallerFeature.WITH_METRICS_READ_COUNT: repositories.SegmentRepoFeature.METRICS_FILE,
     }
     reads_to_exclude = [
         repositories.ReadQuery.is_duplicate,
@@ -123,14 +143,40 @@ class ReadCallerFactory:
             frozenset(repo_features), total_number_of_reads
         )
 
-        result = read_callers.SpanningReadsCaller(
+        if isinstance(segment_repo, repositories.ReadPairRepository):
+            # read pairs are already whole, their partners need not be found
+            result = read_callers.TemplateReadsCaller(
+                segment_repo,
+                reads_to_exclude=self.reads_to_exclude,
+                minimum_mapping_quality=minimum_mapping_quality,
+                store=stores.CompactPairedReadStore(),
+            )
+        else:
+            result = self.__build_spanning_reads_caller(
+                segment_repo, minimum_mapping_quality, features
+            )
+        if CallerFeature.WITH_NOTIFICATIONS in features:
+            notification_service = self.notification_service_factory.build()
+            result = notifications.NotifyReadsCaller(result, notification_service)
+        return result
+
+    def __build_spanning_reads_caller(
+        self,
+        segment_repo: repositories.PlacedSegmentRepository,
+        minimum_mapping_quality: int,
+        features: FrozenSet[CallerFeature],
+    ) -> read_callers.SpanningReadsCaller:
+        caller_class: Type[read_callers.SpanningReadsCaller]
+        if CallerFeature.WITH_SPLIT_FROM_TAGS in features:
+            caller_class = read_callers.TagSpanningReadsCaller
+        else:
+            caller_class = read_callers.BaitSpanningReadsCaller
+        result = caller_class(
             segment_repo,
             reads_to_exclude=self.reads_to_exclude,
             minimum_mapping_quality=minimum_mapping_quality,
+            store=stores.CompactPairedReadStore(),
         )
-        if CallerFeature.WITH_NOTIFICATIONS in features:
-            notification_service = self.notification_service_factory.build()
-            result = notifications.NotifyReadsCaller(result, notification_service)
         return result
 
 
@@ -269,6 +315,14 @@ class RearrangementCallerFactory:
         result = []
         if CallerFeature.WITH_PROVIDED_READ_COUNT in features:
             result.append(repositories.SegmentRepoFeature.BUILTIN)
+        if CallerFeature.WITH_INDEX_READ_COUNT in features:
+            result.append(repositories.SegmentRepoFeature.INDEX_STATISTICS)
+        if CallerFeature.WITH_HISTOGRAM_READ_COUNT in features:
+            result.append(repositories.SegmentRepoFeature.FLAG_HISTOGRAM)
+        if CallerFeature.WITH_ESTIMATED_READ_COUNT in features:
+            result.append(repositories.SegmentRepoFeature.SAMPLING)
+        if CallerFeature.WITH_METRICS_READ_COUNT in features:
+            result.append(repositories.SegmentRepoFeature.METRICS_FILE)
         if CallerFeature.WITH_NOTIFICATIONS in features:
             result.append(repositories.SegmentRepoFeature.WITH_NOTIFICATION)
         return frozenset(result)
@@ -1,8 +1,21 @@
 import abc
-from typing import FrozenSet, Iterable, List
+from typing import (
+    Dict,
+    FrozenSet,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Set,
+    Tuple,
+)
 
 from ilmn.pelops import entities, repositories, stores
 
+# segment counts and segments of the reads spanning a pair of regions
+SpanningEvidence = Tuple[entities.ClassifiedSegmentCount, Set[entities.PlacedSegment]]
+
 
 class ReadsCaller(abc.ABC):
     @abc.abstractmethod
@@ -21,6 +34,19 @@ class ReadsCaller(abc.ABC):
     def get_segments_of_spanning_reads(self) -> Iterable[entities.PlacedSegment]:
         """Retrieve PlacedSegments from reads spanning across the regions"""
 
+    def get_spanning_evidence(
+        self,
+        a_regions: FrozenSet[entities.GenomicRegion],
+        all_b_regions: Sequence[FrozenSet[entities.GenomicRegion]],
+    ) -> Iterator[SpanningEvidence]:
+        """Evidence of the reads spanning regions A and each of `all_b_regions`,
+        in order. Reads are detected one region pair after the other by
+        default"""
+        for b_regions in all_b_regions:
+            self.detect_reads_spanning_regions(a_regions, b_regions)
+            segments = set(self.get_segments_of_spanning_reads())
+            yield self.get_segment_count(), segments
+
 
 class SpanningReadsCaller(ReadsCaller):
     """Find paired or split reads spanning across two regions"""
@@ -30,11 +56,12 @@ class SpanningReadsCaller(ReadsCaller):
         placed_segments_repository: repositories.PlacedSegmentRepository,
         reads_to_exclude: List[repositories.ReadQuery],
         minimum_mapping_quality: int = 0,
+        store: Optional[stores.ReadPairStore] = None,
     ):
         self._placed_segment_repo = placed_segments_repository
         self._reads_to_exclude = reads_to_exclude
         self._minimum_mapping_quality = minimum_mapping_quality
-        self._store = stores.PairedReadStore()
+        self._store = stores.PairedReadStore() if store is None else store
 
     def detect_reads_spanning_regions(
         self,
@@ -46,12 +73,7 @@ class SpanningReadsCaller(ReadsCaller):
         for placed_segment in self._placed_segment_repo.get(
             a_regions, exclude=self._reads_to_exclude, min_quality=0
         ):
-            try:
-                read_pair = self._store.get_read_pair(placed_segment.read_name)
-            except stores.UnknowReadPairError:
-                read_pair = entities.ReadPair()
-            read_pair.allocate(placed_segment)
-            self._store.update(read_pair)
+            self._allocate(placed_segment)
 
         for placed_segment in self._placed_segment_repo.get(
             b_regions,
@@ -63,6 +85,21 @@ class SpanningReadsCaller(ReadsCaller):
                 read_pair.allocate(placed_segment)
                 self._store.update(read_pair)
 
+        self._mark_spanning_reads(a_regions, b_regions)
+
+    def _allocate(self, placed_segment: entities.PlacedSegment) -> None:
+        try:
+            read_pair = self._store.get_read_pair(placed_segment.read_name)
+        except stores.UnknowReadPairError:
+            read_pair = entities.ReadPair()
+        read_pair.allocate(placed_segment)
+        self._store.update(read_pair)
+
+    def _mark_spanning_reads(
+        self,
+        a_regions: FrozenSet[entities.GenomicRegion],
+        b_regions: FrozenSet[entities.GenomicRegion],
+    ) -> None:
         for read_pair in self._store:
             if read_pair.has_split_read_across(a_regions, b_regions):
                 self._store.mark_as_split(read_pair)
@@ -76,6 +113,7 @@ class SpanningReadsCaller(ReadsCaller):
 
     def get_segments_of_spanning_reads(self) -> Iterable[entities.PlacedSegment]:
         """Get PlacedSegment that consititute a spanning ReadPair from all spanning ReadPairs"""
+        without_mate = []
         for read_pair in self._store.get_spanning_reads():
             for segment in read_pair.get_segments():
                 yield segment
@@ -84,6 +122,127 @@ class SpanningReadsCaller(ReadsCaller):
                     # has a split read, and the mate was not retrieved (e.g. is
                     # unmapped, or mapped outside the pair of CompoundRegion, or
                     # did not pass filters...)
-                    mate = self._placed_segment_repo.get_mate(segment)
-                    if mate is not None:
-                        yield mate
+                    without_mate.append(segment)
+        # mates are retrieved at once, which is faster than one by one
+        for mate in self._placed_segment_repo.get_mates(without_mate):
+            if mate is not None:
+                yield mate
+
+
+class BaitSpanningReadsCaller(SpanningReadsCaller):
+    """Find paired or split reads spanning across a bait region and several
+    candidate regions, reading the bait region once.
+
+    The segments of the bait region are indexed by read name, then candidate
+    regions are read in genomic order and their segments are added to the read
+    pairs of the bait with the same name"""
+
+    def get_spanning_evidence(
+        self,
+        a_regions: FrozenSet[entities.GenomicRegion],
+        all_b_regions: Sequence[FrozenSet[entities.GenomicRegion]],
+    ) -> Iterator[SpanningEvidence]:
+        bait: Dict[str, List[entities.PlacedSegment]] = {}
+        for placed_segment in self._placed_segment_repo.get(
+            a_regions, exclude=self._reads_to_exclude, min_quality=0
+        ):
+            bait.setdefault(placed_segment.read_name, []).append(placed_segment)
+
+        order = sorted(
+            range(len(all_b_regions)),
+            key=lambda i: min(
+                ((region.chrom, region.start) for region in all_b_regions[i]),
+                default=("", 0),
+            ),
+        )
+        result: Dict[int, SpanningEvidence] = {}
+        for i in order:
+            result[i] = self._get_evidence_with_bait(bait, a_regions, all_b_regions[i])
+        for i in range(len(all_b_regions)):
+            yield result[i]
+
+    def _get_evidence_with_bait(
+        self,
+        bait: Dict[str, List[entities.PlacedSegment]],
+        a_regions: FrozenSet[entities.GenomicRegion],
+        b_regions: FrozenSet[entities.GenomicRegion],
+    ) -> SpanningEvidence:
+        """Only read pairs with segments in region B can span the regions, so
+        the store holds those alone"""
+        self._store.clear()
+        for placed_segment in self._placed_segment_repo.get(
+            b_regions,
+            exclude=self._reads_to_exclude,
+            min_quality=self._minimum_mapping_quality,
+        ):
+            name = placed_segment.read_name
+            if name not in bait:
+                continue
+            if name not in self._store.get_read_names():
+                for bait_segment in bait[name]:
+                    self._allocate(bait_segment)
+            self._allocate(placed_segment)
+        self._mark_spanning_reads(a_regions, b_regions)
+        segments = set(self.get_segments_of_spanning_reads())
+        return self.get_segment_count(), segments
+
+
+class TemplateReadsCaller(SpanningReadsCaller):
+    """Find paired or split reads spanning across two regions from read pairs
+    the repository builds whole, without looking up read names of region B
+    among those of region A. Mates of split reads come from the same read
+    pair, unmapped ones included"""
+
+    def __init__(
+        self,
+        placed_segments_repository: repositories.ReadPairRepository,
+        reads_to_exclude: List[repositories.ReadQuery],
+        minimum_mapping_quality: int = 0,
+        store: Optional[stores.ReadPairStore] = None,
+    ):
+        super().__init__(
+            placed_segments_repository, reads_to_exclude, minimum_mapping_quality, store
+        )
+        self._read_pair_repo = placed_segments_repository
+
+    def detect_reads_spanning_regions(
+        self,
+        a_regions: FrozenSet[entities.GenomicRegion],
+        b_regions: FrozenSet[entities.GenomicRegion],
+    ) -> None:
+        self._store.clear()
+        for read_pair in self._read_pair_repo.get_read_pairs(
+            a_regions,
+            b_regions,
+            exclude=self._reads_to_exclude,
+            min_quality=0,
+            b_min_quality=self._minimum_mapping_quality,
+        ):
+            self._store.update(read_pair)
+        self._mark_spanning_reads(a_regions, b_regions)
+
+
+class TagSpanningReadsCaller(SpanningReadsCaller):
+    """Find paired or split reads spanning across two regions, reading only the
+    segments of region A.
+
+    The segments of region B are placed from the tags of the segments of region
+    A: the other alignments of a read (SA tag) and its mate (RNEXT, PNEXT, MC
+    and MQ). They are only fetched when exported, see
+    `PlacedSegmentRepository.get_with_partners`"""
+
+    def detect_reads_spanning_regions(
+        self,
+        a_regions: FrozenSet[entities.GenomicRegion],
+        b_regions: FrozenSet[entities.GenomicRegion],
+    ) -> None:
+        self._store.clear()
+        for placed_segment in self._placed_segment_repo.get_with_partners(
+            a_regions,
+            b_regions,
+            exclude=self._reads_to_exclude,
+            min_quality=0,
+            partner_min_quality=self._minimum_mapping_quality,
+        ):
+            self._allocate(placed_segment)
+        self._mark_spanning_reads(a_regions, b_regions)
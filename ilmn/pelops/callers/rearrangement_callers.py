@@ -1,5 +1,6 @@
 import abc
-from typing import Iterable, Sequence, Set, Tuple
+import itertools
+from typing import Iterable, List, Optional, Sequence, Set, Tuple
 
 from ilmn.pelops import entities, repositories, selectors
 from ilmn.pelops.callers import read_callers, region_pair_callers
@@ -10,9 +11,27 @@ class RearrangementCaller(abc.ABC):
     def get_rearrangements(self) -> Iterable[entities.Rearrangement]:
         """Get rearrangement evidence"""
 
+    def collect_evidence(self) -> None:
+        """Collect the reads spanning each region pair ahead of
+        `get_rearrangements`, which then only needs the number of reads to
+        normalise them. Does nothing by default"""
+
+
+# region pair, segment counts and segments of one rearrangement before it is
+# normalised by the number of reads
+RawEvidence = Tuple[
+    entities.CompoundRegionPair,
+    entities.ClassifiedSegmentCount,
+    Set[entities.PlacedSegment],
+]
+
 
 class RegionRearrangementCaller(RearrangementCaller):
-    """Finds rearrangements evidence across a region pairs"""
+    """Finds rearrangements evidence across a region pairs.
+
+    The evidence of all region pairs is collected before the number of reads is
+    requested, so that the reads can be counted concurrently (see
+    `SegmentCounter.start_counting`)"""
 
     def __init__(
         self,
@@ -23,27 +42,33 @@ class RegionRearrangementCaller(RearrangementCaller):
         self._read_caller = read_caller
         self._region_pair_caller = region_pair_caller
         self._reads_counter = reads_counter
+        self._evidence: Optional[List[RawEvidence]] = None
 
     def get_rearrangements(self) -> Iterable[entities.Rearrangement]:
-        region_pairs = self._region_pair_caller.get_compound_region_pairs()
-        for region_pair in region_pairs:
-            yield self._get_one_rearrangement(region_pair)
-
-    def _get_one_rearrangement(
-        self, region_pair: entities.CompoundRegionPair
-    ) -> entities.Rearrangement:
-        self._read_caller.detect_reads_spanning_regions(
-            region_pair.a.regions, region_pair.b.regions
-        )
-        segments = set(self._read_caller.get_segments_of_spanning_reads())
-        counts = self._read_caller.get_segment_count()
-        srpb = (
-            counts.spanning
-            * 1_000_000_000
-            / self._reads_counter.get_number_of_segments()
-        )
-        result = entities.Rearrangement(region_pair, counts, srpb, segments)
-        return result
+        self.collect_evidence()
+        assert self._evidence is not None
+        number_of_reads = self._reads_counter.get_number_of_segments()
+        relative_error = self._reads_counter.get_relative_error()
+        for region_pair, counts, segments in self._evidence:
+            srpb = counts.spanning * 1_000_000_000 / number_of_reads
+            srpb_error = None if relative_error is None else srpb * relative_error
+            yield entities.Rearrangement(
+                region_pair, counts, srpb, segments, srpb_error
+            )
+
+    def collect_evidence(self) -> None:
+        """Region pairs sharing their region A, such as a bait region and its
+        candidates, are given to the read caller at once"""
+        if self._evidence is None:
+            region_pairs = self._region_pair_caller.get_compound_region_pairs()
+            self._evidence = []
+            for a, group in itertools.groupby(region_pairs, key=lambda item: item.a):
+                pairs = list(group)
+                found = self._read_caller.get_spanning_evidence(
+                    a.regions, [pair.b.regions for pair in pairs]
+                )
+                for region_pair, (counts, segments) in zip(pairs, found):
+                    self._evidence.append((region_pair, counts, segments))
 
 
 class MultiRearrangementCaller(RearrangementCaller):
@@ -53,10 +78,15 @@ class MultiRearrangementCaller(RearrangementCaller):
         self._callers = callers
 
     def get_rearrangements(self) -> Iterable[entities.Rearrangement]:
+        self.collect_evidence()
         for caller in self._callers:
             for rearrangement in caller.get_rearrangements():
                 yield rearrangement
 
+    def collect_evidence(self) -> None:
+        for caller in self._callers:
+            caller.collect_evidence()
+
 
 class SelectableRearrangementCaller(RearrangementCaller):
     def __init__(
@@ -70,6 +100,9 @@ class SelectableRearrangementCaller(RearrangementCaller):
             if self._selector(item):
                 yield item
 
+    def collect_evidence(self) -> None:
+        self._caller.collect_evidence()
+
 
 class RearrangementSorter(abc.ABC):
     """Sort Rearrangements"""
@@ -89,3 +122,6 @@ class SortedRearrangementCaller(RearrangementCaller):
     def get_rearrangements(self) -> Iterable[entities.Rearrangement]:
         for rearrangement in self._sorter(self._caller.get_rearrangements()):
             yield rearrangement
+
+    def collect_evidence(self) -> None:
+        self._caller.collect_evidence()
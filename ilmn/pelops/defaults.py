@@ -6,3 +6,5 @@ srpb_threshold = 20.0
 # Minimum mapping quality required outside of DUX4 and IGH regions to be
 # counted as spanning read
 minimum_mapq = 10
+# Memory in MB used to keep the reads of regions queried several times
+segment_cache_size = 512
@@ -1,4 +1,5 @@
 import abc
+import bisect
 import dataclasses
 import enum
 from typing import (
@@ -7,6 +8,7 @@ from typing import (
     FrozenSet,
     Iterable,
     Iterator,
+    List,
     NamedTuple,
     Optional,
     Set,
@@ -75,8 +77,7 @@ class GenomicRegion:
         if not isinstance(other, type(self)) or self.chrom != other.chrom:
             return False
 
-        first, second = sorted([self, other], key=lambda x: x.start)
-        return first.end >= second.start
+        return self.start <= other.end and other.start <= self.end
 
     def within(self, other: object) -> bool:
         """True if self is within other"""
@@ -88,12 +89,54 @@ class GenomicRegion:
         )
 
 
+class RegionIndex:
+    """Regions of each contig sorted by start, with the largest end of the
+    regions up to each of them, so that overlap and containment queries are
+    answered by bisection"""
+
+    def __init__(self, regions: Iterable[GenomicRegion]):
+        by_contig: Dict[str, List[GenomicRegion]] = {}
+        for region in regions:
+            by_contig.setdefault(region.chrom, []).append(region)
+        self._starts: Dict[str, List[int]] = {}
+        self._max_ends: Dict[str, List[int]] = {}
+        for chrom, contig_regions in by_contig.items():
+            contig_regions.sort(key=lambda item: item.start)
+            max_ends = []
+            max_end = contig_regions[0].end
+            for region in contig_regions:
+                max_end = max(max_end, region.end)
+                max_ends.append(max_end)
+            self._starts[chrom] = [region.start for region in contig_regions]
+            self._max_ends[chrom] = max_ends
+
+    def overlaps(self, region: GenomicRegion) -> bool:
+        """True if at least one region overlaps `region`"""
+        max_end = self._get_max_end(region.chrom, region.end)
+        return max_end is not None and max_end >= region.start
+
+    def contains(self, region: GenomicRegion) -> bool:
+        """True if `region` is within one of the regions"""
+        max_end = self._get_max_end(region.chrom, region.start)
+        return max_end is not None and max_end >= region.end
+
+    def _get_max_end(self, chrom: str, position: int) -> Optional[int]:
+        """Largest end of the regions of `chrom` starting at or before
+        `position`, None if there is none"""
+        starts = self._starts.get(chrom)
+        if starts is None:
+            return None
+        i = bisect.bisect_right(starts, position)
+        return self._max_ends[chrom][i - 1] if i else None
+
+
 class CompoundRegion:
     """A named, immutable set of GenomicRegions."""
 
     def __init__(self, name: RegionsName, regions: FrozenSet[GenomicRegion]):
         self._name = name
         self._regions = regions
+        self._index = RegionIndex(regions)
 
     def __eq__(self, other: object) -> bool:
         result = isinstance(other, type(self)) and (
@@ -113,25 +156,22 @@ class CompoundRegion:
         return self._regions
 
     def overlaps(self, other: object) -> bool:
-        """True if at least one region of self overlaps one region of other.
-        Region name is irrelevant"""
-
+        """True if at least one region of self overlaps `other`, a GenomicRegion,
+        or one region of `other`, a CompoundRegion. Region name is irrelevant"""
+        if isinstance(other, GenomicRegion):
+            return self._index.overlaps(other)
         if not isinstance(other, type(self)):
             raise TypeError(
                 f"Incompatible type: expected {type(self)}, got {type(other)}"
             )
 
-        for other_region in other.regions:
-            if any([region.overlaps(other_region) for region in self.regions]):
-                return True
-
-        return False
+        result = any(self._index.overlaps(region) for region in other.regions)
+        return result
 
     def contains(self, other: object) -> bool:
         """True if `other` is within regions of `self`"""
         if isinstance(other, GenomicRegion):
-            is_within_genome = any([other.within(region) for region in self._regions])
-            return is_within_genome
+            return self._index.contains(other)
         raise TypeError(
             f"Incompatible type: expected {type(GenomicRegion)}, got {type(other)}"
         )
@@ -353,3 +393,4 @@ class Rearrangement:
     counts: ClassifiedSegmentCount
     srpb: float
     segments: Set[PlacedSegment]
+    srpb_error: Optional[float] = None  # half-width of the confidence interval
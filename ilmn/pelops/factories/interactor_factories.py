@@ -2,10 +2,16 @@ import enum
 import pathlib
 from typing import List, Optional
 
-from ilmn.pelops import notifications
+from ilmn.pelops import defaults, notifications, repositories
 from ilmn.pelops.callers import caller_factories
-from ilmn.pelops.infrastructure import blacklist_region_repository, pysam_repositories
-from ilmn.pelops.interactors import classify_interactor
+from ilmn.pelops.infrastructure import (
+    alignment_files,
+    blacklist_region_repository,
+    evidence_files,
+    pysam_repositories,
+    streaming_repositories,
+)
+from ilmn.pelops.interactors import classify_interactor, extract_interactor
 from ilmn.pelops.ui.cli.presenters import (
     cli_presenter,
     introspection,
@@ -30,13 +36,39 @@ class InteractorFactory:
         cli_args: Optional[List[str]] = None,
         bedfile: Optional[pathlib.Path] = None,
         silent: bool = False,
+        count_cache_dir: Optional[pathlib.Path] = None,
+        metrics_file: Optional[pathlib.Path] = None,
+        segment_cache_size: int = defaults.segment_cache_size * 1024 * 1024,
+        reference: Optional[pathlib.Path] = None,
+        streaming: bool = False,
+        grouped_by_name: bool = False,
     ) -> classify_interactor.ClassifyInteractor:
+        if reference is not None:
+            alignment_files.use_local_references(reference)
         notification_factory = notifications.SimpleNotificationServiceFactory(
             silent=False
         )
-        segment_repo_factory = pysam_repositories.PysamSegmentRepositoryFactory(
-            bam_file, notification_factory, number_of_threads
-        )
+        segment_repo_factory: repositories.SegmentRepositoryFactory
+        if streaming or grouped_by_name or bam_file == streaming_repositories.STDIN:
+            segment_repo_factory = (
+                streaming_repositories.StreamingSegmentRepositoryFactory(
+                    bam_file,
+                    notification_factory,
+                    number_of_threads,
+                    reference,
+                    grouped_by_name=grouped_by_name,
+                )
+            )
+        else:
+            segment_repo_factory = pysam_repositories.PysamSegmentRepositoryFactory(
+                bam_file,
+                notification_factory,
+                number_of_threads,
+                count_cache_dir,
+                metrics_file,
+                segment_cache_size,
+                reference,
+            )
 
         region_repo_factory = blacklist_region_repository.FileRegionRepositoryFactory(
             bedfile
@@ -60,6 +92,7 @@ class InteractorFactory:
             notification_factory=notification_factory,
             cli_args=cli_args,
             output_dir=output_dir,
+            number_of_threads=number_of_threads,
         )
         presenter = presenter_factory.build_classify_presenter(
             presenter_factories.PresenterType.READ, silent
@@ -68,3 +101,35 @@ class InteractorFactory:
             presenter, caller_factory, segment_repo_factory
         )
         return result
+
+    def build_extract_interactor(
+        self,
+        bam_file: pathlib.Path,
+        evidence_file: pathlib.Path,
+        number_of_threads: int = 1,
+        count_cache_dir: Optional[pathlib.Path] = None,
+        metrics_file: Optional[pathlib.Path] = None,
+        reference: Optional[pathlib.Path] = None,
+    ) -> extract_interactor.ExtractInteractor:
+        if reference is not None:
+            alignment_files.use_local_references(reference)
+        notification_factory = notifications.SimpleNotificationServiceFactory(
+            silent=False
+        )
+        segment_repo_factory = pysam_repositories.PysamSegmentRepositoryFactory(
+            bam_file,
+            notification_factory,
+            number_of_threads,
+            count_cache_dir,
+            metrics_file,
+            reference=reference,
+        )
+        evidence_repo = evidence_files.EvidenceFileWriter(
+            bam_file, evidence_file, number_of_threads, reference
+        )
+        result = extract_interactor.ExtractInteractor(
+            segment_repo_factory,
+            repositories.BuiltinRegionRepository(),
+            evidence_repo,
+        )
+        return result
@@ -0,0 +1,92 @@
+"""Open alignment files with the thread budget and CRAM options of pelops"""
+
+import enum
+import os
+import pathlib
+from typing import Any, List, Optional
+
+import pysam
+
+# where htslib keeps reference sequences downloaded by MD5 when REF_CACHE is unset
+DEFAULT_REF_CACHE = pathlib.Path.home() / ".cache" / "hts-ref" / "%2s" / "%2s" / "%s"
+
+
+class SamField(enum.IntFlag):
+    """Fields of SAM records, as selected by htslib CRAM `required_fields`"""
+
+    QNAME = 0x1
+    FLAG = 0x2
+    RNAME = 0x4
+    POS = 0x8
+    MAPQ = 0x10
+    CIGAR = 0x20
+    RNEXT = 0x40
+    PNEXT = 0x80
+    TLEN = 0x100
+    SEQ = 0x200
+    QUAL = 0x400
+    AUX = 0x800
+    RGAUX = 0x1000
+
+
+# fields used to call rearrangements: sequences and qualities are only decoded
+# when reads are exported
+CALLING_FIELDS = (
+    SamField.QNAME
+    | SamField.FLAG
+    | SamField.RNAME
+    | SamField.POS
+    | SamField.MAPQ
+    | SamField.CIGAR
+    | SamField.RNEXT
+    | SamField.PNEXT
+    | SamField.AUX
+)
+
+
+def use_local_references(reference: pathlib.Path) -> None:
+    """Make htslib look up CRAM reference sequences by MD5 in a local folder
+    only, so that they are never downloaded. `reference` is either a REF_CACHE
+    folder, or a FASTA file in which case the current REF_CACHE is used"""
+    if reference.is_dir():
+        cache = str(reference / "%2s" / "%2s" / "%s")
+        os.environ["REF_CACHE"] = cache
+    else:
+        cache = os.environ.get("REF_CACHE", str(DEFAULT_REF_CACHE))
+    os.environ["REF_PATH"] = cache
+
+
+def get_view_arguments(reference: Optional[pathlib.Path] = None) -> List[str]:
+    """Arguments of `pysam.view` decoding CRAM records against the `reference`
+    FASTA file, if given, as `open_alignment_file` does"""
+    if reference is not None and reference.is_file():
+        return ["-T", str(reference)]
+    return []
+
+
+def open_alignment_file(
+    file_path: pathlib.Path,
+    mode: str = "r",
+    number_of_threads: int = 1,
+    reference: Optional[pathlib.Path] = None,
+    required_fields: Optional[SamField] = None,
+    **kwargs: Any,
+) -> pysam.AlignmentFile:
+    """Open `file_path` with `pysam.AlignmentFile`, compressing or decompressing
+    BGZF blocks and CRAM containers with `number_of_threads` htslib threads.
+
+    pysam does not expose htslib thread pools, so every handle gets its own
+    threads. Handles read one after the other can each be given the whole
+    budget, as idle threads cost next to nothing.
+
+    CRAM records are decoded against the `reference` FASTA file, if given, and
+    only their `required_fields`, if given: other fields are then empty. Both
+    options are ignored for BAM and SAM files"""
+    if reference is not None and reference.is_file():
+        kwargs["reference_filename"] = str(reference)
+    if required_fields is not None:
+        kwargs["format_options"] = [f"required_fields={int(required_fields)}".encode()]
+    result = pysam.AlignmentFile(
+        str(file_path), mode, threads=max(number_of_threads, 1), **kwargs
+    )
+    return result
@@ -0,0 +1,122 @@
+"""Read BAM (BAI) and CRAM (CRAI) index files to locate where data is stored"""
+
+import dataclasses
+import gzip
+import pathlib
+import struct
+from typing import BinaryIO, Dict, List, Tuple
+
+BAI_MAGIC = b"BAI\x01"
+BAI_PSEUDO_BIN = 37450
+BAI_WINDOW_SIZE = 16384
+
+
+class InvalidIndexError(ValueError):
+    def __init__(self, index_file: pathlib.Path, reason: str):
+        message = f"Unable to read index {index_file}: {reason}"
+        super().__init__(message)
+
+
+@dataclasses.dataclass(frozen=True)
+class SamplingUnit:
+    """A 0-based, half-open interval of a contig and the compressed size of
+    the data stored for it in the alignment file"""
+
+    tid: int
+    start: int
+    end: int
+    size: int
+
+
+def _read(fh: BinaryIO, fmt: str) -> Tuple[int, ...]:
+    size = struct.calcsize(fmt)
+    data = fh.read(size)
+    if len(data) != size:
+        raise EOFError()
+    return struct.unpack(fmt, data)
+
+
+def read_bai_sampling_units(index_file: pathlib.Path) -> List[SamplingUnit]:
+    """One unit per 16 kbp window of the linear index. The size of a window is
+    the number of compressed bytes between its first alignment and the first
+    alignment of the next window"""
+    result = []
+    with open(index_file, "rb") as fh:
+        if fh.read(4) != BAI_MAGIC:
+            raise InvalidIndexError(index_file, "not a BAI file")
+        try:
+            (number_of_references,) = _read(fh, "<i")
+            for tid in range(number_of_references):
+                last_offset = 0
+                (number_of_bins,) = _read(fh, "<i")
+                for _ in range(number_of_bins):
+                    bin_id, number_of_chunks = _read(fh, "<Ii")
+                    chunks = _read(fh, f"<{2 * number_of_chunks}Q")
+                    if bin_id == BAI_PSEUDO_BIN:
+                        last_offset = chunks[1]
+                (number_of_intervals,) = _read(fh, "<i")
+                offsets = list(_read(fh, f"<{number_of_intervals}Q"))
+                result.extend(_get_bai_units(tid, offsets, last_offset))
+        except EOFError:
+            raise InvalidIndexError(index_file, "truncated file")
+    return result
+
+
+def _get_bai_units(
+    tid: int, offsets: List[int], last_offset: int
+) -> List[SamplingUnit]:
+    result = []
+    # only the compressed offset (upper 48 bits) of a virtual offset matter
+    boundaries = [offset >> 16 for offset in offsets] + [last_offset >> 16]
+    for i, offset in enumerate(offsets):
+        if offset == 0:
+            continue  # no alignment overlaps this window
+        size = max(boundaries[i + 1] - boundaries[i], 0)
+        start = i * BAI_WINDOW_SIZE
+        result.append(SamplingUnit(tid, start, start + BAI_WINDOW_SIZE, size))
+    return result
+
+
+def read_crai_sampling_units(index_file: pathlib.Path) -> List[SamplingUnit]:
+    """One unit per CRAM slice, spanning from the first alignment of the slice
+    to the first alignment of the next slice on the same contig"""
+    slices: Dict[int, List[Tuple[int, int, int]]] = {}
+    try:
+        with gzip.open(index_file, "rt") as fh:
+            for line in fh:
+                columns = line.split()
+                if len(columns) != 6:
+                    continue
+                tid, start, span, _, _, size = (int(item) for item in columns)
+                if tid >= 0:
+                    # CRAI positions are 1-based
+                    slices.setdefault(tid, []).append((start - 1, span, size))
+    except (OSError, ValueError):
+        raise InvalidIndexError(index_file, "not a CRAI file")
+
+    result = []
+    for tid, contig_slices in sorted(slices.items()):
+        contig_slices.sort()
+        carried_size = 0
+        for i, (start, span, size) in enumerate(contig_slices):
+            if i + 1 < len(contig_slices):
+                end = contig_slices[i + 1][0]
+            else:
+                end = start + span
+            if end > start:
+                result.append(SamplingUnit(tid, start, end, size + carried_size))
+                carried_size = 0
+            else:
+                # slices starting at the same position are merged
+                carried_size += size
+    return result
+
+
+def read_sampling_units(index_file: pathlib.Path) -> List[SamplingUnit]:
+    """Read sampling units from either a BAI or a CRAI file"""
+    if index_file.suffix == ".bai":
+        return read_bai_sampling_units(index_file)
+    elif index_file.suffix == ".crai":
+        return read_crai_sampling_units(index_file)
+    else:
+        raise InvalidIndexError(index_file, "only BAI and CRAI files are supported")
@@ -0,0 +1,69 @@
+"""Count segments in a separate process while other work is carried out"""
+
+import concurrent.futures
+from typing import Dict, FrozenSet, List, Optional, Tuple
+
+from ilmn.pelops import repositories
+
+CountResult = Tuple[int, Optional[float]]
+
+
+def count_with_error(
+    counter: repositories.SegmentCounter,
+    exclude: Optional[List[repositories.ReadQuery]],
+) -> CountResult:
+    """Number of segments and its relative error, run in a worker process"""
+    count = counter.get_number_of_segments(exclude)
+    relative_error = counter.get_relative_error(exclude)
+    return count, relative_error
+
+
+class BackgroundSegmentCounter(repositories.SegmentCounter):
+    """SegmentCounter that counts in a separate process once `start_counting`
+    is called, so the main process is free to do other work until it needs the
+    count. Without `start_counting`, counts are computed in the main process.
+
+    The wrapped counter is pickled to the worker process: state it gathers
+    while counting there is not available in the main process."""
+
+    def __init__(self, counter: repositories.SegmentCounter):
+        self.counter = counter
+        self._futures: Dict[
+            Optional[FrozenSet[repositories.ReadQuery]],
+            "concurrent.futures.Future[CountResult]",
+        ] = {}
+
+    def start_counting(
+        self, exclude: Optional[List[repositories.ReadQuery]] = None
+    ) -> None:
+        key = self._get_key(exclude)
+        if key not in self._futures:
+            executor = concurrent.futures.ProcessPoolExecutor(max_workers=1)
+            self._futures[key] = executor.submit(
+                count_with_error, self.counter, exclude
+            )
+            # the worker completes the submitted count before exiting
+            executor.shutdown(wait=False)
+
+    def get_number_of_segments(
+        self, exclude: Optional[List[repositories.ReadQuery]] = None
+    ) -> int:
+        future = self._futures.get(self._get_key(exclude))
+        if future is None:
+            return self.counter.get_number_of_segments(exclude)
+        count, _ = future.result()
+        return count
+
+    def get_relative_error(
+        self, exclude: Optional[List[repositories.ReadQuery]] = None
+    ) -> Optional[float]:
+        future = self._futures.get(self._get_key(exclude))
+        if future is None:
+            return self.counter.get_relative_error(exclude)
+        _, relative_error = future.result()
+        return relative_error
+
+    def _get_key(
+        self, exclude: Optional[List[repositories.ReadQuery]]
+    ) -> Optional[FrozenSet[repositories.ReadQuery]]:
+        return None if exclude is None else frozenset(exclude)
@@ -0,0 +1,136 @@
+"""Fetch large regions of an alignment file in chunks decoded by worker threads"""
+
+import collections
+import concurrent.futures
+import pathlib
+import threading
+from typing import Deque, Iterator, List, Optional, Sequence, Tuple
+
+import pysam
+
+from ilmn.pelops.infrastructure import alignment_files
+
+# BAI and CSI linear indexes have one entry per window of this many bases
+INDEX_WINDOW = 16384
+
+# contig, start and end of a region
+Span = Tuple[str, int, int]
+# virtual file offset (-1 for CRAM files) and segment
+FetchedSegment = Tuple[int, pysam.AlignedSegment]
+
+
+class ChunkedRegionFetcher:
+    """Fetch the segments of a region in chunks aligned on windows of the
+    index, each decoded by a worker thread with its own handle of the
+    alignment file: htslib reads and decompresses records without holding the
+    GIL, so chunks are decoded in parallel.
+
+    Segments are returned as `pysam.AlignmentFile.fetch` returns them, in file
+    order and each once: a segment belongs to the chunk in which it starts, or
+    to the first chunk when it starts before the region. At most two chunks per
+    thread are decoded ahead of the caller, whichever span they belong to"""
+
+    chunk_size = 4 * INDEX_WINDOW
+
+    def __init__(
+        self,
+        bam_file: pathlib.Path,
+        number_of_threads: int,
+        reference: Optional[pathlib.Path] = None,
+        required_fields: Optional[alignment_files.SamField] = None,
+    ):
+        self._bam_file = bam_file
+        self._number_of_threads = number_of_threads
+        self._reference = reference
+        self._required_fields = required_fields
+        self._handles = threading.local()
+        self._executor: Optional[concurrent.futures.ThreadPoolExecutor] = None
+
+    def get_chunks(self, start: int, end: int) -> List[Tuple[int, int]]:
+        """Start and end of the chunks of `start`-`end`, split on multiples of
+        `chunk_size`"""
+        first_boundary = start - start % self.chunk_size + self.chunk_size
+        boundaries = list(range(first_boundary, end, self.chunk_size))
+        edges = [start] + boundaries + [end]
+        return list(zip(edges[:-1], edges[1:]))
+
+    def fetch(self, spans: Sequence[Span]) -> Iterator[Iterator[FetchedSegment]]:
+        """Segments overlapping each of the `spans`, one iterator per span, to be
+        consumed in order as with `itertools.groupby`"""
+        executor = self._get_executor()
+        tasks = iter(
+            [
+                (number, contig, chunk_start, chunk_end, i == 0)
+                for number, (contig, start, end) in enumerate(spans)
+                for i, (chunk_start, chunk_end) in enumerate(
+                    self.get_chunks(start, end)
+                )
+            ]
+        )
+        pending: Deque[Tuple[int, "concurrent.futures.Future[List[FetchedSegment]]"]]
+        pending = collections.deque()
+
+        def submit() -> None:
+            while len(pending) < 2 * self._number_of_threads:
+                task = next(tasks, None)
+                if task is None:
+                    break
+                number, contig, start, end, is_first = task
+                future = executor.submit(
+                    self._fetch_chunk, contig, start, end, is_first
+                )
+                pending.append((number, future))
+
+        def get_span(number: int) -> Iterator[FetchedSegment]:
+            submit()
+            while pending and pending[0][0] < number:
+                pending.popleft()[1].cancel()  # span that was not consumed
+                submit()
+            while pending and pending[0][0] == number:
+                segments = pending.popleft()[1].result()
+                submit()
+                yield from segments
+
+        for number in range(len(spans)):
+            yield get_span(number)
+
+    def close(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+    def _get_executor(self) -> concurrent.futures.ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = concurrent.futures.ThreadPoolExecutor(
+                self._number_of_threads, thread_name_prefix="pelops-fetch"
+            )
+        return self._executor
+
+    def _get_handle(self) -> pysam.AlignmentFile:
+        """Handle of the current worker thread, opened on first use"""
+        handle: Optional[pysam.AlignmentFile] = getattr(self._handles, "handle", None)
+        if handle is None:
+            handle = alignment_files.open_alignment_file(
+                self._bam_file,
+                "rb",
+                reference=self._reference,
+                required_fields=self._required_fields,
+            )
+            self._handles.handle = handle
+        return handle
+
+    def _fetch_chunk(
+        self, contig: str, start: int, end: int, is_first: bool
+    ) -> List[FetchedSegment]:
+        handle = self._get_handle()
+        is_cram = handle.is_cram
+        result = []
+        segments = handle.fetch(contig, start, end)
+        while True:
+            offset = -1 if is_cram else handle.tell()
+            segment = next(segments, None)
+            if segment is None:
+                break
+            if is_first or segment.reference_start >= start:
+                result.append((offset, segment))
+        return result
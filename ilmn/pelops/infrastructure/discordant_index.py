@@ -0,0 +1,245 @@
+"""Sidecar index of the discordant and split alignments of an alignment file,
+read through a memory map"""
+
+import array
+import bisect
+import json
+import mmap
+import os
+import pathlib
+import struct
+import sys
+import tempfile
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from ilmn.pelops.infrastructure import alignment_files, persistent_segment_counter
+
+MAGIC = b"PELOPSDI"
+VERSION = 1
+# magic, version, length of the JSON description
+PREAMBLE = struct.Struct("<8sII")
+
+# paired, proper pair, duplicate and supplementary SAM flags
+PAIRED = 0x1
+PROPER_PAIR = 0x2
+DUPLICATE = 0x400
+SUPPLEMENTARY = 0x800
+
+# column names and array type codes, largest items first so that every column
+# is aligned in the file
+COLUMNS = [
+    ("pos", "i"),
+    ("end", "i"),
+    ("mate_tid", "i"),
+    ("mate_pos", "i"),
+    ("flag", "H"),
+    ("mapq", "B"),
+]
+
+
+class DiscordantIndexError(ValueError):
+    def __init__(self, bam_file: pathlib.Path, reason: str):
+        message = f"Unable to index discordant reads of {bam_file}: {reason}"
+        super().__init__(message)
+
+
+def is_discordant_or_split(flag: int, has_supplementary_alignment: bool) -> bool:
+    """Alignments of non-proper, non-duplicated read pairs, and split alignments
+    (supplementary ones or with an SA tag)"""
+    result = (
+        flag & (PAIRED | PROPER_PAIR | DUPLICATE) == PAIRED
+        or flag & SUPPLEMENTARY != 0
+        or has_supplementary_alignment
+    )
+    return result
+
+
+class DiscordantIndex:
+    """Columns of the alignments selected by `is_discordant_or_split`, sorted by
+    contig and position. Column `end` is the end of the alignment, one base
+    after its position if it is unmapped, so that ranges are queried as with
+    `pysam.AlignmentFile.fetch`"""
+
+    def __init__(
+        self,
+        contig_offsets: Sequence[int],
+        max_span: int,
+        columns: Dict[str, Sequence[int]],
+    ):
+        self._contig_offsets = contig_offsets
+        self._max_span = max_span
+        self.columns = columns
+
+    def __len__(self) -> int:
+        return self._contig_offsets[-1]
+
+    def get_overlapping(self, tid: int, start: int, end: int) -> List[int]:
+        """Row numbers of alignments on contig `tid` overlapping `start`-`end`
+        (0-based, half open), in file order"""
+        if not 0 <= tid < len(self._contig_offsets) - 1:
+            return []
+        low = self._contig_offsets[tid]
+        high = self._contig_offsets[tid + 1]
+        positions = self.columns["pos"]
+        ends = self.columns["end"]
+        first = bisect.bisect_left(positions, start - self._max_span, low, high)
+        last = bisect.bisect_left(positions, end, first, high)
+        result = [row for row in range(first, last) if ends[row] > start]
+        return result
+
+
+def write_index(
+    index_file: pathlib.Path,
+    description: Dict[str, Any],
+    contig_offsets: Sequence[int],
+    max_span: int,
+    columns: Dict[str, "array.array[int]"],
+) -> None:
+    """Write the index to a temporary file then rename it, so that readers
+    never see a partially written index"""
+    description = dict(
+        description,
+        byteorder=sys.byteorder,
+        contig_offsets=list(contig_offsets),
+        max_span=max_span,
+    )
+    encoded = json.dumps(description).encode()
+    # columns start at a multiple of 8 bytes
+    padding = -(PREAMBLE.size + len(encoded)) % 8
+    file_descriptor, temporary_name = tempfile.mkstemp(
+        dir=index_file.parent, prefix=f".{index_file.name}.", suffix=".tmp"
+    )
+    try:
+        with os.fdopen(file_descriptor, "wb") as fh:
+            fh.write(PREAMBLE.pack(MAGIC, VERSION, len(encoded) + padding))
+            fh.write(encoded + b" " * padding)
+            for name, _ in COLUMNS:
+                columns[name].tofile(fh)
+        os.replace(temporary_name, index_file)
+    except OSError:
+        os.unlink(temporary_name)
+        raise
+
+
+def read_index(
+    index_file: pathlib.Path,
+) -> Optional[Tuple[Dict[str, Any], DiscordantIndex]]:
+    """Description and memory-mapped index of `index_file`, None if it is
+    missing or was written by another version or on another platform"""
+    try:
+        with open(index_file, "rb") as fh:
+            content = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError):
+        return None
+    try:
+        magic, version, length = PREAMBLE.unpack_from(content)
+        description = json.loads(
+            content[PREAMBLE.size : PREAMBLE.size + length].decode()
+        )
+    except (struct.error, ValueError):
+        return None
+    if (
+        magic != MAGIC
+        or version != VERSION
+        or description.get("byteorder") != sys.byteorder
+    ):
+        return None
+    contig_offsets = description["contig_offsets"]
+    number_of_rows = contig_offsets[-1]
+    view = memoryview(content)
+    columns: Dict[str, Sequence[int]] = {}
+    offset = PREAMBLE.size + length
+    for name, typecode in COLUMNS:
+        size = number_of_rows * array.array(typecode).itemsize
+        columns[name] = view[offset : offset + size].cast(typecode)  # type: ignore
+        offset += size
+    if offset != len(content):
+        return None
+    index = DiscordantIndex(contig_offsets, description["max_span"], columns)
+    return description, index
+
+
+class DiscordantIndexFile:
+    """Index of the discordant and split alignments of `bam_file`, built in a
+    single pass over the file the first time it is needed, and saved in
+    `index_file` for later runs as long as the alignment file and its index do
+    not change"""
+
+    def __init__(
+        self,
+        bam_file: pathlib.Path,
+        index_file: pathlib.Path,
+        number_of_threads: int = 1,
+        reference: Optional[pathlib.Path] = None,
+    ):
+        self._bam_file = bam_file
+        self._index_file = index_file
+        self._number_of_threads = number_of_threads
+        self._reference = reference
+        self._index: Optional[DiscordantIndex] = None
+
+    def get(self) -> DiscordantIndex:
+        if self._index is None:
+            self._index = self._load()
+        if self._index is None:
+            self._index = self._build()
+        return self._index
+
+    def _load(self) -> Optional[DiscordantIndex]:
+        content = read_index(self._index_file)
+        if content is None:
+            return None
+        description, index = content
+        fingerprint = persistent_segment_counter.get_alignment_fingerprint(
+            self._bam_file
+        )
+        if description.get("key") != fingerprint:
+            return None
+        return index
+
+    def _build(self) -> DiscordantIndex:
+        columns = {name: array.array(typecode) for name, typecode in COLUMNS}
+        contig_offsets = [0]
+        max_span = 1
+        last_tid = last_pos = 0
+        with alignment_files.open_alignment_file(
+            self._bam_file,
+            "rb",
+            self._number_of_threads,
+            self._reference,
+            required_fields=alignment_files.CALLING_FIELDS,
+        ) as alignment_file:
+            number_of_contigs = alignment_file.nreferences
+            for segment in alignment_file.fetch(until_eof=True):
+                tid = segment.reference_id
+                if tid < 0:
+                    break  # unplaced segments are at the end of the file
+                pos = segment.reference_start
+                if tid < last_tid or (tid == last_tid and pos < last_pos):
+                    raise DiscordantIndexError(self._bam_file, "not sorted")
+                last_tid, last_pos = tid, pos
+                if not is_discordant_or_split(segment.flag, segment.has_tag("SA")):
+                    continue
+                while len(contig_offsets) <= tid:
+                    contig_offsets.append(len(columns["pos"]))
+                end = segment.reference_end or pos + 1
+                max_span = max(max_span, end - pos)
+                columns["pos"].append(pos)
+                columns["end"].append(end)
+                columns["mate_tid"].append(segment.next_reference_id)
+                columns["mate_pos"].append(segment.next_reference_start)
+                columns["flag"].append(segment.flag)
+                columns["mapq"].append(segment.mapping_quality)
+        while len(contig_offsets) <= number_of_contigs:
+            contig_offsets.append(len(columns["pos"]))
+        description = {
+            "key": persistent_segment_counter.get_alignment_fingerprint(self._bam_file)
+        }
+        try:
+            write_index(
+                self._index_file, description, contig_offsets, max_span, columns
+            )
+        except OSError:
+            pass  # the index is built again by the next run
+        result = DiscordantIndex(contig_offsets, max_span, dict(columns))
+        return result
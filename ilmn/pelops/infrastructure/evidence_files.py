@@ -0,0 +1,220 @@
+"""Slim alignment files holding the evidence of a sample: the reads the callers
+can use and the number of reads used for normalisation"""
+
+import dataclasses
+import pathlib
+import re
+from typing import Dict, FrozenSet, Iterable, List, Optional, Set, Tuple
+
+import pysam
+
+from ilmn.pelops import entities, repositories
+from ilmn.pelops.infrastructure import alignment_files, segment_records
+
+# header comment (@CO) storing the number of reads of the original alignment file
+EVIDENCE_COMMENT = re.compile(
+    r"^pelops-evidence unique_mapped_reads=(\d+) relative_error=(\S+) "
+    r"count_mode=(\w+)$"
+)
+
+# contig index and position of an alignment
+Position = Tuple[int, int]
+
+
+class EvidenceFileError(ValueError):
+    def __init__(self, evidence_file: pathlib.Path, reason: str):
+        message = f"Unable to use evidence file {evidence_file}: {reason}"
+        super().__init__(message)
+
+
+@dataclasses.dataclass(frozen=True)
+class EvidenceCount:
+    """Number of primary, mapped, non duplicated and QC-passed segments of the
+    original alignment file, with its relative error and how it was obtained"""
+
+    unique_mapped_reads: int
+    relative_error: Optional[float]
+    count_mode: str
+
+    def to_comment(self) -> str:
+        result = (
+            f"pelops-evidence unique_mapped_reads={self.unique_mapped_reads} "
+            f"relative_error={self.relative_error} count_mode={self.count_mode}"
+        )
+        return result
+
+    @classmethod
+    def from_comment(cls, comment: str) -> Optional["EvidenceCount"]:
+        match = EVIDENCE_COMMENT.match(comment)
+        if match is None:
+            return None
+        count, relative_error, count_mode = match.groups()
+        result = cls(
+            int(count),
+            None if relative_error == "None" else float(relative_error),
+            count_mode,
+        )
+        return result
+
+
+def read_evidence_count(bam_file: pathlib.Path) -> Optional[EvidenceCount]:
+    """Count stored in the header of `bam_file`, None if it is not an evidence
+    file"""
+    with alignment_files.open_alignment_file(bam_file) as alignment_file:
+        comments: List[str] = alignment_file.header.to_dict().get("CO", [])
+    for comment in comments:
+        result = EvidenceCount.from_comment(comment)
+        if result is not None:
+            return result
+    return None
+
+
+def get_partner_positions(segment: pysam.AlignedSegment) -> Set[Position]:
+    """Positions of the mate (RNEXT, PNEXT) and the other alignments (SA tag)
+    of the read pair of `segment`"""
+    result = set()
+    if segment.is_paired and segment.next_reference_id >= 0:
+        result.add((segment.next_reference_id, segment.next_reference_start))
+    if segment.has_tag("SA"):
+        header = segment.header
+        for entry in str(segment.get_tag("SA")).rstrip(";").split(";"):
+            chrom, pos = entry.split(",")[:2]
+            tid = header.get_tid(chrom)
+            if tid >= 0:
+                result.add((tid, int(pos) - 1))
+    return result
+
+
+class EvidenceFileWriter(repositories.EvidenceRepository):
+    """Write the evidence of a sample in an indexed BAM file, with the header of
+    the original alignment file and the number of reads in a comment line.
+
+    Alignments of a read pair are found from its mate position and SA tags,
+    followed until no new alignment is found: secondary alignments outside of
+    the collected locations are not known."""
+
+    # alignments closer than this are fetched at once
+    max_fetch_gap = 1000
+
+    def __init__(
+        self,
+        bam_file: pathlib.Path,
+        evidence_file: pathlib.Path,
+        number_of_threads: int = 1,
+        reference: Optional[pathlib.Path] = None,
+    ):
+        self._bam_file = bam_file
+        self._evidence_file = evidence_file
+        self._number_of_threads = number_of_threads
+        self._reference = reference
+        self._segments: Dict[segment_records.RecordKey, pysam.AlignedSegment] = {}
+
+    def add(self, locations: FrozenSet[entities.GenomicRegion]) -> None:
+        with alignment_files.open_alignment_file(
+            self._bam_file, "rb", self._number_of_threads, self._reference
+        ) as alignment_file:
+            found: List[pysam.AlignedSegment] = []
+            for region in sorted(locations, key=lambda item: (item.chrom, item.start)):
+                found.extend(
+                    alignment_file.fetch(region.chrom, region.start, region.end)
+                )
+            names = {segment.query_name for segment in found}
+            visited: Set[Position] = set()
+            while found:
+                positions = set()
+                for segment in found:
+                    self._segments[self._get_key(segment)] = segment
+                    positions.update(get_partner_positions(segment))
+                positions -= visited
+                visited.update(positions)
+                found = [
+                    segment
+                    for segment in self._fetch_at(alignment_file, positions)
+                    if segment.query_name in names
+                    and self._get_key(segment) not in self._segments
+                ]
+
+    def save(
+        self,
+        number_of_segments: int,
+        relative_error: Optional[float],
+        count_mode: str,
+    ) -> None:
+        count = EvidenceCount(number_of_segments, relative_error, count_mode)
+        with alignment_files.open_alignment_file(self._bam_file) as alignment_file:
+            header = alignment_file.header.to_dict()
+        header.setdefault("CO", []).append(count.to_comment())
+        segments = sorted(
+            self._segments.values(),
+            key=lambda item: (item.reference_id, item.reference_start),
+        )
+        with alignment_files.open_alignment_file(
+            self._evidence_file, "wb", self._number_of_threads, header=header
+        ) as evidence_file:
+            for segment in segments:
+                evidence_file.write(segment)
+        pysam.index(str(self._evidence_file))
+
+    def _get_key(self, segment: pysam.AlignedSegment) -> segment_records.RecordKey:
+        return segment_records.SegmentRecord.from_segment(segment).key
+
+    def _fetch_at(
+        self, alignment_file: pysam.AlignmentFile, positions: Iterable[Position]
+    ) -> Iterable[pysam.AlignedSegment]:
+        """Alignments starting at `positions`, fetched in blocks of close
+        positions"""
+        blocks: List[List[Position]] = []
+        for tid, pos in sorted(positions):
+            if (
+                blocks
+                and blocks[-1][-1][0] == tid
+                and pos <= blocks[-1][-1][1] + self.max_fetch_gap
+            ):
+                blocks[-1].append((tid, pos))
+            else:
+                blocks.append([(tid, pos)])
+        for block in blocks:
+            wanted = set(block)
+            tid = block[0][0]
+            contig = alignment_file.get_reference_name(tid)
+            for segment in alignment_file.fetch(contig, block[0][1], block[-1][1] + 1):
+                if (tid, segment.reference_start) in wanted:
+                    yield segment
+
+
+class EvidenceFileSegmentCounter(repositories.SegmentCounter):
+    """SegmentCounter reading the number of reads of the original alignment file
+    stored in an evidence file"""
+
+    default_filters = {
+        repositories.ReadQuery.is_unmapped,
+        repositories.ReadQuery.is_secondary,
+        repositories.ReadQuery.is_qcfail,
+        repositories.ReadQuery.is_duplicate,
+        repositories.ReadQuery.is_supplementary,
+    }
+
+    def __init__(self, evidence_file: pathlib.Path, count: EvidenceCount):
+        self._evidence_file = evidence_file
+        self._count = count
+
+    def get_number_of_segments(
+        self, exclude: Optional[List[repositories.ReadQuery]] = None
+    ) -> int:
+        self._check(exclude)
+        return self._count.unique_mapped_reads
+
+    def get_relative_error(
+        self, exclude: Optional[List[repositories.ReadQuery]] = None
+    ) -> Optional[float]:
+        self._check(exclude)
+        return self._count.relative_error
+
+    def get_count_mode(self) -> Optional[str]:
+        return self._count.count_mode
+
+    def _check(self, exclude: Optional[List[repositories.ReadQuery]]) -> None:
+        if exclude is not None and set(exclude) != self.default_filters:
+            names = ", ".join(sorted(query.name for query in exclude))
+            reason = f"no count of reads excluding {names}"
+            raise EvidenceFileError(self._evidence_file, reason)
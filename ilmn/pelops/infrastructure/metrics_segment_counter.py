@@ -0,0 +1,257 @@
+"""Number of segments from metrics written by the aligner or samtools"""
+
+import dataclasses
+import pathlib
+import re
+from typing import Dict, FrozenSet, List, Optional, Tuple
+
+import pysam
+
+from ilmn.pelops import repositories
+from ilmn.pelops.infrastructure import alignment_files
+
+DRAGEN_SUMMARY = "MAPPING/ALIGNING SUMMARY"
+DRAGEN_PER_READ_GROUP = "MAPPING/ALIGNING PER RG"
+FLAGSTAT_LINE = re.compile(r"^(\d+) \+ (\d+) ([^(]+)")
+
+
+class MetricsFileError(ValueError):
+    def __init__(self, metrics_file: pathlib.Path, reason: str):
+        message = f"Unable to use metrics file {metrics_file}: {reason}"
+        super().__init__(message)
+
+
+@dataclasses.dataclass(frozen=True)
+class AlignmentMetrics:
+    """What a metrics file tells about the number of primary, mapped, non
+    duplicated and QC-passed segments (between `minimum` and `maximum` when the
+    metrics are not detailed enough) and about the alignment file it describes"""
+
+    minimum: int
+    maximum: int
+    total_records: Optional[int] = None
+    mapped_records: Optional[int] = None
+    read_groups: Optional[FrozenSet[str]] = None
+
+
+def get_bounds(mapped: int, unmapped: int, *excluded: int) -> Tuple[int, int]:
+    """Bounds of the number of `mapped` segments not in any of the `excluded`
+    sets, when `excluded` sets may also contain `unmapped` segments"""
+    minimum = mapped - min(sum(excluded), mapped)
+    maximum = mapped - max(max(excluded, default=0) - unmapped, 0)
+    return minimum, maximum
+
+
+def parse_dragen_mapping_metrics(lines: List[str]) -> AlignmentMetrics:
+    """Parse DRAGEN `*.mapping_metrics.csv`"""
+    summary: Dict[str, str] = {}
+    read_groups = set()
+    for line in lines:
+        columns = line.rstrip("\n").split(",")
+        if len(columns) < 4:
+            continue
+        section, read_group, name, value = columns[:4]
+        if section == DRAGEN_SUMMARY:
+            summary[name] = value
+        elif section == DRAGEN_PER_READ_GROUP:
+            read_groups.add(read_group)
+
+    def get(name: str) -> int:
+        return int(summary[name])
+
+    unique_mapped = get(
+        "Number of unique & mapped reads (excl. duplicate marked reads)"
+    )
+    unmapped = get("Unmapped reads")
+    qc_failed = get("QC-failed reads") if "QC-failed reads" in summary else 0
+    minimum, maximum = get_bounds(unique_mapped, unmapped, qc_failed)
+    mapped_alignments = [
+        "Mapped reads",
+        "Secondary alignments",
+        "Supplementary (chimeric) alignments",
+    ]
+    if all(name in summary for name in mapped_alignments):
+        mapped_records: Optional[int] = sum(get(name) for name in mapped_alignments)
+    else:
+        mapped_records = None
+    result = AlignmentMetrics(
+        minimum,
+        maximum,
+        mapped_records=mapped_records,
+        read_groups=frozenset(read_groups) if read_groups else None,
+    )
+    return result
+
+
+def parse_samtools_flagstat(lines: List[str]) -> AlignmentMetrics:
+    """Parse the default output of `samtools flagstat`. Only QC-passed segments
+    are counted, as flagstat reports QC-failed segments separately"""
+    passed: Dict[str, int] = {}
+    failed: Dict[str, int] = {}
+    for line in lines:
+        match = FLAGSTAT_LINE.match(line)
+        if match:
+            name = match.group(3).strip()
+            passed[name] = int(match.group(1))
+            failed[name] = int(match.group(2))
+
+    if "primary mapped" in passed:
+        mapped = passed["primary mapped"]
+        unmapped = passed["primary"] - mapped
+        duplicates = passed["primary duplicates"]
+    else:
+        # before samtools 1.13, there are no details about primary segments
+        secondary = passed["secondary"] + passed["supplementary"]
+        mapped = passed["mapped"] - secondary
+        unmapped = passed["in total"] - passed["mapped"]
+        duplicates = passed["duplicates"]
+    minimum, maximum = get_bounds(mapped, unmapped, duplicates)
+    result = AlignmentMetrics(
+        minimum,
+        maximum,
+        total_records=passed["in total"] + failed["in total"],
+        mapped_records=passed["mapped"] + failed["mapped"],
+    )
+    return result
+
+
+def parse_samtools_stats(lines: List[str]) -> AlignmentMetrics:
+    """Parse the summary numbers (SN) of `samtools stats`"""
+    summary: Dict[str, int] = {}
+    for line in lines:
+        columns = line.rstrip("\n").split("\t")
+        if columns[0] == "SN" and len(columns) >= 3:
+            name = columns[1].rstrip(":")
+            try:
+                summary[name] = int(columns[2])
+            except ValueError:
+                pass  # not a count
+
+    minimum, maximum = get_bounds(
+        summary["reads mapped"],
+        summary["reads unmapped"],
+        summary["reads duplicated"],
+        summary["reads QC failed"],
+    )
+    secondary = summary["non-primary alignments"] + summary["supplementary alignments"]
+    result = AlignmentMetrics(
+        minimum,
+        maximum,
+        total_records=summary["raw total sequences"] + secondary,
+        mapped_records=summary["reads mapped"] + secondary,
+    )
+    return result
+
+
+def read_metrics(metrics_file: pathlib.Path) -> AlignmentMetrics:
+    """Read DRAGEN mapping metrics, `samtools flagstat` or `samtools stats`"""
+    try:
+        with open(metrics_file, "r") as fh:
+            lines = fh.readlines()
+    except (OSError, UnicodeDecodeError) as error:
+        raise MetricsFileError(metrics_file, str(error))
+
+    if any(line.startswith(DRAGEN_SUMMARY) for line in lines):
+        parser = parse_dragen_mapping_metrics
+    elif any(line.startswith("SN\t") for line in lines):
+        parser = parse_samtools_stats
+    elif any(FLAGSTAT_LINE.match(line) for line in lines):
+        parser = parse_samtools_flagstat
+    else:
+        raise MetricsFileError(metrics_file, "unknown format")
+    try:
+        return parser(lines)
+    except KeyError as error:
+        raise MetricsFileError(metrics_file, f"missing metric {error}")
+    except ValueError as error:
+        raise MetricsFileError(metrics_file, str(error))
+
+
+class MetricsFileSegmentCounter(repositories.SegmentCounter):
+    """SegmentCounter reading the number of primary, mapped, non duplicated and
+    QC-passed segments from metrics of the alignment file, rather than from the
+    alignment file itself.
+
+    The metrics are checked against the index statistics and read groups of
+    the alignment file. Metrics cannot always distinguish mapped from unmapped
+    duplicates: the count is then the middle of the possible range, and the
+    relative error its half-width."""
+
+    def __init__(
+        self,
+        bam_file: pathlib.Path,
+        metrics_file: pathlib.Path,
+        reference: Optional[pathlib.Path] = None,
+    ):
+        self._bam_file = bam_file
+        self._metrics_file = metrics_file
+        self._reference = reference
+        self._metrics: Optional[AlignmentMetrics] = None
+
+    def get_number_of_segments(
+        self, exclude: Optional[List[repositories.ReadQuery]] = None
+    ) -> int:
+        metrics = self._get_metrics(exclude)
+        return (metrics.minimum + metrics.maximum) // 2
+
+    def get_relative_error(
+        self, exclude: Optional[List[repositories.ReadQuery]] = None
+    ) -> Optional[float]:
+        metrics = self._get_metrics(exclude)
+        count = (metrics.minimum + metrics.maximum) // 2
+        if count == 0 or metrics.minimum == metrics.maximum:
+            return None
+        return (metrics.maximum - count) / count
+
+    def _get_metrics(
+        self, exclude: Optional[List[repositories.ReadQuery]]
+    ) -> AlignmentMetrics:
+        default_filters = {
+            repositories.ReadQuery.is_unmapped,
+            repositories.ReadQuery.is_secondary,
+            repositories.ReadQuery.is_qcfail,
+            repositories.ReadQuery.is_duplicate,
+            repositories.ReadQuery.is_supplementary,
+        }
+        if exclude is not None and set(exclude) != default_filters:
+            names = ", ".join(sorted(query.name for query in exclude))
+            reason = f"metrics do not provide counts excluding {names}"
+            raise MetricsFileError(self._metrics_file, reason)
+        if self._metrics is None:
+            metrics = read_metrics(self._metrics_file)
+            self._check(metrics)
+            self._metrics = metrics
+        return self._metrics
+
+    def _check(self, metrics: AlignmentMetrics) -> None:
+        """Raise an error if the metrics do not describe the alignment file"""
+        statistics: str = pysam.idxstats(str(self._bam_file))  # type: ignore
+        mapped = unmapped = 0
+        for line in statistics.splitlines():
+            _, _, contig_mapped, contig_unmapped = line.split("\t")
+            mapped += int(contig_mapped)
+            unmapped += int(contig_unmapped)
+        observed = [
+            ("mapped records", metrics.mapped_records, mapped),
+            ("records", metrics.total_records, mapped + unmapped),
+        ]
+        for name, in_metrics, in_index in observed:
+            if in_metrics is not None and in_metrics != in_index:
+                reason = (
+                    f"{in_metrics} {name} in metrics but {in_index} in the index of "
+                    f"{self._bam_file}"
+                )
+                raise MetricsFileError(self._metrics_file, reason)
+
+        if metrics.read_groups is not None:
+            with alignment_files.open_alignment_file(
+                self._bam_file, reference=self._reference
+            ) as alignment_file:
+                header = alignment_file.header.to_dict()
+            read_groups = frozenset(item["ID"] for item in header.get("RG", []))
+            if read_groups and read_groups != metrics.read_groups:
+                reason = (
+                    f"read groups {', '.join(sorted(metrics.read_groups))} in "
+                    f"metrics but {', '.join(sorted(read_groups))} in {self._bam_file}"
+                )
+                raise MetricsFileError(self._metrics_file, reason)
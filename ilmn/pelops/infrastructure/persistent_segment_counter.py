@@ -0,0 +1,171 @@
+"""Persist the number of segments of an alignment file across runs"""
+
+import hashlib
+import json
+import os
+import pathlib
+import tempfile
+from typing import Any, Dict, List, Optional, Tuple
+
+from ilmn.pelops import repositories
+
+INDEX_EXTENSIONS = (".bai", ".crai", ".csi")
+
+
+def find_index_file(alignment_file: pathlib.Path) -> Optional[pathlib.Path]:
+    """Find the index of a BAM/CRAM file, either `file.bam.bai` or `file.bai`"""
+    for extension in INDEX_EXTENSIONS:
+        for candidate in (
+            alignment_file.with_name(alignment_file.name + extension),
+            alignment_file.with_suffix(extension),
+        ):
+            if candidate.exists():
+                return candidate
+    return None
+
+
+def get_file_fingerprint(file: pathlib.Path) -> Dict[str, Any]:
+    """Identify a file by its location, size and modification time"""
+    status = file.stat()
+    result = {
+        "path": str(file.resolve()),
+        "size": status.st_size,
+        "mtime_ns": status.st_mtime_ns,
+    }
+    return result
+
+
+def get_alignment_fingerprint(alignment_file: pathlib.Path) -> Dict[str, Any]:
+    """Identify a BAM/CRAM file and its index"""
+    index_file = find_index_file(alignment_file)
+    result = {
+        "alignment_file": get_file_fingerprint(alignment_file),
+        "index_file": (
+            None if index_file is None else get_file_fingerprint(index_file)
+        ),
+    }
+    return result
+
+
+def read_json(file: pathlib.Path) -> Any:
+    """Read a JSON file, returning None if it is missing or invalid"""
+    try:
+        with open(file, "r") as fh:
+            return json.load(fh)
+    except (OSError, ValueError):
+        return None
+
+
+def write_json_atomically(file: pathlib.Path, content: Any) -> None:
+    """Write to a temporary file then rename it, so readers never see a
+    partially written file and concurrent writers do not interfere.
+    Failures are silently ignored"""
+    try:
+        file_descriptor, temporary_name = tempfile.mkstemp(
+            dir=file.parent, prefix=f".{file.name}.", suffix=".tmp"
+        )
+    except OSError:
+        return
+    try:
+        with os.fdopen(file_descriptor, "w") as fh:
+            json.dump(content, fh)
+            fh.flush()
+            os.fsync(fh.fileno())
+        os.replace(temporary_name, file)
+    except OSError:
+        try:
+            os.unlink(temporary_name)
+        except OSError:
+            pass
+
+
+class PersistentSegmentCounter(repositories.SegmentCounter):
+    """SegmentCounter that stores its counts in a sidecar file, so a later run on
+    the same alignment file does not need to count again.
+
+    The cache is keyed on the alignment file and its index (path, size and
+    modification time), the counting method and the excluded `ReadQuery`. Each
+    key has its own file, written atomically, so several processes can safely
+    share the same cache directory. Failing to read or write the cache is not
+    an error: counts are then computed as if there was no cache."""
+
+    def __init__(
+        self,
+        counter: repositories.SegmentCounter,
+        alignment_file: pathlib.Path,
+        cache_dir: pathlib.Path,
+        counting_method: str,
+    ):
+        self._counter = counter
+        self._alignment_file = alignment_file
+        self._cache_dir = cache_dir
+        self._counting_method = counting_method
+
+    def get_number_of_segments(
+        self, exclude: Optional[List[repositories.ReadQuery]] = None
+    ) -> int:
+        count, _ = self._get_cached_entry(exclude)
+        return count
+
+    def get_relative_error(
+        self, exclude: Optional[List[repositories.ReadQuery]] = None
+    ) -> Optional[float]:
+        _, relative_error = self._get_cached_entry(exclude)
+        return relative_error
+
+    def _get_cached_entry(
+        self, exclude: Optional[List[repositories.ReadQuery]]
+    ) -> Tuple[int, Optional[float]]:
+        """Get count and relative error, from the cache if possible"""
+        key = self._get_key(exclude)
+        cache_file = self._get_cache_file(key)
+        result = self._read(cache_file, key)
+        if result is None:
+            count = self._counter.get_number_of_segments(exclude)
+            relative_error = self._counter.get_relative_error(exclude)
+            result = count, relative_error
+            self._write(cache_file, key, count, relative_error)
+        return result
+
+    def _get_key(
+        self, exclude: Optional[List[repositories.ReadQuery]]
+    ) -> Dict[str, Any]:
+        if exclude is None:
+            excluded_queries = None
+        else:
+            excluded_queries = sorted(set(query.name for query in exclude))
+        result = get_alignment_fingerprint(self._alignment_file)
+        result["counting_method"] = self._counting_method
+        result["exclude"] = excluded_queries
+        return result
+
+    def _get_cache_file(self, key: Dict[str, Any]) -> pathlib.Path:
+        serialised_key = json.dumps(key, sort_keys=True).encode()
+        digest = hashlib.sha256(serialised_key).hexdigest()[:16]
+        file_name = f"{self._alignment_file.name}.pelops-count-{digest}.json"
+        return self._cache_dir / file_name
+
+    def _read(
+        self, cache_file: pathlib.Path, key: Dict[str, Any]
+    ) -> Optional[Tuple[int, Optional[float]]]:
+        content = read_json(cache_file)
+        # the file name is a truncated hash, so we check the full key
+        if not isinstance(content, dict) or content.get("key") != key:
+            return None
+        count = content.get("count")
+        relative_error = content.get("relative_error")
+        if not isinstance(count, int):
+            return None
+        if not (relative_error is None or isinstance(relative_error, (int, float))):
+            return None
+        return count, relative_error
+
+    def _write(
+        self,
+        cache_file: pathlib.Path,
+        key: Dict[str, Any],
+        count: int,
+        relative_error: Optional[float],
+    ) -> None:
+        content = {"key": key, "count": count, "relative_error": relative_error}
+        write_json_atomically(cache_file, content)
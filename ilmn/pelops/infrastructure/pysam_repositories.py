@@ -1,14 +1,44 @@
 # mypy: no_warn_unused_ignores
 import abc
+import collections
+import concurrent.futures
 import enum
 import functools
+import itertools
+import math
 import pathlib
-from typing import FrozenSet, Iterable, Iterator, List, Optional, Tuple
+import random
+import re
+import statistics
+from typing import (
+    Any,
+    Container,
+    Dict,
+    FrozenSet,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+)
 
 import pysam
 
-from ilmn.pelops import entities, notifications, repositories
+from ilmn.pelops import defaults, entities, notifications, repositories
 from ilmn.pelops.callers import caller_factories
+from ilmn.pelops.infrastructure import (
+    alignment_files,
+    alignment_index,
+    background_segment_counter,
+    chunked_fetch,
+    discordant_index,
+    evidence_files,
+    metrics_segment_counter,
+    persistent_segment_counter,
+    segment_cache,
+    segment_records,
+)
 
 
 class SamFlag(enum.IntEnum):
@@ -115,6 +145,52 @@ class MapQSelector(SegmentSelector):
         return result
 
 
+# a segment is selected by a query if its flag bit is set (or unset)
+QUERY_FLAGS = {
+    repositories.ReadQuery.is_duplicate: (SamFlag.is_duplicate, True),
+    repositories.ReadQuery.is_not_paired: (SamFlag.is_paired, False),
+    repositories.ReadQuery.is_proper_pair: (SamFlag.is_proper_pair, True),
+    repositories.ReadQuery.is_not_proper_pair: (SamFlag.is_proper_pair, False),
+    repositories.ReadQuery.is_qcfail: (SamFlag.is_qcfail, True),
+    repositories.ReadQuery.is_secondary: (SamFlag.is_secondary, True),
+    repositories.ReadQuery.is_supplementary: (SamFlag.is_supplementary, True),
+    repositories.ReadQuery.is_unmapped: (SamFlag.is_unmapped, True),
+}
+
+
+class SegmentFilter(SegmentSelector):
+    """Keep segments selected by none of the `exclude` queries and with at
+    least `min_quality`, as `AnySegmentSelector` and `MapQSelector` combined.
+
+    The queries are compiled once into two bit masks on the SAM flag: the
+    bits which must be unset (`excluded_flags`) and the bits which must be set
+    (`required_flags`), so each segment is tested with integer operations only"""
+
+    def __init__(self, exclude: Iterable[repositories.ReadQuery], min_quality: int = 0):
+        self.excluded_flags = 0
+        self.required_flags = 0
+        for query in exclude:
+            flag, is_set = QUERY_FLAGS[query]
+            if is_set:
+                self.excluded_flags |= flag
+            else:
+                self.required_flags |= flag
+        self.min_quality = min_quality
+
+    def __call__(self, segment: pysam.AlignedSegment) -> bool:
+        return self.matches(segment.flag, segment.mapping_quality)
+
+    def matches(self, flag: int, mapping_quality: int) -> bool:
+        """Test the SAM flag and mapping quality of a segment, which may be
+        known without the segment itself"""
+        result = (
+            not flag & self.excluded_flags
+            and flag & self.required_flags == self.required_flags
+            and mapping_quality >= self.min_quality
+        )
+        return result
+
+
 class BamFileSegmentCounter(repositories.SegmentCounter):
     default_filters = [
         repositories.ReadQuery.is_unmapped,
@@ -133,89 +209,606 @@ class BamFileSegmentCounter(repositories.SegmentCounter):
         repositories.ReadQuery.is_proper_pair: SamFlag.is_proper_pair,
     }
 
-    def __init__(self, bam_file: pathlib.Path, number_of_threads: int = 1):
+    def __init__(
+        self,
+        bam_file: pathlib.Path,
+        number_of_threads: int = 1,
+        reference: Optional[pathlib.Path] = None,
+    ):
         self._bam_file = bam_file
         self._number_of_threads = number_of_threads
+        self._reference = reference
 
     def get_number_of_segments(
         self, exclude: Optional[List[repositories.ReadQuery]] = None
     ) -> int:
-        if exclude is None:
-            exclude = self.default_filters
-        samflags = [self.lookup[read_query] for read_query in exclude]
-        exclude_flag = sum(samflags)
-
+        exclude_flag = self._get_exclude_flag(exclude)
         count: str = pysam.view(  # type: ignore
             "-@",
             f"{self._number_of_threads}",
             "--count",
             "--exclude-flag",
             f"{exclude_flag}",
+            *alignment_files.get_view_arguments(self._reference),
             str(self._bam_file),
         )
         return int(count.strip())
 
+    def _get_exclude_flag(
+        self, exclude: Optional[List[repositories.ReadQuery]] = None
+    ) -> int:
+        if exclude is None:
+            exclude = self.default_filters
+        samflags = [self.lookup[read_query] for read_query in exclude]
+        return sum(samflags)
 
-class PysamMateFinder:
-    """Search for mate reads"""
 
-    def __init__(self, bam_file: pysam.AlignmentFile):
+def count_segments_in_contig(
+    bam_file: str,
+    exclude_flag: int,
+    contig: str,
+    reference: Optional[pathlib.Path] = None,
+) -> int:
+    """Count segments of one contig. Defined at module level, so it can be
+    sent to worker processes"""
+    if ":" in contig:
+        # protect contig names such as HLA alleles from region parsing
+        contig = "{" + contig + "}"
+    count: str = pysam.view(  # type: ignore
+        "--count",
+        "--exclude-flag",
+        f"{exclude_flag}",
+        *alignment_files.get_view_arguments(reference),
+        bam_file,
+        contig,
+    )
+    return int(count.strip())
+
+
+class ParallelBamFileSegmentCounter(BamFileSegmentCounter):
+    """Count segments contig by contig in a pool of processes, then sum them.
+
+    Contigs are scheduled from the most to the least populated according to
+    the index statistics, and empty contigs are skipped. Unplaced unmapped
+    segments are counted with the special contig `*`, so the result is the
+    same as `BamFileSegmentCounter`."""
+
+    def get_number_of_segments(
+        self, exclude: Optional[List[repositories.ReadQuery]] = None
+    ) -> int:
+        exclude_flag = self._get_exclude_flag(exclude)
+        contigs = get_populated_contigs(self._bam_file)
+        with concurrent.futures.ProcessPoolExecutor(
+            max_workers=self._number_of_threads
+        ) as executor:
+            counts = executor.map(
+                count_segments_in_contig,
+                itertools.repeat(str(self._bam_file)),
+                itertools.repeat(exclude_flag),
+                contigs,
+                itertools.repeat(self._reference),
+            )
+            return sum(counts)
+
+
+def get_populated_contigs(bam_file: pathlib.Path) -> List[str]:
+    """Contigs with at least one segment according to the index, sorted on
+    decreasing number of segments. Unplaced segments are in contig `*`"""
+    statistics: str = pysam.idxstats(str(bam_file))  # type: ignore
+    populated = []
+    for line in statistics.splitlines():
+        contig, _, mapped, unmapped = line.split("\t")
+        number_of_segments = int(mapped) + int(unmapped)
+        if number_of_segments > 0:
+            populated.append((number_of_segments, contig))
+    populated.sort(reverse=True)
+    return [contig for _, contig in populated]
+
+
+class SamFlagHistogram:
+    """Number of segments by SAM flag, mapping quality bin and contig.
+
+    Any combination of `ReadQuery` to exclude and any minimum mapping quality
+    multiple of the bin size can be answered without reading the file again."""
+
+    query_lookup = QUERY_FLAGS
+
+    def __init__(self, mapq_bin_size: int = 1):
+        if mapq_bin_size < 1:
+            raise ValueError("mapq_bin_size must be a positive integer")
+        self._mapq_bin_size = mapq_bin_size
+        self._counts: Dict[Tuple[int, int, str], int] = collections.Counter()
+
+    def __eq__(self, other: object) -> bool:
+        result = isinstance(other, type(self)) and (
+            self.mapq_bin_size == other.mapq_bin_size and self._counts == other._counts
+        )
+        return result
+
+    @property
+    def mapq_bin_size(self) -> int:
+        return self._mapq_bin_size
+
+    def add(self, flag: int, mapping_quality: int, contig: str, count: int = 1) -> None:
+        mapq_bin = mapping_quality - mapping_quality % self._mapq_bin_size
+        self._counts[(flag, mapq_bin, contig)] += count
+
+    def update(self, other: "SamFlagHistogram") -> None:
+        """Add all the counts of another histogram"""
+        if other.mapq_bin_size != self._mapq_bin_size:
+            raise ValueError("Unable to merge histograms with different bin sizes")
+        for key, count in other._counts.items():
+            self._counts[key] += count
+
+    def count(
+        self,
+        exclude: Iterable[repositories.ReadQuery],
+        minimum_mapping_quality: int = 0,
+        contigs: Optional[Container[str]] = None,
+    ) -> int:
+        """Count segments not selected by any of the `exclude` queries, with at
+        least `minimum_mapping_quality` and optionally placed in `contigs`"""
+        if minimum_mapping_quality % self._mapq_bin_size:
+            raise ValueError(
+                f"Minimum mapping quality {minimum_mapping_quality} is not a "
+                f"multiple of the bin size {self._mapq_bin_size}"
+            )
+        is_kept = self.get_kept_flags(exclude)
+        result = 0
+        for (flag, mapq_bin, contig), count in self._counts.items():
+            if (
+                is_kept[flag]
+                and mapq_bin >= minimum_mapping_quality
+                and (contigs is None or contig in contigs)
+            ):
+                result += count
+        return result
+
+    @classmethod
+    def get_kept_flags(cls, exclude: Iterable[repositories.ReadQuery]) -> List[bool]:
+        """For each of the 4096 possible SAM flags, True if a segment with that
+        flag is not selected by any of the `exclude` queries"""
+        queries = [cls.query_lookup[query] for query in exclude]
+        result = [
+            not any(bool(flag & bit) == is_set for bit, is_set in queries)
+            for flag in range(4096)
+        ]
+        return result
+
+    def to_dict(self) -> Dict[str, Any]:
+        counts = [[*key, count] for key, count in sorted(self._counts.items())]
+        return {"mapq_bin_size": self._mapq_bin_size, "counts": counts}
+
+    @classmethod
+    def from_dict(cls, content: Dict[str, Any]) -> "SamFlagHistogram":
+        result = cls(int(content["mapq_bin_size"]))
+        for flag, mapq_bin, contig, count in content["counts"]:
+            result._counts[(int(flag), int(mapq_bin), str(contig))] += int(count)
+        return result
+
+
+def build_contig_histogram(
+    bam_file: str,
+    mapq_bin_size: int,
+    contig: str,
+    reference: Optional[pathlib.Path] = None,
+) -> SamFlagHistogram:
+    """Histogram of the segments of one contig. Defined at module level, so it
+    can be sent to worker processes"""
+    counts: Dict[Tuple[int, int], int] = collections.Counter()
+    with alignment_files.open_alignment_file(
+        pathlib.Path(bam_file), reference=reference
+    ) as alignment_file:
+        for segment in alignment_file.fetch(contig=contig):
+            counts[(segment.flag, segment.mapping_quality)] += 1
+    result = SamFlagHistogram(mapq_bin_size)
+    for (flag, mapping_quality), count in counts.items():
+        result.add(flag, mapping_quality, contig, count)
+    return result
+
+
+class FlagHistogramSegmentCounter(repositories.SegmentCounter):
+    """Count segments from a `SamFlagHistogram` built with a single pass on the
+    file, split by contig over `number_of_threads` processes.
+
+    If `histogram_file` is given, the histogram is saved there together with
+    the fingerprint of the alignment file, and reused as long as the alignment
+    file and its index do not change."""
+
+    def __init__(
+        self,
+        bam_file: pathlib.Path,
+        number_of_threads: int = 1,
+        histogram_file: Optional[pathlib.Path] = None,
+        mapq_bin_size: int = 1,
+        reference: Optional[pathlib.Path] = None,
+    ):
         self._bam_file = bam_file
+        self._number_of_threads = number_of_threads
+        self._histogram_file = histogram_file
+        self._mapq_bin_size = mapq_bin_size
+        self._reference = reference
+        self._histogram: Optional[SamFlagHistogram] = None
 
-    def get_mate(self, read: pysam.AlignedSegment) -> Optional[pysam.AlignedSegment]:
-        if read.is_supplementary:
-            result = None
+    def get_number_of_segments(
+        self, exclude: Optional[List[repositories.ReadQuery]] = None
+    ) -> int:
+        if exclude is None:
+            exclude = BamFileSegmentCounter.default_filters
+        return self.get_histogram().count(exclude)
+
+    def get_histogram(self) -> SamFlagHistogram:
+        if self._histogram is None:
+            self._histogram = self._load_histogram()
+        if self._histogram is None:
+            self._histogram = self._build_histogram()
+            self._save_histogram(self._histogram)
+        return self._histogram
+
+    def _build_histogram(self) -> SamFlagHistogram:
+        contigs = get_populated_contigs(self._bam_file)
+        arguments = (
+            itertools.repeat(str(self._bam_file)),
+            itertools.repeat(self._mapq_bin_size),
+            contigs,
+            itertools.repeat(self._reference),
+        )
+        result = SamFlagHistogram(self._mapq_bin_size)
+        if self._number_of_threads > 1:
+            with concurrent.futures.ProcessPoolExecutor(
+                max_workers=self._number_of_threads
+            ) as executor:
+                for histogram in executor.map(build_contig_histogram, *arguments):
+                    result.update(histogram)
         else:
-            try:
-                result = self._bam_file.mate(read)
-            except ValueError as exc:
-                result = self._get_unmapped_mate(read)
+            for histogram in map(build_contig_histogram, *arguments):
+                result.update(histogram)
         return result
 
-    def _get_unmapped_mate(
-        self, read: pysam.AlignedSegment
-    ) -> Optional[pysam.AlignedSegment]:
-        possible_mates = list(self._get_read_from_mate_position(read))
-        if len(possible_mates) == 1:
-            return possible_mates[0]
-        else:
-            # this is unexpected, but we silently carry on
+    def _load_histogram(self) -> Optional[SamFlagHistogram]:
+        if self._histogram_file is None:
+            return None
+        content = persistent_segment_counter.read_json(self._histogram_file)
+        fingerprint = persistent_segment_counter.get_alignment_fingerprint(
+            self._bam_file
+        )
+        if (
+            not isinstance(content, dict)
+            or content.get("key") != fingerprint
+            or content.get("histogram", {}).get("mapq_bin_size") != self._mapq_bin_size
+        ):
             return None
+        return SamFlagHistogram.from_dict(content["histogram"])
+
+    def _save_histogram(self, histogram: SamFlagHistogram) -> None:
+        if self._histogram_file is not None:
+            fingerprint = persistent_segment_counter.get_alignment_fingerprint(
+                self._bam_file
+            )
+            content = {"key": fingerprint, "histogram": histogram.to_dict()}
+            persistent_segment_counter.write_json_atomically(
+                self._histogram_file, content
+            )
+
+
+class IndexSegmentCounter(repositories.SegmentCounter):
+    """Count segments from the BAM/CRAM index statistics (as `samtools idxstats`)
+
+    The index only distinguishes mapped from unmapped segments, so the count is
+    an upper bound of the one computed by `BamFileSegmentCounter`: secondary,
+    supplementary, duplicated and QC-failed segments cannot be excluded."""
+
+    def __init__(self, bam_file: pathlib.Path):
+        self._bam_file = bam_file
+
+    def get_number_of_segments(
+        self, exclude: Optional[List[repositories.ReadQuery]] = None
+    ) -> int:
+        if exclude is None:
+            exclude = BamFileSegmentCounter.default_filters
+        mapped, unmapped = self._get_index_statistics()
+        if repositories.ReadQuery.is_unmapped in exclude:
+            return mapped
+        return mapped + unmapped
+
+    def _get_index_statistics(self) -> Tuple[int, int]:
+        """Total number of mapped and unmapped segments listed in the index"""
+        statistics: str = pysam.idxstats(str(self._bam_file))  # type: ignore
+        mapped = unmapped = 0
+        for line in statistics.splitlines():
+            columns = line.split("\t")
+            if len(columns) == 4:
+                mapped += int(columns[2])
+                unmapped += int(columns[3])
+        return mapped, unmapped
+
+
+class EstimationError(ValueError):
+    def __init__(self, bam_file: pathlib.Path, reason: str):
+        message = f"Unable to estimate number of segments of {bam_file}: {reason}"
+        super().__init__(message)
+
+
+class SampledSegmentCounter(repositories.SegmentCounter):
+    """Estimate the number of segments from a random sample of the file.
+
+    Sampling units are the regions listed in the index (16 kbp windows for BAM,
+    slices for CRAM), drawn with probability proportional to their compressed
+    size. The fraction of segments passing the filters in the sample is scaled
+    by the number of placed segments in the index statistics. Unplaced segments
+    are all unmapped, so they are only added when unmapped are not excluded."""
+
+    confidence_z = 1.96  # 95% confidence interval
+
+    def __init__(
+        self,
+        bam_file: pathlib.Path,
+        number_of_samples: int = 1000,
+        seed: int = 0,
+        reference: Optional[pathlib.Path] = None,
+    ):
+        self._bam_file = bam_file
+        self._number_of_samples = number_of_samples
+        self._seed = seed
+        self._reference = reference
+        self._samples: Optional[List[Tuple[float, Dict[int, int]]]] = None
+        self._estimates: Dict[FrozenSet[repositories.ReadQuery], Tuple[int, float]]
+        self._estimates = {}
+
+    def get_number_of_segments(
+        self, exclude: Optional[List[repositories.ReadQuery]] = None
+    ) -> int:
+        count, _ = self._estimate(exclude)
+        return count
+
+    def get_relative_error(
+        self, exclude: Optional[List[repositories.ReadQuery]] = None
+    ) -> Optional[float]:
+        _, relative_error = self._estimate(exclude)
+        return relative_error
 
-    def _get_read_from_mate_position(
-        self, read: pysam.AlignedSegment
-    ) -> Iterator[pysam.AlignedSegment]:
-        mate_start = read.next_reference_start
-        mate_end = read.next_reference_start + 1
-        mate_name = read.next_reference_name
-        for candidate in self._bam_file.fetch(
-            start=mate_start, stop=mate_end, contig=mate_name, until_eof=True
+    def _estimate(
+        self, exclude: Optional[List[repositories.ReadQuery]]
+    ) -> Tuple[int, float]:
+        if exclude is None:
+            exclude = BamFileSegmentCounter.default_filters
+        key = frozenset(exclude)
+        if key not in self._estimates:
+            self._estimates[key] = self._compute_estimate(exclude)
+        return self._estimates[key]
+
+    def _compute_estimate(
+        self, exclude: List[repositories.ReadQuery]
+    ) -> Tuple[int, float]:
+        """Ratio of Hansen-Hurwitz estimators of the number of kept and total
+        segments, with its variance from the delta method"""
+        placed, unplaced = self._get_placed_and_unplaced()
+        if repositories.ReadQuery.is_unmapped in exclude:
+            unplaced = 0
+        if placed == 0:
+            return unplaced, 0.0
+
+        is_kept = SamFlagHistogram.get_kept_flags(exclude)
+        weighted_kept, weighted_total = [], []
+        for weight, flag_counts in self._get_samples():
+            kept = sum(count for flag, count in flag_counts.items() if is_kept[flag])
+            weighted_kept.append(kept / weight)
+            weighted_total.append(sum(flag_counts.values()) / weight)
+        mean_total = statistics.mean(weighted_total)
+        if mean_total == 0:
+            raise EstimationError(self._bam_file, "no segment was sampled")
+        fraction = statistics.mean(weighted_kept) / mean_total
+        residuals = [
+            kept - fraction * total
+            for kept, total in zip(weighted_kept, weighted_total)
+        ]
+        if len(residuals) > 1:
+            variance = statistics.variance(residuals) / len(residuals)
+        else:
+            variance = 0.0
+        fraction_error = self.confidence_z * math.sqrt(variance) / mean_total
+
+        count = round(placed * fraction) + unplaced
+        if count == 0:
+            return 0, 0.0
+        relative_error = placed * fraction_error / count
+        return count, relative_error
+
+    def _get_placed_and_unplaced(self) -> Tuple[int, int]:
+        statistics_: str = pysam.idxstats(str(self._bam_file))  # type: ignore
+        placed = unplaced = 0
+        for line in statistics_.splitlines():
+            contig, _, mapped, unmapped = line.split("\t")
+            if contig == "*":
+                unplaced += int(mapped) + int(unmapped)
+            else:
+                placed += int(mapped) + int(unmapped)
+        return placed, unplaced
+
+    def _get_samples(self) -> List[Tuple[float, Dict[int, int]]]:
+        """Draw sampling units with replacement, returning their sampling
+        weight and the number of segments starting in them by SAM flag"""
+        if self._samples is None:
+            index_file = persistent_segment_counter.find_index_file(self._bam_file)
+            if index_file is None:
+                raise EstimationError(self._bam_file, "index file not found")
+            units = alignment_index.read_sampling_units(index_file)
+            if not units:
+                raise EstimationError(self._bam_file, "index lists no data")
+            # every unit can be drawn, even if its data shares a compressed block
+            weights = [unit.size + 1 for unit in units]
+            generator = random.Random(self._seed)
+            drawn = generator.choices(
+                range(len(units)), weights=weights, k=self._number_of_samples
+            )
+            flag_counts: Dict[int, Dict[int, int]] = {}
+            with alignment_files.open_alignment_file(
+                self._bam_file, reference=self._reference
+            ) as alignment_file:
+                for i in sorted(set(drawn)):
+                    flag_counts[i] = self._count_flags(alignment_file, units[i])
+            self._samples = [(weights[i], flag_counts[i]) for i in drawn]
+        return self._samples
+
+    def _count_flags(
+        self, alignment_file: pysam.AlignmentFile, unit: alignment_index.SamplingUnit
+    ) -> Dict[int, int]:
+        """Count segments starting within the sampling unit by SAM flag"""
+        result: Dict[int, int] = collections.Counter()
+        contig = alignment_file.get_reference_name(unit.tid)
+        for segment in alignment_file.fetch(
+            contig=contig, start=unit.start, stop=unit.end
         ):
-            if self._is_mate(read, candidate):
-                yield candidate
+            if unit.start <= segment.reference_start < unit.end:
+                result[segment.flag] += 1
+        return result
 
-    def _is_mate(
-        self, given: pysam.AlignedSegment, candidate: pysam.AlignedSegment
-    ) -> bool:
-        result = (
-            (candidate.query_name == given.query_name)
-            and (given.is_read1 != candidate.is_read1)
-            and not candidate.is_supplementary
-        )
+
+class PysamMateFinder:
+    """Search for mate reads.
+
+    Mates are looked up in batches: the mate positions are sorted in file
+    order, and positions close to each other are read with a single fetch, so
+    the file is read sequentially rather than with a random access per read"""
+
+    # mate positions closer than this are fetched at once
+    max_fetch_gap = 1000
+
+    def __init__(self, bam_file: pysam.AlignmentFile):
+        self._bam_file = bam_file
+
+    def get_mate(self, read: pysam.AlignedSegment) -> Optional[pysam.AlignedSegment]:
+        record = segment_records.SegmentRecord.from_segment(read)
+        return self.get_mates([record])[0]
+
+    def get_mates(
+        self, records: Sequence[segment_records.SegmentRecord]
+    ) -> List[Optional[pysam.AlignedSegment]]:
+        """Mates of `records`, in the same order. The mate is None for
+        supplementary segments, and when it is not found at the mate position or
+        is ambiguous"""
+        wanted = {}
+        for record in records:
+            key = self._get_mate_key(record)
+            if key is not None:
+                wanted[key] = (record.mate_tid, record.mate_pos)
+        found: Dict[Tuple[str, bool, int, int], List[pysam.AlignedSegment]]
+        found = collections.defaultdict(list)
+        not_primary = SamFlag.is_secondary | SamFlag.is_supplementary
+        for tid, start, end in self._get_fetch_blocks(wanted.values()):
+            contig = self._bam_file.get_reference_name(tid)
+            for candidate in self._bam_file.fetch(contig, start, end):
+                if candidate.flag & not_primary or candidate.reference_start < start:
+                    continue
+                key = (
+                    str(candidate.query_name),
+                    candidate.is_read1,
+                    tid,
+                    candidate.reference_start,
+                )
+                if key in wanted:
+                    found[key].append(candidate)
+
+        result: List[Optional[pysam.AlignedSegment]] = []
+        for record in records:
+            key = self._get_mate_key(record)
+            possible_mates = found.get(key, []) if key is not None else []
+            # more than one possible mate is unexpected, but we silently carry on
+            result.append(possible_mates[0] if len(possible_mates) == 1 else None)
+        return result
+
+    def _get_mate_key(
+        self, record: segment_records.SegmentRecord
+    ) -> Optional[Tuple[str, bool, int, int]]:
+        """Name, read one or two, contig index and position of the mate"""
+        if record.flag & SamFlag.is_supplementary or record.mate_tid < 0:
+            return None
+        mate_is_read1 = not record.flag & SamFlag.is_read1
+        return (record.name, mate_is_read1, record.mate_tid, record.mate_pos)
+
+    def _get_fetch_blocks(
+        self, mate_positions: Iterable[Tuple[int, int]]
+    ) -> List[Tuple[int, int, int]]:
+        """Contig index, start and end of the regions to fetch to find mates at
+        `mate_positions`, in file order"""
+        positions = sorted(set(mate_positions))
+        result: List[Tuple[int, int, int]] = []
+        for tid, pos in positions:
+            if (
+                result
+                and result[-1][0] == tid
+                and pos <= result[-1][2] + self.max_fetch_gap
+            ):
+                result[-1] = (tid, result[-1][1], pos + 1)
+            else:
+                result.append((tid, pos, pos + 1))
         return result
 
 
+def overlaps_any(
+    read: pysam.AlignedSegment, regions: Iterable[entities.GenomicRegion]
+) -> bool:
+    """True if `read` overlaps any of `regions`, with the coordinates convention
+    of `pysam.AlignmentFile.fetch`"""
+    start = read.reference_start
+    # unmapped reads placed next to their mate have no end
+    end = read.reference_end or start + 1
+    return any(start < region.end and end > region.start for region in regions)
+
+
+CIGAR_OPERATION = re.compile(r"(\d+)([MIDNSHP=X])")
+
+
+def get_reference_length(cigar: str) -> int:
+    """Number of reference bases covered by an alignment with CIGAR string"""
+    result = sum(
+        int(length)
+        for length, operation in CIGAR_OPERATION.findall(cigar)
+        if operation in "MDN=X"
+    )
+    return result
+
+
+def overlaps_any_interval(
+    chrom: str, start: int, end: int, regions: Iterable[entities.GenomicRegion]
+) -> bool:
+    """`overlaps_any` for an alignment on `chrom` from `start` to `end`"""
+    return any(
+        region.chrom == chrom and start < region.end and end > region.start
+        for region in regions
+    )
+
+
 class FilePlacedSegmentRepository(repositories.PlacedSegmentRepository):
     _read_map = {True: entities.ReadOrder.ONE, False: entities.ReadOrder.TWO}
+    # regions closer than this are fetched at once, reads in between are skipped
+    max_fetch_gap = 1000
 
     def __init__(
         self,
         bam_file: pathlib.Path,
         read_counter: repositories.SegmentCounter,
+        cache: Optional[segment_cache.SegmentCache] = None,
+        chunked_fetcher: Optional[chunked_fetch.ChunkedRegionFetcher] = None,
+        reference: Optional[pathlib.Path] = None,
+        discordant_index_file: Optional[discordant_index.DiscordantIndexFile] = None,
     ):
-        self._bam_file = pysam.AlignmentFile(str(bam_file), "rb")
+        """Regions are read from `chunked_fetcher`, when given, which is left
+        open for other repositories"""
+        # sequences and qualities of CRAM records are not decoded
+        # regions are fetched in small blocks, which htslib threads slow down:
+        # large regions are read by the chunked fetcher instead
+        self._bam_file = alignment_files.open_alignment_file(
+            bam_file,
+            "rb",
+            reference=reference,
+            required_fields=alignment_files.CALLING_FIELDS,
+        )
         self._mate_finder = PysamMateFinder(self._bam_file)
         self._read_counter = read_counter
+        self._cache = cache
+        self._discordant_index_file = discordant_index_file
+        self._chunked_fetcher = chunked_fetcher
 
     def get_number_of_segments(
         self, exclude: Optional[List[repositories.ReadQuery]] = None
@@ -223,24 +816,172 @@ class FilePlacedSegmentRepository(repositories.PlacedSegmentRepository):
         """Count total number of reads, excluding given list of `ReadQuery`"""
         return self._read_counter.get_number_of_segments(exclude)
 
+    def get_relative_error(
+        self, exclude: Optional[List[repositories.ReadQuery]] = None
+    ) -> Optional[float]:
+        return self._read_counter.get_relative_error(exclude)
+
     def get(
         self,
         locations: FrozenSet[entities.GenomicRegion],
         exclude: List[repositories.ReadQuery],
         min_quality: int = 0,
     ) -> Iterable[entities.PlacedSegment]:
-        exclude_selector = AnySegmentSelector(exclude)
-        quality_selector = MapQSelector(minimum_quality=min_quality)
+        if self._cache is None:
+            return self._get(locations, exclude, min_quality)
+        key = (locations, frozenset(exclude), min_quality)
+        result = self._cache.get(key)
+        if result is None:
+            result = list(self._get(locations, exclude, min_quality))
+            self._cache.put(key, result)
+        return result
+
+    def _get(
+        self,
+        locations: FrozenSet[entities.GenomicRegion],
+        exclude: List[repositories.ReadQuery],
+        min_quality: int,
+    ) -> Iterator[entities.PlacedSegment]:
+        segment_filter = SegmentFilter(exclude, min_quality)
+        for offset, read in self._get_reads_from(locations):
+            if segment_filter(read):
+                yield self._convert_read(read, locations, offset)
+
+    def get_with_partners(
+        self,
+        locations: FrozenSet[entities.GenomicRegion],
+        partner_locations: FrozenSet[entities.GenomicRegion],
+        exclude: List[repositories.ReadQuery],
+        min_quality: int = 0,
+        partner_min_quality: int = 0,
+    ) -> Iterator[entities.PlacedSegment]:
+        """Partners of a segment are the segment itself, the other alignments of
+        its read (SA tag) and its mate (RNEXT, PNEXT, MC and MQ tags). Their
+        content is a `segment_records.PartnerRecord`.
+
+        Supplementary alignments of the mate are not known. Partners inherit the
+        flags of the segment, except for `ReadQuery.is_supplementary`. Mates
+        without MC or MQ tags which may be in `partner_locations` are looked up
+        in the file, all at once"""
+        segment_filter = SegmentFilter(exclude, min_quality)
+        partner_filter = SegmentFilter(exclude, partner_min_quality)
+        with_supplementary = repositories.ReadQuery.is_supplementary not in exclude
+        unknown_mates: List[segment_records.SegmentRecord] = []
+        for offset, read in self._get_reads_from(locations):
+            if not segment_filter(read):
+                continue
+            segment = self._convert_read(read, locations, offset)
+            yield segment
+            if partner_filter(read) and overlaps_any(read, partner_locations):
+                yield entities.PlacedSegment(
+                    segment.read_name,
+                    partner_locations,
+                    segment.read_order,
+                    segment.content,
+                )
+            for record, span in self._get_partners(read, with_supplementary):
+                if record.mapq >= partner_min_quality and overlaps_any_interval(
+                    self._bam_file.get_reference_name(record.tid),
+                    record.pos,
+                    record.pos + span,
+                    partner_locations,
+                ):
+                    read_order = self._read_map[bool(record.flag & SamFlag.is_read1)]
+                    yield entities.PlacedSegment(
+                        record.name, partner_locations, read_order, record
+                    )
+            if self._may_have_unknown_mate(read, partner_locations):
+                # the mate of the primary alignment is looked up
+                primary = segment_records.SegmentRecord.from_segment(read)
+                primary.flag &= ~SamFlag.is_supplementary
+                unknown_mates.append(primary)
+
+        for mate in self._mate_finder.get_mates(unknown_mates):
+            if mate is not None and partner_filter(mate):
+                if overlaps_any(mate, partner_locations):
+                    yield self._convert_read(mate, partner_locations)
+
+    def _get_partners(
+        self, read: pysam.AlignedSegment, with_supplementary: bool
+    ) -> Iterator[Tuple[segment_records.PartnerRecord, int]]:
+        """Alignments of the read pair of `read` fully described by its tags,
+        with the number of reference bases they cover"""
+        name = str(read.query_name)
+        read_flags = SamFlag.is_paired | SamFlag.is_read1 | SamFlag.is_read2
+        read_flag = read.flag & read_flags
+        mate_flag = read_flag ^ (SamFlag.is_read1 | SamFlag.is_read2)
+        if read.has_tag("SA"):
+            entries = str(read.get_tag("SA")).rstrip(";").split(";")
+            for i, entry in enumerate(entries):
+                chrom, pos, _, cigar, mapq, _ = entry.split(",")
+                # by convention, the primary alignment is listed first in the SA
+                # tag of a supplementary alignment
+                is_supplementary = not (read.is_supplementary and i == 0)
+                tid = self._bam_file.get_tid(chrom)
+                if tid < 0 or (is_supplementary and not with_supplementary):
+                    continue
+                flag = read_flag | (SamFlag.is_supplementary if is_supplementary else 0)
+                record = segment_records.PartnerRecord(
+                    name,
+                    flag,
+                    tid,
+                    int(pos) - 1,
+                    read.next_reference_id,
+                    read.next_reference_start,
+                    int(mapq),
+                )
+                yield record, get_reference_length(cigar)
+        if self._has_known_mate(read):
+            record = segment_records.PartnerRecord(
+                name,
+                mate_flag,
+                read.next_reference_id,
+                read.next_reference_start,
+                mapq=int(read.get_tag("MQ")),
+            )
+            yield record, get_reference_length(str(read.get_tag("MC")))
+
+    def _has_known_mate(self, read: pysam.AlignedSegment) -> bool:
         result = (
-            self._convert_read(read, locations)
-            for read in self._get_reads_from(locations)
-            if not exclude_selector(read) and quality_selector(read)
+            read.is_paired
+            and not read.mate_is_unmapped
+            and read.next_reference_id >= 0
+            and read.has_tag("MC")
+            and read.has_tag("MQ")
+        )
+        return result
+
+    def _may_have_unknown_mate(
+        self,
+        read: pysam.AlignedSegment,
+        partner_locations: FrozenSet[entities.GenomicRegion],
+    ) -> bool:
+        """True if the mate of `read` is mapped close enough to
+        `partner_locations` to overlap them, but its tags do not tell"""
+        if (
+            not read.is_paired
+            or read.mate_is_unmapped
+            or read.next_reference_id < 0
+            or self._has_known_mate(read)
+        ):
+            return False
+        # the mate is assumed no longer than twice the read
+        span = 2 * max(read.infer_read_length() or 0, 1)
+        result = overlaps_any_interval(
+            str(read.next_reference_name),
+            read.next_reference_start,
+            read.next_reference_start + span,
+            partner_locations,
         )
         return result
 
     def get_mate_exact_position(self, read: entities.PlacedSegment) -> Tuple[str, int]:
         """Get contig name and starting position of read mate"""
-        if isinstance(read, entities.PlacedSegment):
+        if isinstance(read.content, segment_records.SegmentRecord):
+            mate_name = str(self._bam_file.get_reference_name(read.content.mate_tid))
+            mate_start = read.content.mate_pos + 1
+            return mate_name, mate_start
+        elif isinstance(read, entities.PlacedSegment):
             mate_name = str(read.content.next_reference_name)
             mate_start = read.content.next_reference_start + 1
             return mate_name, mate_start
@@ -249,45 +990,200 @@ class FilePlacedSegmentRepository(repositories.PlacedSegmentRepository):
                 f"have not implemented methods to handle read of type: {type(read)}"
             )
 
+    def get_mate_positions(
+        self,
+        locations: FrozenSet[entities.GenomicRegion],
+        exclude: List[repositories.ReadQuery],
+        min_quality: int = 0,
+    ) -> Iterable[Tuple[str, int]]:
+        """Answered from the discordant index when it holds all the segments
+        not excluded"""
+        indexed = {
+            repositories.ReadQuery.is_not_paired,
+            repositories.ReadQuery.is_proper_pair,
+            repositories.ReadQuery.is_duplicate,
+        }
+        if self._discordant_index_file is None or not indexed.issubset(exclude):
+            return super().get_mate_positions(locations, exclude, min_quality)
+        return self._get_indexed_mate_positions(locations, exclude, min_quality)
+
+    def _get_indexed_mate_positions(
+        self,
+        locations: FrozenSet[entities.GenomicRegion],
+        exclude: List[repositories.ReadQuery],
+        min_quality: int,
+    ) -> Iterator[Tuple[str, int]]:
+        assert self._discordant_index_file is not None
+        index = self._discordant_index_file.get()
+        rows = set()
+        for region in locations:
+            tid = self._bam_file.get_tid(region.chrom)
+            rows.update(index.get_overlapping(tid, region.start, region.end))
+        segment_filter = SegmentFilter(exclude, min_quality)
+        flags = index.columns["flag"]
+        mapqs = index.columns["mapq"]
+        mate_tids = index.columns["mate_tid"]
+        mate_positions = index.columns["mate_pos"]
+        for row in sorted(rows):
+            if segment_filter.matches(flags[row], mapqs[row]):
+                mate_name = str(self._bam_file.get_reference_name(mate_tids[row]))
+                yield mate_name, mate_positions[row] + 1
+
     def get_mate(
         self, read: entities.PlacedSegment
     ) -> Optional[entities.PlacedSegment]:
-        if not isinstance(read.content, pysam.AlignedSegment):
-            raise ValueError("invalid read type")
-        mate = self._mate_finder.get_mate(read.content)
-        if mate is None:
-            result = None
-        else:
-            result = self._convert_read(mate, frozenset())
+        return self.get_mates([read])[0]
+
+    def get_mates(
+        self, reads: Sequence[entities.PlacedSegment]
+    ) -> List[Optional[entities.PlacedSegment]]:
+        records = []
+        for read in reads:
+            if isinstance(read.content, segment_records.SegmentRecord):
+                records.append(read.content)
+            elif isinstance(read.content, pysam.AlignedSegment):
+                records.append(segment_records.SegmentRecord.from_segment(read.content))
+            else:
+                raise ValueError("invalid read type")
+        result = [
+            None if mate is None else self._convert_read(mate, frozenset())
+            for mate in self._mate_finder.get_mates(records)
+        ]
         return result
 
     def _get_reads_from(
         self, locations: FrozenSet[entities.GenomicRegion]
-    ) -> Iterator[pysam.AlignedSegment]:
-        for region in locations:
-            for read in self._bam_file.fetch(region.chrom, region.start, region.end):
-                yield read
+    ) -> Iterator[Tuple[int, pysam.AlignedSegment]]:
+        """Reads overlapping any of the `locations`, each read once, in file order,
+        with their virtual file offset (-1 for CRAM files, which cannot seek)"""
+        blocks = self._get_fetch_blocks(locations)
+        spans = [
+            (block[0].chrom, block[0].start, max(region.end for region in block))
+            for block in blocks
+        ]
+        fetched: List[entities.GenomicRegion] = []
+        for block, reads in zip(blocks, self._fetch(spans)):
+            if fetched and fetched[-1].chrom != block[0].chrom:
+                fetched = []
+            fetched_end = max((region.end for region in fetched), default=0)
+            for offset, read in reads:
+                if len(block) > 1 and not overlaps_any(read, block):
+                    continue  # in between regions
+                if read.reference_start < fetched_end and overlaps_any(read, fetched):
+                    continue  # long read already retrieved with a previous block
+                yield offset, read
+            fetched.extend(block)
+
+    def _fetch(
+        self, spans: List[chunked_fetch.Span]
+    ) -> Iterable[Iterator[chunked_fetch.FetchedSegment]]:
+        """Reads overlapping each of the `spans`, decoded in chunks by worker
+        threads when there are more than one"""
+        if self._chunked_fetcher is not None:
+            return self._chunked_fetcher.fetch(spans)
+        return (self._fetch_span(*span) for span in spans)
+
+    def _fetch_span(
+        self, chrom: str, start: int, end: int
+    ) -> Iterator[chunked_fetch.FetchedSegment]:
+        is_cram = self._bam_file.is_cram
+        reads = self._bam_file.fetch(chrom, start, end)
+        while True:
+            # offset of the next read, unless the iterator jumps to another
+            # chunk of the file: the record loader checks it is correct
+            offset = -1 if is_cram else self._bam_file.tell()
+            read = next(reads, None)
+            if read is None:
+                break
+            yield offset, read
+
+    def _get_fetch_blocks(
+        self, locations: FrozenSet[entities.GenomicRegion]
+    ) -> List[List[entities.GenomicRegion]]:
+        """Group regions that are overlapping or close to each other, sorted as
+        in the alignment file so it is read sequentially"""
+        regions = sorted(
+            locations,
+            key=lambda item: (
+                self._bam_file.get_tid(item.chrom),
+                item.chrom,
+                item.start,
+                item.end,
+            ),
+        )
+        result: List[List[entities.GenomicRegion]] = []
+        block_end = 0
+        for region in regions:
+            if (
+                result
+                and result[-1][0].chrom == region.chrom
+                and region.start <= block_end + self.max_fetch_gap
+            ):
+                result[-1].append(region)
+                block_end = max(block_end, region.end)
+            else:
+                result.append([region])
+                block_end = region.end
+        return result
 
     def _convert_read(
-        self, read: pysam.AlignedSegment, locations: FrozenSet[entities.GenomicRegion]
+        self,
+        read: pysam.AlignedSegment,
+        locations: FrozenSet[entities.GenomicRegion],
+        offset: int = -1,
     ) -> entities.PlacedSegment:
+        """Keep a slim record of the read: the full read is fetched again only
+        when exported (see `segment_records.SegmentRecordLoader`)"""
         read_order = self._read_map[read.is_read1]
-        if read.query_name is None:
-            raise ValueError("AlignedSegment has no name")
-        result = entities.PlacedSegment(read.query_name, locations, read_order, read)
+        record = segment_records.SegmentRecord.from_segment(read, offset)
+        result = entities.PlacedSegment(record.name, locations, read_order, record)
         return result
 
 
 class PysamSegmentRepositoryFactory(repositories.SegmentRepositoryFactory):
+    # features choosing how reads are counted, other than exactly
+    counting_features = frozenset(
+        [
+            repositories.SegmentRepoFeature.METRICS_FILE,
+            repositories.SegmentRepoFeature.INDEX_STATISTICS,
+            repositories.SegmentRepoFeature.FLAG_HISTOGRAM,
+            repositories.SegmentRepoFeature.SAMPLING,
+        ]
+    )
+
     def __init__(
         self,
         bam_file: pathlib.Path,
         notification_factory: notifications.NotificationServiceFactory,
         number_of_threads: int = 1,
+        count_cache_dir: Optional[pathlib.Path] = None,
+        metrics_file: Optional[pathlib.Path] = None,
+        segment_cache_size: int = defaults.segment_cache_size * 1024 * 1024,
+        reference: Optional[pathlib.Path] = None,
     ):
         self.notification_factory = notification_factory
         self._bam_file = bam_file
         self._number_of_threads = number_of_threads
+        self._reference = reference
+        self._count_cache_dir = count_cache_dir
+        self._metrics_file = metrics_file
+        # shared by all repositories, as callers query the same regions
+        self.segment_cache = (
+            segment_cache.SegmentCache(segment_cache_size)
+            if segment_cache_size > 0
+            else None
+        )
+        self._chunked_fetcher: Optional[chunked_fetch.ChunkedRegionFetcher] = None
+        if number_of_threads > 1:
+            self._chunked_fetcher = chunked_fetch.ChunkedRegionFetcher(
+                bam_file,
+                number_of_threads,
+                reference,
+                required_fields=alignment_files.CALLING_FIELDS,
+            )
+        # cache statistics are reported on closing, if any repository notifies
+        self._notification_service: Optional[notifications.NotificationService]
+        self._notification_service = None
 
     def build_counter(
         self,
@@ -299,32 +1195,185 @@ class PysamSegmentRepositoryFactory(repositories.SegmentRepositoryFactory):
                 raise caller_factories.MissingArgumentError("total_number_of_reads")
             else:
                 return repositories.ProvidedSegmentCounter(total_number_of_reads)
+        elif (
+            repositories.SegmentRepoFeature.METRICS_FILE in features
+            and self._metrics_file is None
+        ):
+            raise caller_factories.MissingArgumentError("metrics_file")
         else:
             if repositories.SegmentRepoFeature.WITH_NOTIFICATION in features:
                 with_notification = True
             else:
                 with_notification = False
+            counting_method = self.__get_counting_method(features)
 
-            return self.__build_singleton_counter(self._bam_file, with_notification)
+            return self.__build_singleton_counter(
+                self._bam_file, with_notification, counting_method
+            )
+
+    def __get_counting_method(
+        self, features: FrozenSet[repositories.SegmentRepoFeature]
+    ) -> str:
+        evidence_count = self.__get_evidence_count()
+        if evidence_count is not None:
+            # reads of the original alignment file were counted on extraction
+            if features & self.counting_features:
+                reason = (
+                    "reads were counted on extraction, with count mode "
+                    f"{evidence_count.count_mode.lower()}: no other count mode "
+                    "or metrics file can be used"
+                )
+                raise evidence_files.EvidenceFileError(self._bam_file, reason)
+            return "evidence"
+        elif repositories.SegmentRepoFeature.METRICS_FILE in features:
+            return "metrics"
+        elif repositories.SegmentRepoFeature.INDEX_STATISTICS in features:
+            return "index"
+        elif repositories.SegmentRepoFeature.FLAG_HISTOGRAM in features:
+            return "histogram"
+        elif repositories.SegmentRepoFeature.SAMPLING in features:
+            return "estimate"
+        else:
+            return "exact"
 
     @functools.lru_cache(maxsize=1024)
     def __build_singleton_counter(
-        self, bam_file: pathlib.Path, with_notification: bool
+        self, bam_file: pathlib.Path, with_notification: bool, counting_method: str
     ) -> repositories.CachedSegmentCounter:
-        """Both the BamFileSegmentCounter and the CachedSegmentCounter need to be unique"""
+        """Both the SegmentCounter and the CachedSegmentCounter need to be unique"""
         result: repositories.SegmentCounter
-        result = BamFileSegmentCounter(self._bam_file, self._number_of_threads)
+        if counting_method == "evidence":
+            evidence_count = self.__get_evidence_count()
+            assert evidence_count is not None
+            result = evidence_files.EvidenceFileSegmentCounter(
+                self._bam_file, evidence_count
+            )
+        elif counting_method == "metrics":
+            assert self._metrics_file is not None
+            result = metrics_segment_counter.MetricsFileSegmentCounter(
+                self._bam_file, self._metrics_file, self._reference
+            )
+        elif counting_method == "index":
+            result = IndexSegmentCounter(self._bam_file)
+        elif counting_method == "histogram":
+            result = FlagHistogramSegmentCounter(
+                self._bam_file,
+                self._number_of_threads,
+                histogram_file=self.__get_histogram_file(),
+                reference=self._reference,
+            )
+        elif counting_method == "estimate":
+            result = SampledSegmentCounter(self._bam_file, reference=self._reference)
+        elif self._number_of_threads > 1:
+            result = ParallelBamFileSegmentCounter(
+                self._bam_file, self._number_of_threads, self._reference
+            )
+        else:
+            result = BamFileSegmentCounter(
+                self._bam_file, self._number_of_threads, self._reference
+            )
         if with_notification:
             notification_service = self.notification_factory.build()
             result = notifications.NotifySegmentCounter(result, notification_service)
+        # the metrics file is not part of the key of persistent counts, and the
+        # evidence count is already saved in the file
+        if self._count_cache_dir is not None and counting_method not in (
+            "metrics",
+            "evidence",
+        ):
+            result = persistent_segment_counter.PersistentSegmentCounter(
+                result, self._bam_file, self._count_cache_dir, counting_method
+            )
+        if counting_method not in ("index", "metrics", "evidence"):
+            # reading the index, metrics or evidence count is too quick to be
+            # worth a process
+            result = background_segment_counter.BackgroundSegmentCounter(result)
         result = repositories.CachedSegmentCounter(result)
         return result
 
+    @functools.lru_cache(maxsize=1)
+    def __get_evidence_count(self) -> Optional[evidence_files.EvidenceCount]:
+        return evidence_files.read_evidence_count(self._bam_file)
+
+    @functools.lru_cache(maxsize=1)
+    def __get_discordant_index_file(self) -> discordant_index.DiscordantIndexFile:
+        """Shared by all repositories, so the index is built at most once"""
+        index_dir = self._count_cache_dir or self._bam_file.parent
+        file_name = f"{self._bam_file.name}.pelops-discordant.idx"
+        result = discordant_index.DiscordantIndexFile(
+            self._bam_file,
+            index_dir / file_name,
+            self._number_of_threads,
+            self._reference,
+        )
+        return result
+
+    def __get_histogram_file(self) -> Optional[pathlib.Path]:
+        if self._count_cache_dir is None:
+            return None
+        file_name = f"{self._bam_file.name}.pelops-flag-histogram.json"
+        return self._count_cache_dir / file_name
+
     def build(
         self,
         features: FrozenSet[repositories.SegmentRepoFeature],
         total_number_of_reads: Optional[int],
     ) -> repositories.PlacedSegmentRepository:
         counter = self.build_counter(features, total_number_of_reads)
-        result = FilePlacedSegmentRepository(self._bam_file, counter)
+        if repositories.SegmentRepoFeature.DISCORDANT_INDEX in features:
+            discordant_index_file = self.__get_discordant_index_file()
+        else:
+            discordant_index_file = None
+        if repositories.SegmentRepoFeature.WITH_NOTIFICATION in features:
+            self._notification_service = self.notification_factory.build()
+        result = FilePlacedSegmentRepository(
+            self._bam_file,
+            counter,
+            self.segment_cache,
+            self._chunked_fetcher,
+            self._reference,
+            discordant_index_file,
+        )
         return result
+
+    def load_segments(
+        self, segments: Iterable[entities.PlacedSegment]
+    ) -> List[entities.PlacedSegment]:
+        """Slim records are fetched again from the alignment file. Partners
+        missing from it are left out (see `segment_records.SegmentRecordLoader`)"""
+        segments = list(segments)
+        records = [
+            item.content
+            for item in segments
+            if isinstance(item.content, segment_records.SegmentRecord)
+        ]
+        # exported reads are fully decoded, by seeking to each of them, which
+        # htslib threads do not speed up
+        with alignment_files.open_alignment_file(
+            self._bam_file, "rb", reference=self._reference
+        ) as alignment_file:
+            loaded = segment_records.SegmentRecordLoader(alignment_file).find(records)
+        result = []
+        for segment in segments:
+            content = segment.content
+            if isinstance(content, segment_records.SegmentRecord):
+                content = loaded.get(content.key)
+                if content is None:
+                    continue
+            result.append(
+                entities.PlacedSegment(
+                    segment.read_name, segment.location, segment.read_order, content
+                )
+            )
+        return result
+
+    def close(self) -> None:
+        if self._chunked_fetcher is not None:
+            self._chunked_fetcher.close()
+        if self.segment_cache is not None and self._notification_service is not None:
+            statistics = self.segment_cache.get_statistics()
+            message = (
+                f"Segment cache: {statistics.hits} hits, {statistics.misses} "
+                f"misses, {statistics.evictions} evictions."
+            )
+            self._notification_service.notify(message)
@@ -0,0 +1,79 @@
+"""Keep recently retrieved segments in memory"""
+
+import collections
+import dataclasses
+from typing import FrozenSet, List, Optional, Tuple
+
+import pysam
+
+from ilmn.pelops import entities, repositories
+from ilmn.pelops.infrastructure import segment_records
+
+# locations, excluded `ReadQuery` and minimum mapping quality of a query
+CacheKey = Tuple[
+    FrozenSet[entities.GenomicRegion], FrozenSet[repositories.ReadQuery], int
+]
+
+# rough memory footprint of a PlacedSegment and its AlignedSegment besides the
+# name, sequence and qualities
+SEGMENT_OVERHEAD = 400
+# rough memory footprint of a PlacedSegment and its SegmentRecord besides the name
+RECORD_OVERHEAD = 250
+
+
+def estimate_size(segment: entities.PlacedSegment) -> int:
+    """Estimate the memory footprint of a segment, in bytes"""
+    if isinstance(segment.content, segment_records.SegmentRecord):
+        return RECORD_OVERHEAD + len(segment.read_name)
+    result = SEGMENT_OVERHEAD + len(segment.read_name)
+    if isinstance(segment.content, pysam.AlignedSegment):
+        # 4 bits per base and 1 byte per quality
+        result += segment.content.query_length * 3 // 2
+    return result
+
+
+@dataclasses.dataclass(frozen=True)
+class CacheStatistics:
+    hits: int
+    misses: int
+    evictions: int
+    size: int  # estimated memory footprint of cached segments, in bytes
+
+
+class SegmentCache:
+    """Least recently used segments cache, bounded by an estimate of the memory
+    used by the segments. Results larger than the bound are not cached"""
+
+    def __init__(self, max_size: int):
+        self._max_size = max_size
+        self._entries: "collections.OrderedDict[CacheKey, Tuple[List[entities.PlacedSegment], int]]"
+        self._entries = collections.OrderedDict()
+        self._size = 0
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    def get(self, key: CacheKey) -> Optional[List[entities.PlacedSegment]]:
+        if key in self._entries:
+            self._hits += 1
+            self._entries.move_to_end(key)
+            segments, _ = self._entries[key]
+            return segments
+        else:
+            self._misses += 1
+            return None
+
+    def put(self, key: CacheKey, segments: List[entities.PlacedSegment]) -> None:
+        size = sum(estimate_size(segment) for segment in segments)
+        if size > self._max_size or key in self._entries:
+            return
+        while self._size + size > self._max_size:
+            _, (_, evicted_size) = self._entries.popitem(last=False)
+            self._size -= evicted_size
+            self._evictions += 1
+        self._entries[key] = (segments, size)
+        self._size += size
+
+    def get_statistics(self) -> CacheStatistics:
+        result = CacheStatistics(self._hits, self._misses, self._evictions, self._size)
+        return result
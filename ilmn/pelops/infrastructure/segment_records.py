@@ -0,0 +1,206 @@
+"""Slim records of aligned segments, re-fetched from the alignment file only
+when the full segment is required"""
+
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import pysam
+
+# name, flag, contig index and position identify a record in the alignment file
+RecordKey = Tuple[str, int, int, int]
+
+
+class SegmentRecord:
+    """The fields of a `pysam.AlignedSegment` used to call rearrangements.
+
+    Sequence, qualities, CIGAR and tags are left in the alignment file. The
+    virtual file `offset` of the segment is -1 when it is unknown"""
+
+    __slots__ = ("name", "flag", "tid", "pos", "mate_tid", "mate_pos", "mapq", "offset")
+
+    def __init__(
+        self,
+        name: str,
+        flag: int,
+        tid: int,
+        pos: int,
+        mate_tid: int = -1,
+        mate_pos: int = -1,
+        mapq: int = 0,
+        offset: int = -1,
+    ):
+        self.name = name
+        self.flag = flag
+        self.tid = tid
+        self.pos = pos
+        self.mate_tid = mate_tid
+        self.mate_pos = mate_pos
+        self.mapq = mapq
+        self.offset = offset
+
+    @classmethod
+    def from_segment(
+        cls, segment: pysam.AlignedSegment, offset: int = -1
+    ) -> "SegmentRecord":
+        if segment.query_name is None:
+            raise ValueError("AlignedSegment has no name")
+        result = cls(
+            segment.query_name,
+            segment.flag,
+            segment.reference_id,
+            segment.reference_start,
+            segment.next_reference_id,
+            segment.next_reference_start,
+            segment.mapping_quality,
+            offset,
+        )
+        return result
+
+    @property
+    def key(self) -> RecordKey:
+        return (self.name, self.flag, self.tid, self.pos)
+
+    def __eq__(self, other: object) -> bool:
+        if isinstance(other, SegmentRecord):
+            return self.key == other.key
+        return NotImplemented
+
+    def __hash__(self) -> int:
+        return hash(self.key)
+
+    def __repr__(self) -> str:
+        return f"SegmentRecord{self.key}"
+
+    def matches(self, segment: pysam.AlignedSegment) -> bool:
+        """True if `segment` is the full record of this one"""
+        result = (
+            segment.query_name == self.name
+            and segment.flag == self.flag
+            and segment.reference_id == self.tid
+            and segment.reference_start == self.pos
+        )
+        return result
+
+
+class PartnerRecord(SegmentRecord):
+    """Record of a segment known only from the tags of another segment of its
+    read pair (SA for the other alignments of a read, RNEXT, PNEXT, MC and MQ
+    for its mate). Of its flag, only the read number and whether it is
+    supplementary are known"""
+
+    __slots__ = ()
+
+    # paired, read one, read two and supplementary
+    known_flags = 0x1 | 0x40 | 0x80 | 0x800
+
+    @property
+    def key(self) -> RecordKey:
+        return (self.name, self.flag & self.known_flags, self.tid, self.pos)
+
+    def __repr__(self) -> str:
+        return f"PartnerRecord{self.key}"
+
+    def matches(self, segment: pysam.AlignedSegment) -> bool:
+        # a partner is never a secondary alignment
+        result = (
+            segment.query_name == self.name
+            and segment.flag & (self.known_flags | 0x100)
+            == self.flag & self.known_flags
+            and segment.reference_id == self.tid
+            and segment.reference_start == self.pos
+        )
+        return result
+
+
+class SegmentRecordLoader:
+    """Re-fetch the full `pysam.AlignedSegment` of `SegmentRecord`.
+
+    Records close to each other are found with a single fetch of the region
+    they span. An isolated record is read at its file offset when the
+    alignment file supports it"""
+
+    # records closer than this are fetched at once
+    max_fetch_gap = 1000
+
+    def __init__(self, alignment_file: pysam.AlignmentFile):
+        self._alignment_file = alignment_file
+
+    def load(self, segments: Iterable[Any]) -> List[Any]:
+        """The full records of `segments`, in the same order. Segments which are
+        not `SegmentRecord` are returned unchanged. `PartnerRecord` not found in
+        the alignment file, such as partners aligned to contigs removed from it,
+        are left out"""
+        segments = list(segments)
+        records = [item for item in segments if isinstance(item, SegmentRecord)]
+        loaded = self.find(records)
+        result = [
+            loaded.get(item.key) if isinstance(item, SegmentRecord) else item
+            for item in segments
+        ]
+        result = [item for item in result if item is not None]
+        return result
+
+    def find(
+        self, records: Iterable[SegmentRecord]
+    ) -> Dict[RecordKey, pysam.AlignedSegment]:
+        """The full records of `records`, by key. `PartnerRecord` not found in
+        the alignment file are left out"""
+        records = list(records)
+        result: Dict[RecordKey, pysam.AlignedSegment] = {}
+        for block in self._get_fetch_blocks(records):
+            if len(block) == 1:
+                segment = self._read_at_offset(block[0])
+                if segment is not None:
+                    result[block[0].key] = segment
+                    continue
+            result.update(self._read_block(block))
+        missing = [
+            item
+            for item in records
+            if item.key not in result and not isinstance(item, PartnerRecord)
+        ]
+        if missing:
+            raise LookupError(f"{missing[0]} not found in the alignment file")
+        return result
+
+    def _get_fetch_blocks(
+        self, records: List[SegmentRecord]
+    ) -> List[List[SegmentRecord]]:
+        """Group records by contig and proximity, in file order"""
+        result: List[List[SegmentRecord]] = []
+        for record in sorted(set(records), key=lambda item: (item.tid, item.pos)):
+            if (
+                result
+                and result[-1][-1].tid == record.tid
+                and record.pos <= result[-1][-1].pos + self.max_fetch_gap
+            ):
+                result[-1].append(record)
+            else:
+                result.append([record])
+        return result
+
+    def _read_at_offset(self, record: SegmentRecord) -> Optional[pysam.AlignedSegment]:
+        if record.offset < 0 or self._alignment_file.is_cram:
+            return None
+        self._alignment_file.seek(record.offset)
+        segment = next(self._alignment_file, None)
+        if segment is not None and record.matches(segment):
+            return segment
+        return None
+
+    def _read_block(
+        self, block: List[SegmentRecord]
+    ) -> Dict[RecordKey, pysam.AlignedSegment]:
+        """Full records of `block`, found among the segments of the region it
+        spans"""
+        wanted: Dict[int, List[SegmentRecord]] = {}
+        for record in block:
+            wanted.setdefault(record.pos, []).append(record)
+        contig = self._alignment_file.get_reference_name(block[0].tid)
+        start = block[0].pos
+        end = block[-1].pos + 1
+        result = {}
+        for segment in self._alignment_file.fetch(contig, start, end):
+            for record in wanted.get(segment.reference_start, []):
+                if record.matches(segment):
+                    result[record.key] = segment
+        return result
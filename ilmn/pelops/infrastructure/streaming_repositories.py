@@ -0,0 +1,495 @@
+"""Find rearrangements with a single sequential pass over an alignment file, which
+needs neither an index nor coordinate order, so that it can be read from the
+standard input. Files grouped by read name are read template by template"""
+
+import bisect
+import collections
+import functools
+import itertools
+import pathlib
+from typing import (
+    DefaultDict,
+    Dict,
+    FrozenSet,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Set,
+    Tuple,
+)
+
+import pysam
+
+from ilmn.pelops import entities, notifications, repositories
+from ilmn.pelops.callers import caller_factories
+from ilmn.pelops.infrastructure import alignment_files, pysam_repositories
+
+# path of the standard input
+STDIN = pathlib.Path("-")
+
+SamFlag = pysam_repositories.SamFlag
+
+
+class StreamingBufferError(ValueError):
+    def __init__(self, bam_file: pathlib.Path, max_segments: int):
+        message = (
+            f"Unable to stream {bam_file}: more than {max_segments} segments may "
+            "be evidence of rearrangements. Index the file and read it without "
+            "streaming instead"
+        )
+        super().__init__(message)
+
+
+class TemplateGroupingError(ValueError):
+    def __init__(self, bam_file: pathlib.Path, read_name: str):
+        message = (
+            f"Unable to read {bam_file} by template: segments of read {read_name} "
+            "are not next to each other. Sort or collate the file by read name"
+        )
+        super().__init__(message)
+
+
+class RegionIntervals:
+    """Regions merged and sorted by contig, widened by `margin` on both sides,
+    to test in logarithmic time whether an alignment overlaps any of them"""
+
+    def __init__(self, regions: Iterable[entities.GenomicRegion], margin: int = 0):
+        by_contig: DefaultDict[str, List[Tuple[int, int]]] = collections.defaultdict(
+            list
+        )
+        for region in regions:
+            by_contig[region.chrom].append(
+                (max(region.start - margin, 0), region.end + margin)
+            )
+        self._starts: Dict[str, List[int]] = {}
+        self._ends: Dict[str, List[int]] = {}
+        for chrom, intervals in by_contig.items():
+            starts: List[int] = []
+            ends: List[int] = []
+            for start, end in sorted(intervals):
+                if ends and start <= ends[-1]:
+                    ends[-1] = max(ends[-1], end)
+                else:
+                    starts.append(start)
+                    ends.append(end)
+            self._starts[chrom] = starts
+            self._ends[chrom] = ends
+
+    def overlaps(self, chrom: str, start: int, end: int) -> bool:
+        """True if `start`-`end` (0-based, half open) on `chrom` overlaps any
+        region, with the coordinates convention of `pysam.AlignmentFile.fetch`"""
+        starts = self._starts.get(chrom)
+        if starts is None:
+            return False
+        i = bisect.bisect_left(starts, end) - 1
+        return i >= 0 and self._ends[chrom][i] > start
+
+
+class StreamedEvidence:
+    """Segments kept by `AlignmentStream`, sorted by contig and position, and
+    the `SamFlagHistogram` of all the segments of the file"""
+
+    def __init__(
+        self,
+        segments: List[pysam.AlignedSegment],
+        histogram: pysam_repositories.SamFlagHistogram,
+    ):
+        self.segments = sorted(
+            segments, key=lambda item: (item.reference_id, item.reference_start)
+        )
+        self.histogram = histogram
+        self._positions = [
+            (item.reference_id, item.reference_start) for item in self.segments
+        ]
+        # unmapped segments placed next to their mate cover one base
+        self._max_span = max(
+            (self._get_end(item) - item.reference_start for item in self.segments),
+            default=1,
+        )
+        self._by_name: DefaultDict[str, List[pysam.AlignedSegment]]
+        self._by_name = collections.defaultdict(list)
+        for item in self.segments:
+            self._by_name[str(item.query_name)].append(item)
+
+    def get_overlapping(
+        self, locations: FrozenSet[entities.GenomicRegion]
+    ) -> List[pysam.AlignedSegment]:
+        """Segments overlapping any of `locations`, each once, in file order"""
+        rows: Set[int] = set()
+        for region in locations:
+            tid = self._get_tid(region.chrom)
+            if tid < 0:
+                continue
+            first = bisect.bisect_left(
+                self._positions, (tid, region.start - self._max_span)
+            )
+            last = bisect.bisect_left(self._positions, (tid, region.end), first)
+            rows.update(
+                row
+                for row in range(first, last)
+                if self._get_end(self.segments[row]) > region.start
+            )
+        return [self.segments[row] for row in sorted(rows)]
+
+    def get_read_pair(self, name: str) -> List[pysam.AlignedSegment]:
+        """Kept segments of the read pair `name`"""
+        return self._by_name.get(name, [])
+
+    def _get_tid(self, chrom: str) -> int:
+        if not self.segments:
+            return -1
+        return int(self.segments[0].header.get_tid(chrom))
+
+    def _get_end(self, segment: pysam.AlignedSegment) -> int:
+        return int(segment.reference_end or segment.reference_start + 1)
+
+
+class AlignmentStream:
+    """Read an alignment file once, in any order, keeping the segments which may
+    be evidence of rearrangements of `regions`: those placed in them, and those
+    whose mate (RNEXT, PNEXT) or other alignments (SA tag) are. Any segment of
+    a read pair spanning `regions` and another region is then kept.
+
+    All segments are counted by SAM flag in the same pass. Segments are fully
+    decoded, as they are exported as they are. At most `max_segments` are kept,
+    so that memory does not grow with the size of the file"""
+
+    # mates and other alignments are assumed no longer than this
+    max_partner_span = 1000
+    max_segments = 2_000_000
+
+    def __init__(
+        self,
+        bam_file: pathlib.Path,
+        regions: Iterable[entities.GenomicRegion],
+        number_of_threads: int = 1,
+        reference: Optional[pathlib.Path] = None,
+        max_segments: Optional[int] = None,
+    ):
+        self._bam_file = bam_file
+        self._regions = RegionIntervals(regions)
+        self._partner_regions = RegionIntervals(regions, self.max_partner_span)
+        self._number_of_threads = number_of_threads
+        self._reference = reference
+        if max_segments is not None:
+            self.max_segments = max_segments
+        self._evidence: Optional[StreamedEvidence] = None
+
+    def get(self) -> StreamedEvidence:
+        if self._evidence is None:
+            self._evidence = self._read()
+        return self._evidence
+
+    def _read(self) -> StreamedEvidence:
+        kept: List[pysam.AlignedSegment] = []
+        counts: Dict[Tuple[int, int], int] = collections.Counter()
+        with alignment_files.open_alignment_file(
+            self._bam_file, "r", self._number_of_threads, self._reference
+        ) as alignment_file:
+            contigs = list(alignment_file.references)
+            for segment in alignment_file.fetch(until_eof=True):
+                counts[(segment.flag, segment.mapping_quality)] += 1
+                if self._is_evidence(segment, contigs):
+                    if len(kept) == self.max_segments:
+                        raise StreamingBufferError(self._bam_file, self.max_segments)
+                    kept.append(segment)
+        # counts are not needed by contig
+        histogram = pysam_repositories.SamFlagHistogram()
+        for (flag, mapping_quality), count in counts.items():
+            histogram.add(flag, mapping_quality, "*", count)
+        return StreamedEvidence(kept, histogram)
+
+    def _is_evidence(self, segment: pysam.AlignedSegment, contigs: List[str]) -> bool:
+        tid = segment.reference_id
+        if tid >= 0:
+            start = segment.reference_start
+            end = segment.reference_end or start + 1
+            if self._regions.overlaps(contigs[tid], start, end):
+                return True
+        mate_tid = segment.next_reference_id
+        if segment.flag & SamFlag.is_paired and mate_tid >= 0:
+            mate_start = segment.next_reference_start
+            if self._partner_regions.overlaps(
+                contigs[mate_tid], mate_start, mate_start + 1
+            ):
+                return True
+        if segment.has_tag("SA"):
+            for entry in str(segment.get_tag("SA")).rstrip(";").split(";"):
+                chrom, pos = entry.split(",")[:2]
+                if self._partner_regions.overlaps(chrom, int(pos) - 1, int(pos)):
+                    return True
+        return False
+
+
+class TemplateStream(AlignmentStream):
+    """AlignmentStream of a file grouped by read name (sorted or collated), in
+    which all the segments of a template are next to each other. Templates
+    with a segment placed in `regions` are kept whole: mates and other
+    alignments need not be guessed from tags, and unmapped mates are kept too.
+
+    Templates found split over the file are reported, as far as kept templates
+    are concerned"""
+
+    def _read(self) -> StreamedEvidence:
+        kept: List[pysam.AlignedSegment] = []
+        kept_names: Set[str] = set()
+        counts: Dict[Tuple[int, int], int] = collections.Counter()
+        with alignment_files.open_alignment_file(
+            self._bam_file, "r", self._number_of_threads, self._reference
+        ) as alignment_file:
+            contigs = list(alignment_file.references)
+            segments = alignment_file.fetch(until_eof=True)
+            for name, group in itertools.groupby(segments, lambda x: x.query_name):
+                template = list(group)
+                is_evidence = False
+                for segment in template:
+                    counts[(segment.flag, segment.mapping_quality)] += 1
+                    is_evidence = is_evidence or self._is_placed_in_regions(
+                        segment, contigs
+                    )
+                if not is_evidence:
+                    continue
+                if name in kept_names:
+                    raise TemplateGroupingError(self._bam_file, str(name))
+                kept_names.add(str(name))
+                if len(kept) + len(template) > self.max_segments:
+                    raise StreamingBufferError(self._bam_file, self.max_segments)
+                kept.extend(template)
+        histogram = pysam_repositories.SamFlagHistogram()
+        for (flag, mapping_quality), count in counts.items():
+            histogram.add(flag, mapping_quality, "*", count)
+        return StreamedEvidence(kept, histogram)
+
+    def _is_placed_in_regions(
+        self, segment: pysam.AlignedSegment, contigs: List[str]
+    ) -> bool:
+        tid = segment.reference_id
+        if tid < 0:
+            return False
+        start = segment.reference_start
+        end = segment.reference_end or start + 1
+        return self._regions.overlaps(contigs[tid], start, end)
+
+
+class StreamedSegmentCounter(repositories.SegmentCounter):
+    """Count segments from the `SamFlagHistogram` of an `AlignmentStream`"""
+
+    default_filters = pysam_repositories.BamFileSegmentCounter.default_filters
+
+    def __init__(self, stream: AlignmentStream):
+        self._stream = stream
+
+    def get_number_of_segments(
+        self, exclude: Optional[List[repositories.ReadQuery]] = None
+    ) -> int:
+        if exclude is None:
+            exclude = self.default_filters
+        return self._stream.get().histogram.count(exclude)
+
+    def get_count_mode(self) -> Optional[str]:
+        # the file is always read in full
+        return "EXACT"
+
+
+class StreamedPlacedSegmentRepository(repositories.PlacedSegmentRepository):
+    """PlacedSegmentRepository of the segments kept by an `AlignmentStream`.
+
+    Segments not kept are unknown: the mate of a split read is only found when
+    it was kept for its own placement or partners"""
+
+    _read_map = {True: entities.ReadOrder.ONE, False: entities.ReadOrder.TWO}
+
+    def __init__(
+        self, stream: AlignmentStream, read_counter: repositories.SegmentCounter
+    ):
+        self._stream = stream
+        self._read_counter = read_counter
+
+    def get_number_of_segments(
+        self, exclude: Optional[List[repositories.ReadQuery]] = None
+    ) -> int:
+        return self._read_counter.get_number_of_segments(exclude)
+
+    def get_relative_error(
+        self, exclude: Optional[List[repositories.ReadQuery]] = None
+    ) -> Optional[float]:
+        return self._read_counter.get_relative_error(exclude)
+
+    def get(
+        self,
+        locations: FrozenSet[entities.GenomicRegion],
+        exclude: List[repositories.ReadQuery],
+        min_quality: int = 0,
+    ) -> Iterator[entities.PlacedSegment]:
+        segment_filter = pysam_repositories.SegmentFilter(exclude, min_quality)
+        for segment in self._stream.get().get_overlapping(locations):
+            if segment_filter(segment):
+                yield self._convert_read(segment, locations)
+
+    def get_mate(
+        self, read: entities.PlacedSegment
+    ) -> Optional[entities.PlacedSegment]:
+        """The primary segment of the other read at the mate position of `read`,
+        None for supplementary segments and when it was not kept"""
+        segment = read.content
+        if segment.flag & SamFlag.is_supplementary or segment.next_reference_id < 0:
+            return None
+        not_primary = SamFlag.is_secondary | SamFlag.is_supplementary
+        mates = [
+            item
+            for item in self._stream.get().get_read_pair(read.read_name)
+            if not item.flag & not_primary
+            and item.is_read1 != segment.is_read1
+            and item.reference_id == segment.next_reference_id
+            and item.reference_start == segment.next_reference_start
+        ]
+        # more than one possible mate is unexpected, but we silently carry on
+        if len(mates) != 1:
+            return None
+        return self._convert_read(mates[0], frozenset())
+
+    def get_mates(
+        self, reads: Sequence[entities.PlacedSegment]
+    ) -> List[Optional[entities.PlacedSegment]]:
+        return [self.get_mate(read) for read in reads]
+
+    def get_mate_exact_position(self, read: entities.PlacedSegment) -> Tuple[str, int]:
+        mate_name = str(read.content.next_reference_name)
+        mate_start = read.content.next_reference_start + 1
+        return mate_name, mate_start
+
+    def _convert_read(
+        self,
+        read: pysam.AlignedSegment,
+        locations: FrozenSet[entities.GenomicRegion],
+    ) -> entities.PlacedSegment:
+        read_order = self._read_map[read.is_read1]
+        result = entities.PlacedSegment(
+            str(read.query_name), locations, read_order, read
+        )
+        return result
+
+
+class TemplatePlacedSegmentRepository(
+    StreamedPlacedSegmentRepository, repositories.ReadPairRepository
+):
+    """PlacedSegmentRepository of the whole templates kept by a
+    `TemplateStream`, which builds read pairs without looking up mates"""
+
+    def get_read_pairs(
+        self,
+        a_locations: FrozenSet[entities.GenomicRegion],
+        b_locations: FrozenSet[entities.GenomicRegion],
+        exclude: List[repositories.ReadQuery],
+        min_quality: int = 0,
+        b_min_quality: int = 0,
+    ) -> Iterator[entities.ReadPair]:
+        evidence = self._stream.get()
+        a_filter = pysam_repositories.SegmentFilter(exclude, min_quality)
+        b_filter = pysam_repositories.SegmentFilter(exclude, b_min_quality)
+        names = {
+            str(segment.query_name)
+            for segment in evidence.get_overlapping(a_locations)
+            if a_filter(segment)
+        }
+        for name in sorted(names):
+            read_pair = entities.ReadPair()
+            for segment in evidence.get_read_pair(name):
+                if a_filter(segment) and pysam_repositories.overlaps_any(
+                    segment, a_locations
+                ):
+                    read_pair.allocate(self._convert_read(segment, a_locations))
+                if b_filter(segment) and pysam_repositories.overlaps_any(
+                    segment, b_locations
+                ):
+                    read_pair.allocate(self._convert_read(segment, b_locations))
+            yield read_pair
+
+    def get_mate(
+        self, read: entities.PlacedSegment
+    ) -> Optional[entities.PlacedSegment]:
+        """The primary segment of the other read of the template, mapped or
+        not. None for templates of a single read"""
+        segment = read.content
+        not_primary = SamFlag.is_secondary | SamFlag.is_supplementary
+        mates = [
+            item
+            for item in self._stream.get().get_read_pair(read.read_name)
+            if not item.flag & not_primary and item.is_read1 != segment.is_read1
+        ]
+        if len(mates) != 1 or not segment.is_paired:
+            return None
+        return self._convert_read(mates[0], frozenset())
+
+
+class StreamingSegmentRepositoryFactory(repositories.SegmentRepositoryFactory):
+    """Repositories and counters sharing a single `AlignmentStream` of
+    `bam_file`, which is read the first time segments or counts are needed.
+
+    Reads are counted exactly in that pass, unless their number is provided:
+    other counting methods need random access to the file or its index. Files
+    `grouped_by_name` are read by template (see `TemplateStream`)"""
+
+    evidence_regions = [
+        entities.RegionsName.CoreDUX4,
+        entities.RegionsName.ExtendedDUX4,
+        entities.RegionsName.IGH,
+    ]
+
+    def __init__(
+        self,
+        bam_file: pathlib.Path,
+        notification_factory: notifications.NotificationServiceFactory,
+        number_of_threads: int = 1,
+        reference: Optional[pathlib.Path] = None,
+        max_segments: Optional[int] = None,
+        grouped_by_name: bool = False,
+    ):
+        self.notification_factory = notification_factory
+        self._grouped_by_name = grouped_by_name
+        region_repo = repositories.BuiltinRegionRepository()
+        regions = [
+            region
+            for name in self.evidence_regions
+            for region in region_repo.get(name).regions
+        ]
+        stream_class = TemplateStream if grouped_by_name else AlignmentStream
+        self._stream = stream_class(
+            bam_file, regions, number_of_threads, reference, max_segments
+        )
+
+    def build_counter(
+        self,
+        features: FrozenSet[repositories.SegmentRepoFeature],
+        total_number_of_reads: Optional[int],
+    ) -> repositories.SegmentCounter:
+        if repositories.SegmentRepoFeature.BUILTIN in features:
+            if total_number_of_reads is None:
+                raise caller_factories.MissingArgumentError("total_number_of_reads")
+            return repositories.ProvidedSegmentCounter(total_number_of_reads)
+        with_notification = (
+            repositories.SegmentRepoFeature.WITH_NOTIFICATION in features
+        )
+        return self.__build_singleton_counter(with_notification)
+
+    @functools.lru_cache(maxsize=2)
+    def __build_singleton_counter(
+        self, with_notification: bool
+    ) -> repositories.CachedSegmentCounter:
+        result: repositories.SegmentCounter = StreamedSegmentCounter(self._stream)
+        if with_notification:
+            notification_service = self.notification_factory.build()
+            result = notifications.NotifySegmentCounter(result, notification_service)
+        return repositories.CachedSegmentCounter(result)
+
+    def build(
+        self,
+        features: FrozenSet[repositories.SegmentRepoFeature],
+        total_number_of_reads: Optional[int],
+    ) -> repositories.PlacedSegmentRepository:
+        counter = self.build_counter(features, total_number_of_reads)
+        if self._grouped_by_name:
+            return TemplatePlacedSegmentRepository(self._stream, counter)
+        return StreamedPlacedSegmentRepository(self._stream, counter)
@@ -1,6 +1,7 @@
 """Interactors covering all usecases for pelops"""
 
 import abc
+import dataclasses
 from typing import FrozenSet, List
 
 from ilmn.pelops import entities, repositories, request_models, result_models
@@ -45,7 +46,10 @@ def convert_rearrangement(
     rearrangement: entities.Rearrangement,
 ) -> result_models.RearrangementDTO:
     evidence = result_models.ReadsEvidence(
-        rearrangement.counts.paired, rearrangement.counts.split, rearrangement.srpb
+        rearrangement.counts.paired,
+        rearrangement.counts.split,
+        rearrangement.srpb,
+        rearrangement.srpb_error,
     )
     segments = [convert_segment(item) for item in rearrangement.segments]
     a, b = rearrangement.region_pair
@@ -58,6 +62,43 @@ def convert_rearrangement(
     return result
 
 
+def get_counter_features(
+    features: FrozenSet[request_models.Feature],
+) -> FrozenSet[repositories.SegmentRepoFeature]:
+    converter = {
+        request_models.Feature.WITH_NOTIFICATIONS: repositories.SegmentRepoFeature.WITH_NOTIFICATION,
+        request_models.Feature.PROVIDED_READ_COUNT: repositories.SegmentRepoFeature.BUILTIN,
+        request_models.Feature.INDEX_READ_COUNT: repositories.SegmentRepoFeature.INDEX_STATISTICS,
+        request_models.Feature.HISTOGRAM_READ_COUNT: repositories.SegmentRepoFeature.FLAG_HISTOGRAM,
+        request_models.Feature.ESTIMATED_READ_COUNT: repositories.SegmentRepoFeature.SAMPLING,
+        request_models.Feature.METRICS_READ_COUNT: repositories.SegmentRepoFeature.METRICS_FILE,
+    }
+    result = [converter[feature] for feature in features if feature in converter]
+    return frozenset(result)
+
+
+def get_count_mode(
+    features: FrozenSet[request_models.Feature], counter: repositories.SegmentCounter
+) -> result_models.CountMode:
+    """Provided read count takes precedence over any computed count, and the
+    counter may know better than the request (see `get_count_mode`)"""
+    count_mode = counter.get_count_mode()
+    if request_models.Feature.PROVIDED_READ_COUNT in features:
+        return result_models.CountMode.PROVIDED
+    elif count_mode is not None:
+        return result_models.CountMode[count_mode]
+    elif request_models.Feature.METRICS_READ_COUNT in features:
+        return result_models.CountMode.METRICS
+    elif request_models.Feature.INDEX_READ_COUNT in features:
+        return result_models.CountMode.INDEX
+    elif request_models.Feature.HISTOGRAM_READ_COUNT in features:
+        return result_models.CountMode.HISTOGRAM
+    elif request_models.Feature.ESTIMATED_READ_COUNT in features:
+        return result_models.CountMode.ESTIMATE
+    else:
+        return result_models.CountMode.EXACT
+
+
 class ClassifyInteractor:
     def __init__(
         self,
@@ -74,6 +115,13 @@ class ClassifyInteractor:
     ) -> result_models.ClassifyResult:
         """Classify reads spanning several GenomiRegionSets pairs into
         spanning, paired, and split reads."""
+        reads_counter = self._repo_factory.build_counter(
+            get_counter_features(request.features),
+            request.total_number_of_reads,
+        )
+        # counting reads is independent of calling rearrangements
+        reads_counter.start_counting()
+
         rearrangement_caller = self._caller_factory.build(
             self.__get_caller_type(request.features),
             self.__get_caller_features(request.features),
@@ -82,19 +130,24 @@ class ClassifyInteractor:
             request.total_number_of_reads,
         )
 
-        reads_counter = self._repo_factory.build_counter(
-            self.__get_counter_features(request.features),
-            request.total_number_of_reads,
-        )
-
-        rearrangements = [
-            convert_rearrangement(item)
-            for item in rearrangement_caller.get_rearrangements()
-        ]
+        try:
+            rearrangements = list(rearrangement_caller.get_rearrangements())
+            if request_models.Feature.EXPORT_SEGMENTS in request.features:
+                rearrangements = [self.__load_segments(item) for item in rearrangements]
+        finally:
+            self._repo_factory.close()
+        unique_mapped_reads = reads_counter.get_number_of_segments()
+        relative_error = reads_counter.get_relative_error()
+        if relative_error is None:
+            unique_mapped_reads_error = None
+        else:
+            unique_mapped_reads_error = round(unique_mapped_reads * relative_error)
         result = result_models.ClassifyResult(
             reference=result_models.ReferenceGenome.GRCh38,
-            unique_mapped_reads=reads_counter.get_number_of_segments(),
-            rearrangements=list(rearrangements),
+            unique_mapped_reads=unique_mapped_reads,
+            rearrangements=[convert_rearrangement(item) for item in rearrangements],
+            count_mode=get_count_mode(request.features, reads_counter),
+            unique_mapped_reads_error=unique_mapped_reads_error,
         )
         return result
 
@@ -104,6 +157,14 @@ class ClassifyInteractor:
         result = self.get_rearrangement_evidence(request)
         self._presenter.present_classification(result)
 
+    def __load_segments(
+        self, rearrangement: entities.Rearrangement
+    ) -> entities.Rearrangement:
+        """Segments are exported with their full content"""
+        segments = self._repo_factory.load_segments(rearrangement.segments)
+        result = dataclasses.replace(rearrangement, segments=set(segments))
+        return result
+
     def __get_caller_type(
         self, features: FrozenSet[request_models.Feature]
     ) -> caller_factories.CallerType:
@@ -117,18 +178,14 @@ class ClassifyInteractor:
     ) -> FrozenSet[caller_factories.CallerFeature]:
         converter = {
             request_models.Feature.PROVIDED_READ_COUNT: caller_factories.CallerFeature.WITH_PROVIDED_READ_COUNT,
+            request_models.Feature.INDEX_READ_COUNT: caller_factories.CallerFeature.WITH_INDEX_READ_COUNT,
+            request_models.Feature.HISTOGRAM_READ_COUNT: caller_factories.CallerFeature.WITH_HISTOGRAM_READ_COUNT,
+            request_models.Feature.ESTIMATED_READ_COUNT: caller_factories.CallerFeature.WITH_ESTIMATED_READ_COUNT,
+            request_models.Feature.METRICS_READ_COUNT: caller_factories.CallerFeature.WITH_METRICS_READ_COUNT,
             request_models.Feature.WITH_BLACKLIST: caller_factories.CallerFeature.WITH_BLACKLIST,
             request_models.Feature.WITH_NOTIFICATIONS: caller_factories.CallerFeature.WITH_NOTIFICATIONS,
-        }
-        result = [converter[feature] for feature in features if feature in converter]
-        return frozenset(result)
-
-    def __get_counter_features(
-        self, features: FrozenSet[request_models.Feature]
-    ) -> FrozenSet[repositories.SegmentRepoFeature]:
-        converter = {
-            request_models.Feature.WITH_NOTIFICATIONS: repositories.SegmentRepoFeature.WITH_NOTIFICATION,
-            request_models.Feature.PROVIDED_READ_COUNT: repositories.SegmentRepoFeature.BUILTIN,
+            request_models.Feature.SPLIT_FROM_TAGS: caller_factories.CallerFeature.WITH_SPLIT_FROM_TAGS,
+            request_models.Feature.DISCORDANT_INDEX: caller_factories.CallerFeature.WITH_DISCORDANT_INDEX,
         }
         result = [converter[feature] for feature in features if feature in converter]
         return frozenset(result)
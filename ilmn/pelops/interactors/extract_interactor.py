@@ -0,0 +1,52 @@
+"""Interactor saving the evidence of a sample, to call it again quickly"""
+
+from ilmn.pelops import entities, repositories, request_models
+from ilmn.pelops.interactors import classify_interactor
+
+
+class ExtractInteractor:
+    """Save the reads of the builtin regions, with their mates and supplementary
+    alignments, and the number of reads used for normalisation: all that
+    callers use from an alignment file"""
+
+    region_names = [
+        entities.RegionsName.CoreDUX4,
+        entities.RegionsName.ExtendedDUX4,
+        entities.RegionsName.IGH,
+    ]
+
+    def __init__(
+        self,
+        repository_factory: repositories.SegmentRepositoryFactory,
+        region_repository: repositories.RegionRepository,
+        evidence_repository: repositories.EvidenceRepository,
+    ):
+        self._repo_factory = repository_factory
+        self._region_repo = region_repository
+        self._evidence_repo = evidence_repository
+
+    def extract_evidence(self, request: request_models.ExtractRequest) -> None:
+        reads_counter = self._repo_factory.build_counter(
+            classify_interactor.get_counter_features(request.features),
+            request.total_number_of_reads,
+        )
+        # counting reads is independent of collecting evidence
+        reads_counter.start_counting()
+
+        locations = frozenset(
+            region
+            for name in self.region_names
+            for region in self._region_repo.get(name).regions
+        )
+        try:
+            self._evidence_repo.add(locations)
+            count_mode = classify_interactor.get_count_mode(
+                request.features, reads_counter
+            )
+            self._evidence_repo.save(
+                reads_counter.get_number_of_segments(),
+                reads_counter.get_relative_error(),
+                count_mode.name,
+            )
+        finally:
+            self._repo_factory.close()
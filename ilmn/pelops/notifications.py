@@ -1,6 +1,6 @@
 import abc
 import functools
-from typing import FrozenSet, Iterable, List, Optional
+from typing import FrozenSet, Iterable, Iterator, List, Optional, Sequence
 
 from ilmn.pelops import entities, repositories
 from ilmn.pelops.callers import read_callers, region_pair_callers
@@ -64,6 +64,14 @@ class NotifySegmentCounter(repositories.SegmentCounter):
         self.__notification_service.notify(message)
         return self.__read_counter.get_number_of_segments(exclude)
 
+    def get_relative_error(
+        self, exclude: Optional[List[repositories.ReadQuery]] = None
+    ) -> Optional[float]:
+        return self.__read_counter.get_relative_error(exclude)
+
+    def get_count_mode(self) -> Optional[str]:
+        return self.__read_counter.get_count_mode()
+
 
 class NotifyReadsCaller(read_callers.ReadsCaller):
     def __init__(
@@ -88,6 +96,17 @@ class NotifyReadsCaller(read_callers.ReadsCaller):
     def get_segments_of_spanning_reads(self) -> Iterable[entities.PlacedSegment]:
         return self.read_caller.get_segments_of_spanning_reads()
 
+    def get_spanning_evidence(
+        self,
+        a_regions: FrozenSet[entities.GenomicRegion],
+        all_b_regions: Sequence[FrozenSet[entities.GenomicRegion]],
+    ) -> Iterator[read_callers.SpanningEvidence]:
+        for evidence in self.read_caller.get_spanning_evidence(
+            a_regions, all_b_regions
+        ):
+            self.notification_service.notify("Finding evidence for rearrangement.")
+            yield evidence
+
 
 class NotifyRegionPairCaller(region_pair_callers.CompoundRegionPairCaller):
     def __init__(
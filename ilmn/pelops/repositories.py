@@ -1,7 +1,7 @@
 import abc
 import enum
 import functools
-from typing import FrozenSet, Iterable, List, Optional, Tuple
+from typing import Dict, FrozenSet, Iterable, List, Optional, Sequence, Tuple
 
 from ilmn.pelops import entities
 
@@ -24,6 +24,23 @@ class SegmentCounter(abc.ABC):
     def get_number_of_segments(self, exclude: Optional[List[ReadQuery]] = None) -> int:
         """Count total number of reads, excluding given list of `ReadQuery`"""
 
+    def get_relative_error(
+        self, exclude: Optional[List[ReadQuery]] = None
+    ) -> Optional[float]:
+        """Relative error (95% confidence) of `get_number_of_segments` when it is
+        estimated, None if the count is exact or its error unknown"""
+        return None
+
+    def start_counting(self, exclude: Optional[List[ReadQuery]] = None) -> None:
+        """Hint that `get_number_of_segments` will be called with `exclude`, so
+        counters able to count in the background can start. Does nothing by
+        default"""
+
+    def get_count_mode(self) -> Optional[str]:
+        """Name of the `result_models.CountMode` of the number of segments, when
+        the counter knows it better than the request. None by default"""
+        return None
+
 
 class ProvidedSegmentCounter(SegmentCounter):
     def __init__(self, provided_number_of_reads: int):
@@ -44,6 +61,17 @@ class CachedSegmentCounter(SegmentCounter):
             hashable_exclude = frozenset(exclude)
         return self._get_number_of_segments(hashable_exclude)
 
+    def get_relative_error(
+        self, exclude: Optional[List[ReadQuery]] = None
+    ) -> Optional[float]:
+        return self.counter.get_relative_error(exclude)
+
+    def start_counting(self, exclude: Optional[List[ReadQuery]] = None) -> None:
+        self.counter.start_counting(exclude)
+
+    def get_count_mode(self) -> Optional[str]:
+        return self.counter.get_count_mode()
+
     @functools.lru_cache(maxsize=1024)
     def _get_number_of_segments(
         self, hashable_exclude: Optional[FrozenSet[ReadQuery]]
@@ -66,16 +94,92 @@ class PlacedSegmentRepository(SegmentCounter):
     ) -> Iterable[entities.PlacedSegment]:
         """Retrieve segments placed in `location` and cache them"""
 
+    def get_with_partners(
+        self,
+        locations: FrozenSet[entities.GenomicRegion],
+        partner_locations: FrozenSet[entities.GenomicRegion],
+        exclude: List[ReadQuery],
+        min_quality: int = 0,
+        partner_min_quality: int = 0,
+    ) -> Iterable[entities.PlacedSegment]:
+        """Retrieve segments placed in `locations`, each followed by the segments
+        of its read pair placed in `partner_locations` (with at least
+        `partner_min_quality`). Override to know partners from the segment
+        itself, without reading `partner_locations`"""
+        partners: Dict[str, List[entities.PlacedSegment]] = {}
+        for partner in self.get(partner_locations, exclude, partner_min_quality):
+            partners.setdefault(partner.read_name, []).append(partner)
+        for segment in self.get(locations, exclude, min_quality):
+            yield segment
+            yield from partners.get(segment.read_name, [])
+
     @abc.abstractmethod
     def get_mate(
         self, read: entities.PlacedSegment
     ) -> Optional[entities.PlacedSegment]:
         """Retrieve paired segment of given read"""
 
+    def get_mates(
+        self, reads: Sequence[entities.PlacedSegment]
+    ) -> List[Optional[entities.PlacedSegment]]:
+        """Retrieve paired segments of many reads, in the same order. Override
+        to retrieve them faster than with `get_mate` for each read"""
+        return [self.get_mate(read) for read in reads]
+
     @abc.abstractmethod
     def get_mate_exact_position(self, read: entities.PlacedSegment) -> Tuple[str, int]:
         """Get contig name and starting position of read mate"""
 
+    def get_mate_positions(
+        self,
+        locations: FrozenSet[entities.GenomicRegion],
+        exclude: List[ReadQuery],
+        min_quality: int = 0,
+    ) -> Iterable[Tuple[str, int]]:
+        """`get_mate_exact_position` of the segments `get` retrieves. Override
+        to find them without retrieving the segments"""
+        for segment in self.get(locations, exclude, min_quality):
+            yield self.get_mate_exact_position(segment)
+
+
+class ReadPairRepository(PlacedSegmentRepository):
+    """PlacedSegmentRepository knowing all the segments of a read pair together,
+    such as one reading an alignment file grouped by read name"""
+
+    @abc.abstractmethod
+    def get_read_pairs(
+        self,
+        a_locations: FrozenSet[entities.GenomicRegion],
+        b_locations: FrozenSet[entities.GenomicRegion],
+        exclude: List[ReadQuery],
+        min_quality: int = 0,
+        b_min_quality: int = 0,
+    ) -> Iterable[entities.ReadPair]:
+        """Read pairs with segments placed in `a_locations`, made of these
+        segments and of those placed in `b_locations` with at least
+        `b_min_quality`"""
+
+
+class EvidenceRepository(abc.ABC):
+    """Evidence of a sample, saved so that it can be called again without the
+    original alignment file"""
+
+    @abc.abstractmethod
+    def add(self, locations: FrozenSet[entities.GenomicRegion]) -> None:
+        """Collect the segments placed in `locations`, with the other segments of
+        their read pairs: mates and supplementary alignments"""
+
+    @abc.abstractmethod
+    def save(
+        self,
+        number_of_segments: int,
+        relative_error: Optional[float],
+        count_mode: str,
+    ) -> None:
+        """Save the collected segments with the number of segments used for
+        normalisation, its relative error and the name of its
+        `result_models.CountMode`"""
+
 
 class RegionRepository(abc.ABC):
     @abc.abstractmethod
@@ -164,6 +268,11 @@ class RegionRepositoryFactory(abc.ABC):
 class SegmentRepoFeature(enum.Enum):
     WITH_NOTIFICATION = enum.auto()
     BUILTIN = enum.auto()
+    INDEX_STATISTICS = enum.auto()
+    FLAG_HISTOGRAM = enum.auto()
+    SAMPLING = enum.auto()
+    METRICS_FILE = enum.auto()
+    DISCORDANT_INDEX = enum.auto()
 
 
 class SegmentRepositoryFactory(abc.ABC):
@@ -182,3 +291,14 @@ class SegmentRepositoryFactory(abc.ABC):
         total_number_of_reads: Optional[int],
     ) -> PlacedSegmentRepository:
         """Build a PlacedSegmentRepository"""
+
+    def load_segments(
+        self, segments: Iterable[entities.PlacedSegment]
+    ) -> List[entities.PlacedSegment]:
+        """`segments` with their full content, for repositories keeping only a
+        part of it. Segments are returned unchanged by default"""
+        return list(segments)
+
+    def close(self) -> None:
+        """Release the resources shared by the repositories built, once they are
+        no longer used"""
@@ -6,8 +6,15 @@ from typing import FrozenSet, Optional
 class Feature(enum.Enum):
     DUX4_OTHER = enum.auto()
     PROVIDED_READ_COUNT = enum.auto()
+    INDEX_READ_COUNT = enum.auto()
+    HISTOGRAM_READ_COUNT = enum.auto()
+    ESTIMATED_READ_COUNT = enum.auto()
+    METRICS_READ_COUNT = enum.auto()
     WITH_BLACKLIST = enum.auto()
     WITH_NOTIFICATIONS = enum.auto()
+    SPLIT_FROM_TAGS = enum.auto()
+    DISCORDANT_INDEX = enum.auto()
+    EXPORT_SEGMENTS = enum.auto()
 
 
 @dataclasses.dataclass
@@ -16,3 +23,9 @@ class ClassifyRequest:
     minimum_mapping_quality: Optional[int] = None
     srpb_threshold: Optional[float] = None
     total_number_of_reads: Optional[int] = None
+
+
+@dataclasses.dataclass
+class ExtractRequest:
+    features: FrozenSet[Feature] = frozenset()
+    total_number_of_reads: Optional[int] = None
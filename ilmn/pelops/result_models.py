@@ -13,6 +13,17 @@ class ReferenceGenome(enum.Enum):
     GRCh38 = enum.auto()
 
 
+class CountMode(enum.Enum):
+    """How the number of unique and mapped reads was obtained"""
+
+    EXACT = enum.auto()
+    INDEX = enum.auto()
+    HISTOGRAM = enum.auto()
+    ESTIMATE = enum.auto()
+    METRICS = enum.auto()
+    PROVIDED = enum.auto()
+
+
 @dataclasses.dataclass(frozen=True)
 class GenomicRegionDTO:
     chrom: str
@@ -31,6 +42,7 @@ class ReadsEvidence:
     paired: int
     split: int
     SRPB: float  # spanning read pairs per billion
+    SRPB_error: Optional[float] = None  # half-width of the confidence interval
 
 
 @dataclasses.dataclass(frozen=True)
@@ -52,3 +64,5 @@ class ClassifyResult:
     reference: ReferenceGenome
     unique_mapped_reads: int
     rearrangements: List[RearrangementDTO]
+    count_mode: CountMode = CountMode.EXACT
+    unique_mapped_reads_error: Optional[int] = None
@@ -39,7 +39,7 @@ class NamedRegionSelector(RegionSelector):
     def __call__(self, region: entities.GenomicRegion) -> bool:
         if not self._regionset:
             self._regionset = self._repo.get(self._region_name)
-        result = any([region.overlaps(target) for target in self._regionset.regions])
+        result = self._regionset.overlaps(region)
         return result
 
 
@@ -1,6 +1,8 @@
 """Store data in domain specific objects"""
 
-from typing import Container, Dict, Iterable, Iterator, Set, Tuple, cast
+import abc
+import array
+from typing import Container, Dict, Iterable, Iterator, List, Optional, Set, cast
 
 from ilmn.pelops import entities
 
@@ -17,7 +19,52 @@ class UnnamedReadPairError(ValueError):
         super().__init__(message)
 
 
-class PairedReadStore:
+class ReadPairStore(abc.ABC):
+    """Initialise, Store and Mark ReadPairs"""
+
+    @abc.abstractmethod
+    def __iter__(self) -> Iterator[entities.ReadPair]:
+        """Stored read pairs"""
+
+    @abc.abstractmethod
+    def mark_as_split(self, read: entities.ReadPair) -> None:
+        """Mark the read pair as having a split read"""
+
+    @abc.abstractmethod
+    def mark_as_paired(self, read: entities.ReadPair) -> None:
+        """Mark the read pair as an improper pair"""
+
+    @abc.abstractmethod
+    def mark_as_spanning(self, read: entities.ReadPair) -> None:
+        """Mark the read pair as spanning"""
+
+    @abc.abstractmethod
+    def get_segment_count(self) -> entities.ClassifiedSegmentCount:
+        """Number of read pairs marked in each class"""
+
+    @abc.abstractmethod
+    def get_read_names(self) -> Container[str]:
+        """Names of the stored read pairs"""
+
+    @abc.abstractmethod
+    def get_read_pair(self, name: str) -> entities.ReadPair:
+        """Stored read pair named `name`, raise UnknowReadPairError if there is
+        none"""
+
+    @abc.abstractmethod
+    def update(self, read_pair: entities.ReadPair) -> None:
+        """Store the read pair, replacing the one with the same name"""
+
+    @abc.abstractmethod
+    def get_spanning_reads(self) -> Iterable[entities.ReadPair]:
+        """Read pairs marked as spanning"""
+
+    @abc.abstractmethod
+    def clear(self) -> None:
+        """Remove all read pairs and marks"""
+
+
+class PairedReadStore(ReadPairStore):
     """Initialise, Store and Mark ReadPairs"""
 
     def __init__(self) -> None:
@@ -74,57 +121,151 @@ class PairedReadStore:
         self._paired.clear()
 
 
-class SingleChromosomeRegionStore:
-    """Store GenomicRegions for a particular chromosome and count repeated
-    occurrences"""
-
-    def __init__(self, chromosome_name: str):
-        self._chrom_name = chromosome_name
-        self._store: Dict[entities.GenomicRegion, int] = {}
+class StoredReadNames(Container[str]):
+    """Names of the read pairs of a CompactPairedReadStore"""
 
-    def add(self, region: entities.GenomicRegion) -> None:
-        if region.chrom != self._chrom_name:
-            raise KeyError(f"Unable to add region from chromosome {region.chrom}")
-        elif region not in self._store.keys():
-            self._store[region] = 0
-        self._store[region] += 1
+    def __init__(self, store: "CompactPairedReadStore"):
+        self._store = store
 
-    def get(self) -> Iterable[Tuple[entities.GenomicRegion, int]]:
-        regions = sorted(self._store.keys(), key=lambda region: region.start)
-        for region in regions:
-            yield region, self._store[region]
+    def __contains__(self, name: object) -> bool:
+        return isinstance(name, str) and self._store.find(name) is not None
 
-    def delete(self, region: entities.GenomicRegion) -> None:
-        del self._store[region]
 
+class CompactPairedReadStore(ReadPairStore):
+    """Store ReadPairs as few objects: read pairs are numbered and indexed by
+    a 64-bit hash of their name, their segments are chained in flat arrays and
+    their marks are bit flags. Read pairs are built again when requested, so
+    changes to a read pair are only kept once it is updated"""
 
-class RegionStore:
-    """Store GenomicRegions sorted by chromosome and start position and count
-    repeated occurrences"""
+    SPLIT = 1
+    PAIRED = 2
+    SPANNING = 4
 
     def __init__(self) -> None:
-        self._store: Dict[str, "SingleChromosomeRegionStore"] = {}
-
-    def add(self, region: entities.GenomicRegion) -> None:
-        if region.chrom not in self._store.keys():
-            self._store[region.chrom] = SingleChromosomeRegionStore(region.chrom)
-        ministore = self._store[region.chrom]
-        ministore.add(region)
-
-    def get_counted_regions(self) -> Iterable[Tuple[entities.GenomicRegion, int]]:
-        """Get regions and number of observed occurrences sorted by chromosome
-        and start"""
-
-        for chrom in sorted(self._store.keys()):
-            ministore = self._store[chrom]
-            for region, count in ministore.get():
-                yield region, count
-
-    def get_regions(self) -> Iterator[entities.GenomicRegion]:
-        """Get regions of observed occurrences sorted by chromosome and start"""
-        for region, count in self.get_counted_regions():
-            yield region
-
-    def delete(self, region: entities.GenomicRegion) -> None:
-        ministore = self._store[region.chrom]
-        ministore.delete(region)
+        self.clear()
+
+    def __iter__(self) -> Iterator[entities.ReadPair]:
+        for number in range(len(self._names)):
+            yield self._build(number)
+
+    def find(self, name: str) -> Optional[int]:
+        """Number of the read pair named `name`, None if it is not stored"""
+        number = self._numbers.get(hash(name))
+        if number is not None and self._names[number] == name:
+            return number
+        return self._colliding.get(name)
+
+    def mark_as_split(self, read: entities.ReadPair) -> None:
+        self._mark(read, self.SPLIT)
+
+    def mark_as_paired(self, read: entities.ReadPair) -> None:
+        self._mark(read, self.PAIRED)
+
+    def mark_as_spanning(self, read: entities.ReadPair) -> None:
+        self._mark(read, self.SPANNING)
+
+    def get_segment_count(self) -> entities.ClassifiedSegmentCount:
+        result = entities.ClassifiedSegmentCount(
+            self._counts[self.PAIRED],
+            self._counts[self.SPLIT],
+            self._counts[self.SPANNING],
+        )
+        return result
+
+    def get_read_names(self) -> Container[str]:
+        return StoredReadNames(self)
+
+    def get_read_pair(self, name: str) -> entities.ReadPair:
+        number = self.find(name)
+        if number is None:
+            raise UnknowReadPairError(name)
+        return self._build(number)
+
+    def update(self, read_pair: entities.ReadPair) -> None:
+        read_name = read_pair.get_name()
+        if read_name is None:
+            raise UnnamedReadPairError()
+        number = self.find(read_name)
+        if number is None:
+            number = self._add(read_name)
+        self._set_segments(number, read_pair.get_segments())
+
+    def get_spanning_reads(self) -> Iterable[entities.ReadPair]:
+        for number, flags in enumerate(self._flags):
+            if flags & self.SPANNING:
+                yield self._build(number)
+
+    def clear(self) -> None:
+        # read pair numbers by hash of their name, and by name when the hash
+        # is already taken by another name
+        self._numbers: Dict[int, int] = {}
+        self._colliding: Dict[str, int] = {}
+        self._names: List[str] = []
+        self._first_segments: "array.array[int]" = array.array("q")
+        self._flags = bytearray()
+        # segments of all read pairs, each with the index of the next segment
+        # of its read pair, -1 for the last one
+        self._segments: List[entities.PlacedSegment] = []
+        self._next_segments: "array.array[int]" = array.array("q")
+        self._counts = {self.SPLIT: 0, self.PAIRED: 0, self.SPANNING: 0}
+
+    def _add(self, name: str) -> int:
+        number = len(self._names)
+        key = hash(name)
+        if key in self._numbers:
+            self._colliding[name] = number
+        else:
+            self._numbers[key] = number
+        self._names.append(name)
+        self._first_segments.append(-1)
+        self._flags.append(0)
+        return number
+
+    def _set_segments(
+        self, number: int, segments: Iterable[entities.PlacedSegment]
+    ) -> None:
+        """Replace the segments of read pair `number`, reusing the entries of
+        its chain: a read pair updated with one more segment only takes one
+        more entry"""
+        index = self._first_segments[number]
+        previous = -1
+        for segment in segments:
+            if index < 0:
+                index = len(self._segments)
+                self._segments.append(segment)
+                self._next_segments.append(-1)
+                if previous < 0:
+                    self._first_segments[number] = index
+                else:
+                    self._next_segments[previous] = index
+            else:
+                self._segments[index] = segment
+            previous = index
+            index = self._next_segments[index]
+        # entries left over by fewer segments are unlinked, until cleared
+        if previous < 0:
+            self._first_segments[number] = -1
+        else:
+            self._next_segments[previous] = -1
+
+    def _get_segments(self, number: int) -> Iterator[entities.PlacedSegment]:
+        index = self._first_segments[number]
+        while index >= 0:
+            yield self._segments[index]
+            index = self._next_segments[index]
+
+    def _build(self, number: int) -> entities.ReadPair:
+        result = entities.ReadPair()
+        for segment in self._get_segments(number):
+            result.allocate(segment)
+        return result
+
+    def _mark(self, read: entities.ReadPair, flag: int) -> None:
+        read_name = cast(str, read.get_name())
+        number = self.find(read_name)
+        if number is None:
+            self.update(read)
+            number = cast(int, self.find(read_name))
+        if not self._flags[number] & flag:
+            self._flags[number] |= flag
+            self._counts[flag] += 1
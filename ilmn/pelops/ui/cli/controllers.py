@@ -18,6 +18,13 @@ def add_custom_help(parser: argparse.ArgumentParser) -> None:
     )
 
 
+def non_negative_int(value: str) -> int:
+    result = int(value)
+    if result < 0:
+        raise argparse.ArgumentTypeError(f"{value} is negative")
+    return result
+
+
 def build_parser() -> argparse.ArgumentParser:
     parser = argparse.ArgumentParser(
         prog="pelops",
@@ -38,11 +45,85 @@ def build_parser() -> argparse.ArgumentParser:
         add_help=False,
     )
     populate_classify_parser(dux4r_parser)
+    extract_parser = subparsers.add_parser(
+        "extract",
+        help="""Save the reads used to find DUX4-rearrangements, and the number of
+        reads used for normalisation, in a small BAM file which `dux4r` accepts as
+        input. Enter `%(prog)s extract --help` for more info.""",
+        add_help=False,
+    )
+    populate_extract_parser(extract_parser)
     return parser
 
 
+def add_read_count_arguments(parser: argparse.ArgumentParser) -> None:
+    """Arguments to read the input file and count its reads, shared by
+    `dux4r` and `extract`"""
+    parser.add_argument(
+        "--total-number-reads",
+        type=int,
+        help="""Number of reads to use for normalisation.
+            If not provided, the total number of unique and mapped reads in the
+            BAM file will be used.""",
+        metavar="INT",
+    )
+    parser.add_argument(
+        "--count-mode",
+        help="""How to compute the number of reads used for normalisation when
+        `--total-number-reads` is not provided. `exact` counts unique and mapped
+        reads in the input file; `index` sums mapped reads from the BAM/CRAM index,
+        which is much faster but also includes duplicated, secondary and
+        supplementary alignments; `histogram` gives the same count as `exact` from
+        a single pass histogram of SAM flags, which is saved for later runs when
+        counts are cached; `estimate` extrapolates the count from a random sample
+        of the indexed input and reports the 95%% confidence interval of SRPB.
+        [DEFAULT=%(default)s]""",
+        choices=["exact", "index", "histogram", "estimate"],
+        default="exact",
+    )
+    parser.add_argument(
+        "--read-count-from",
+        help="""Path to mapping metrics of the input file, from which to read the
+        number of reads used for normalisation when `--total-number-reads` is not
+        provided: DRAGEN `mapping_metrics.csv`, `samtools flagstat` or
+        `samtools stats` output. Takes precedence over `--count-mode`.""",
+        metavar="FILE",
+    )
+    parser.add_argument(
+        "--cache-counts",
+        help="""If provided, the number of reads computed for normalisation is
+        saved next to the input file and reused by later runs on the same file.""",
+        action="store_true",
+    )
+    parser.add_argument(
+        "--count-cache-dir",
+        help="""Like `--cache-counts`, but save the number of reads in this
+        folder instead of next to the input file.""",
+        metavar="DIR",
+    )
+    parser.add_argument(
+        "--threads",
+        type=int,
+        help="""Number of threads to use when computing total number of reads
+        in the input file, and to compress exported reads. With more than one
+        thread, contigs are counted in parallel processes and large regions are
+        read in chunks decoded in parallel. [DEFAULT=%(default)s]""",
+        metavar="INT",
+        default=1,
+    )
+    parser.add_argument(
+        "--reference",
+        help="""Reference FASTA file of a CRAM input file, or REF_CACHE folder of
+        its reference sequences. When provided, reference sequences missing from
+        it are never downloaded.""",
+        metavar="FILE|DIR",
+    )
+
+
 def populate_classify_parser(classify_parser: argparse.ArgumentParser) -> None:
-    classify_parser.add_argument("infile", help="Path to input BAM/CRAM file.")
+    classify_parser.add_argument(
+        "infile", help="Path to input BAM/CRAM file, `-` for the standard input."
+    )
     add_custom_help(classify_parser)
     classify_parser.add_argument(
         "--json",
@@ -56,21 +137,38 @@ def populate_classify_parser(classify_parser: argparse.ArgumentParser) -> None:
         rearrangement will be saved in SAM files in such folder.""",
         metavar="DIR",
     )
+    add_read_count_arguments(classify_parser)
     classify_parser.add_argument(
-        "--total-number-reads",
-        type=int,
-        help="""Number of reads to use for normalisation.
-            If not provided, the total number of unique and mapped reads in the
-            BAM file will be used.""",
-        metavar="INT",
+        "--discordant-index",
+        help="""If provided, discordant and split alignments of the input file are
+        indexed in a single pass, and candidate partner regions of DUX4 are found
+        from this index. The index is saved next to the input file (or in
+        `--count-cache-dir`) and reused by later runs on the same file.""",
+        action="store_true",
     )
     classify_parser.add_argument(
-        "--threads",
-        type=int,
-        help="""Number of threads to use when computing total number of reads
-        in the input file. [DEFAULT=%(default)s]""",
+        "--streaming",
+        help="""If provided, the input file is read once from start to end, in
+        any order and without its index, keeping the reads which may support a
+        rearrangement and counting all reads in the same pass. Implied when the
+        input is read from the standard input.""",
+        action="store_true",
+    )
+    classify_parser.add_argument(
+        "--grouped-by-name",
+        help="""If provided, the input file is grouped by read name (sorted by
+        name or collated, as output by most aligners) and read once like with
+        `--streaming`, keeping whole the read pairs which may support a
+        rearrangement, so that mates are never looked up.""",
+        action="store_true",
+    )
+    classify_parser.add_argument(
+        "--segment-cache-size",
+        type=non_negative_int,
+        help="""Memory in MB used to keep reads of regions which are queried
+        several times, 0 to disable. [DEFAULT=%(default)s]""",
         metavar="INT",
-        default=1,
+        default=defaults.segment_cache_size,
     )
     classify_parser.add_argument(
         "--srpb-threshold",
@@ -108,7 +206,23 @@ def populate_classify_parser(classify_parser: argparse.ArgumentParser) -> None:
         help=argparse.SUPPRESS,
         nargs="*",
         default=[],
-        choices=[x.value for x in request_models.Feature],
+        choices=[request_models.Feature.SPLIT_FROM_TAGS.name],
+    )
+
+
+def populate_extract_parser(extract_parser: argparse.ArgumentParser) -> None:
+    extract_parser.add_argument("infile", help="Path to input BAM/CRAM file.")
+    add_custom_help(extract_parser)
+    extract_parser.add_argument(
+        "--output",
+        help="""Path to the output evidence BAM file, indexed next to it.
+        [DEFAULT=%(default)s]""",
+        default="pelops_evidence.bam",
+        metavar="FILE",
+    )
+    add_read_count_arguments(extract_parser)
+    extract_parser.add_argument(
+        "--silent", help="Disable logging", default=False, action="store_true"
     )
 
 
@@ -125,12 +239,59 @@ class CliController:
         if parsed_args.action == "version":
             introspection = self._interactor_factory.build_introspection_interactor()
             introspection.present_version()
+        elif parsed_args.action == "extract":
+            factory_args = self._get_extract_factory_args(parsed_args)
+            features = self._get_read_count_features(parsed_args)
+            if not parsed_args.silent:
+                features.append(request_models.Feature.WITH_NOTIFICATIONS)
+            extract_request = request_models.ExtractRequest(
+                features=frozenset(features),
+                total_number_of_reads=parsed_args.total_number_reads,
+            )
+            extractor = self._interactor_factory.build_extract_interactor(
+                **factory_args
+            )
+            extractor.extract_evidence(extract_request)
         else:
+            if parsed_args.infile == "-" and parsed_args.export:
+                parser.error("--export requires an input file, not the standard input")
+            conflicts = self._get_streaming_conflicts(parsed_args)
+            if conflicts:
+                parser.error(
+                    f"{', '.join(conflicts)} cannot be used when the input file is "
+                    "read once (--streaming, --grouped-by-name or standard input)"
+                )
             interactor_factory_args = self._get_factory_args(parsed_args, args)
             request = self._get_request(parsed_args)
             interactor = self._interactor_factory.build(**interactor_factory_args)
             interactor.present_rearrangement_evidence(request)
 
+    def _get_streaming_conflicts(self, parsed_args: argparse.Namespace) -> List[str]:
+        """Options which need an indexed input file, or counts and reads kept
+        between runs, given with an input read once from start to end"""
+        is_streamed = (
+            parsed_args.streaming
+            or parsed_args.grouped_by_name
+            or parsed_args.infile == "-"
+        )
+        if not is_streamed:
+            return []
+        result = []
+        if parsed_args.count_mode != "exact":
+            result.append(f"--count-mode {parsed_args.count_mode}")
+        options = [
+            ("--read-count-from", parsed_args.read_count_from is not None),
+            ("--cache-counts", parsed_args.cache_counts),
+            ("--count-cache-dir", parsed_args.count_cache_dir is not None),
+            ("--discordant-index", parsed_args.discordant_index),
+            (
+                "--segment-cache-size",
+                parsed_args.segment_cache_size != defaults.segment_cache_size,
+            ),
+        ]
+        result.extend(name for name, is_given in options if is_given)
+        return result
+
     def _get_factory_args(
         self, parsed_args: argparse.Namespace, args: List[str]
     ) -> Dict[str, Any]:
@@ -139,14 +300,44 @@ class CliController:
         factory_args["output_json"] = pathlib.Path(parsed_args.json)
         factory_args["cli_args"] = args
         factory_args["silent"] = parsed_args.silent
-        if getattr(parsed_args, "threads") is not None:
-            factory_args["number_of_threads"] = int(parsed_args.threads)
+        self._add_read_count_args(parsed_args, factory_args)
         if getattr(parsed_args, "export"):
             factory_args["output_dir"] = pathlib.Path(parsed_args.export)
         if getattr(parsed_args, "filter_regions") is not None:
             factory_args["bedfile"] = pathlib.Path(parsed_args.filter_regions)
+        if parsed_args.grouped_by_name:
+            factory_args["grouped_by_name"] = True
+        elif parsed_args.streaming or parsed_args.infile == "-":
+            factory_args["streaming"] = True
+        if parsed_args.segment_cache_size != defaults.segment_cache_size:
+            factory_args["segment_cache_size"] = (
+                parsed_args.segment_cache_size * 1024 * 1024
+            )
+        return factory_args
+
+    def _get_extract_factory_args(
+        self, parsed_args: argparse.Namespace
+    ) -> Dict[str, Any]:
+        factory_args: Dict[str, Any] = {}
+        factory_args["bam_file"] = pathlib.Path(parsed_args.infile)
+        factory_args["evidence_file"] = pathlib.Path(parsed_args.output)
+        self._add_read_count_args(parsed_args, factory_args)
         return factory_args
 
+    def _add_read_count_args(
+        self, parsed_args: argparse.Namespace, factory_args: Dict[str, Any]
+    ) -> None:
+        if getattr(parsed_args, "threads") is not None:
+            factory_args["number_of_threads"] = int(parsed_args.threads)
+        if getattr(parsed_args, "count_cache_dir") is not None:
+            factory_args["count_cache_dir"] = pathlib.Path(parsed_args.count_cache_dir)
+        elif parsed_args.cache_counts:
+            factory_args["count_cache_dir"] = factory_args["bam_file"].parent
+        if getattr(parsed_args, "reference") is not None:
+            factory_args["reference"] = pathlib.Path(parsed_args.reference)
+        if getattr(parsed_args, "read_count_from") is not None:
+            factory_args["metrics_file"] = pathlib.Path(parsed_args.read_count_from)
+
     def _get_request(
         self, parsed_args: argparse.Namespace
     ) -> request_models.ClassifyRequest:
@@ -162,12 +353,15 @@ class CliController:
             srpb_threshold = minimum_mapping_quality = None
 
         total_number_of_reads = parsed_args.total_number_reads
-        if total_number_of_reads is not None:
-            features.append(request_models.Feature.PROVIDED_READ_COUNT)
+        features.extend(self._get_read_count_features(parsed_args))
         if getattr(parsed_args, "filter_regions") is not None:
             features.append(request_models.Feature.WITH_BLACKLIST)
-        if parsed_args.with_experimental_features:
-            pass  # No experimental features are currently supported
+        if parsed_args.discordant_index:
+            features.append(request_models.Feature.DISCORDANT_INDEX)
+        if getattr(parsed_args, "export"):
+            features.append(request_models.Feature.EXPORT_SEGMENTS)
+        for name in parsed_args.with_experimental_features:
+            features.append(request_models.Feature[name])
         request = request_models.ClassifyRequest(
             features=frozenset(features),
             minimum_mapping_quality=minimum_mapping_quality,
@@ -175,3 +369,19 @@ class CliController:
             total_number_of_reads=total_number_of_reads,
         )
         return request
+
+    def _get_read_count_features(
+        self, parsed_args: argparse.Namespace
+    ) -> List[request_models.Feature]:
+        features = []
+        if parsed_args.total_number_reads is not None:
+            features.append(request_models.Feature.PROVIDED_READ_COUNT)
+        elif parsed_args.read_count_from is not None:
+            features.append(request_models.Feature.METRICS_READ_COUNT)
+        elif parsed_args.count_mode == "index":
+            features.append(request_models.Feature.INDEX_READ_COUNT)
+        elif parsed_args.count_mode == "histogram":
+            features.append(request_models.Feature.HISTOGRAM_READ_COUNT)
+        elif parsed_args.count_mode == "estimate":
+            features.append(request_models.Feature.ESTIMATED_READ_COUNT)
+        return features
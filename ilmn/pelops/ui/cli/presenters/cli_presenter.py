@@ -1,6 +1,6 @@
 import abc
 import dataclasses
-from typing import Iterable, Tuple
+from typing import Iterable, Optional, Tuple
 
 import pysam
 
@@ -95,6 +95,7 @@ class ViewEvidence:
     paired_reads: int
     split_reads: int
     SRPB: float  # spanning read pairs per billion
+    SRPB_error: Optional[float] = None
 
 
 @dataclasses.dataclass
@@ -126,6 +127,8 @@ class ClassificationViewModel:
     program_name: str
     version: str
     cli_command: str
+    count_mode: str = "exact"
+    unique_mapped_reads_error: Optional[int] = None
 
 
 class ClassificationView(abc.ABC):
@@ -158,6 +161,8 @@ class ResultModelConverter:
             program_name=cli_details.program_name,
             version=cli_details.program_version,
             cli_command=cli_details.cli_command,
+            count_mode=result.count_mode.name.lower(),
+            unique_mapped_reads_error=result.unique_mapped_reads_error,
         )
         return view_model
 
@@ -182,7 +187,11 @@ class ResultModelConverter:
 
     def convert_evidence(self, evidence: result_models.ReadsEvidence) -> "ViewEvidence":
         SRPB = round(evidence.SRPB, 2)
-        result = ViewEvidence(evidence.paired, evidence.split, SRPB)
+        if evidence.SRPB_error is None:
+            SRPB_error = None
+        else:
+            SRPB_error = round(evidence.SRPB_error, 2)
+        result = ViewEvidence(evidence.paired, evidence.split, SRPB, SRPB_error)
         return result
 
 
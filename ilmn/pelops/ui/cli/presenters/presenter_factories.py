@@ -28,6 +28,7 @@ class PresenterFactory:
         notification_factory: notifications.NotificationServiceFactory,
         cli_args: Optional[List[str]],
         output_dir: Optional[pathlib.Path] = None,
+        number_of_threads: int = 1,
     ) -> None:
         self._cli_args = cli_args
         self._output_dir = output_dir
@@ -35,7 +36,7 @@ class PresenterFactory:
             json_output_file, notification_factory
         )
         self.__reads_view_factory = view_factories.ReadsViewFactory(
-            bam_template_file, output_dir, notification_factory
+            bam_template_file, output_dir, notification_factory, number_of_threads
         )
 
     def build_classify_presenter(
@@ -1,12 +1,18 @@
 import dataclasses
 import json
 import pathlib
-from typing import Dict
+from typing import Any, Dict, List, Tuple
 
 from ilmn.pelops import notifications
 from ilmn.pelops.ui.cli.presenters import cli_presenter
 
 
+def omit_unknown(items: List[Tuple[str, Any]]) -> Dict[str, Any]:
+    """Fields of a view model, without those left unknown such as the errors of
+    exact counts"""
+    return {key: value for key, value in items if value is not None}
+
+
 class JsonClassificationExportView(cli_presenter.ClassificationView):
     def __init__(self, output: pathlib.Path):
         self._output = output
@@ -15,7 +21,9 @@ class JsonClassificationExportView(cli_presenter.ClassificationView):
         self, result: cli_presenter.ClassificationViewModel
     ) -> None:
         with open(self._output, "w") as fh:
-            json.dump(dataclasses.asdict(result), fh, indent=4)
+            json.dump(
+                dataclasses.asdict(result, dict_factory=omit_unknown), fh, indent=4
+            )
 
     def get_output_file(self) -> pathlib.Path:
         return self._output
@@ -1,6 +1,6 @@
 import copy
 import pathlib
-from typing import Any, Dict, Iterable, List, Optional
+from typing import Any, Dict, Iterable, List
 
 import pysam
 
@@ -12,8 +12,11 @@ def export_to_sam_file(
     segments: Iterable[pysam.AlignedSegment],
     file_path: pathlib.Path,
     template: Dict[Any, Any],
+    number_of_threads: int = 1,
 ) -> None:
-    outfile = pysam.AlignmentFile(str(file_path), "w", header=template)
+    outfile = pysam.AlignmentFile(
+        str(file_path), "w", header=template, threads=max(number_of_threads, 1)
+    )
     for segment in segments:
         if isinstance(segment, pysam.AlignedSegment):
             outfile.write(segment)
@@ -69,9 +72,15 @@ class HeaderManipulator:
 class PysamReadsView(cli_presenter.ReadsView):
     """The Reads View implementation that uses pysam to export reads to file"""
 
-    def __init__(self, template_bam_file: pathlib.Path, output_dir: pathlib.Path):
+    def __init__(
+        self,
+        template_bam_file: pathlib.Path,
+        output_dir: pathlib.Path,
+        number_of_threads: int = 1,
+    ):
         self._template = pysam.AlignmentFile(str(template_bam_file), "rb")
         self._output_dir = output_dir
+        self._number_of_threads = number_of_threads
 
     def update_reads_model(self, model: Iterable[cli_presenter.ReadViewModel]) -> None:
         original_header = self._template.header.to_dict()
@@ -80,7 +89,9 @@ class PysamReadsView(cli_presenter.ReadsView):
             header_manipulator.add_program_details(item)
             header = header_manipulator.get_header()
             file_path = create_named_sam_file(item, self._output_dir)
-            export_to_sam_file(item.segments, file_path, header)
+            export_to_sam_file(
+                item.segments, file_path, header, self._number_of_threads
+            )
 
     def get_ouput_dir(self) -> pathlib.Path:
         return self._output_dir
@@ -67,10 +67,12 @@ class ReadsViewFactory:
         bam_file: pathlib.Path,
         output_dir: Optional[pathlib.Path],
         notification_factory: notifications.NotificationServiceFactory,
+        number_of_threads: int = 1,
     ):
         self.__bam_file = bam_file
         self.__output_dir = output_dir
         self.__notification_factory = notification_factory
+        self.__number_of_threads = number_of_threads
 
     def build(
         self, features: FrozenSet[ClassifyViewFeature]
@@ -80,7 +82,7 @@ class ReadsViewFactory:
         elif not self.__output_dir.exists():
             _raise_missing_directory(self.__output_dir)
         view = pysam_segment_export_view.PysamReadsView(
-            self.__bam_file, self.__output_dir
+            self.__bam_file, self.__output_dir, self.__number_of_threads
         )
         if ClassifyViewFeature.WITH_NOTIFICATIONS in features:
             notification_service = self.__notification_factory.build()
@@ -8,7 +8,11 @@ from ilmn.pelops.callers import (
     region_callers,
     region_pair_callers,
 )
-from ilmn.pelops.infrastructure import blacklist_region_repository, pysam_repositories
+from ilmn.pelops.infrastructure import (
+    blacklist_region_repository,
+    pysam_repositories,
+    streaming_repositories,
+)
 
 # defined in conftest
 # - fixture bedfile
@@ -58,13 +62,18 @@ class TestRegionPairCallerFactory:
 class TestReadCallerFactory:
     testcases = [
         pytest.param(
-            frozenset(), read_callers.SpanningReadsCaller, id="no_notifications"
+            frozenset(), read_callers.BaitSpanningReadsCaller, id="no_notifications"
         ),
         pytest.param(
             frozenset([caller_factories.CallerFeature.WITH_NOTIFICATIONS]),
             notifications.NotifyReadsCaller,
             id="with_notifications",
         ),
+        pytest.param(
+            frozenset([caller_factories.CallerFeature.WITH_SPLIT_FROM_TAGS]),
+            read_callers.TagSpanningReadsCaller,
+            id="with_split_from_tags",
+        ),
     ]
 
     @pytest.mark.parametrize("features, expected", testcases)
@@ -74,6 +83,20 @@ class TestReadCallerFactory:
         )
         assert isinstance(observed, expected)
 
+    def test_build_for_read_pairs(self, bam_file, notification_factory):
+        segment_repo_factory = streaming_repositories.StreamingSegmentRepositoryFactory(
+            bam_file, notification_factory, grouped_by_name=True
+        )
+        factory = caller_factories.ReadCallerFactory(
+            segment_repo_factory, notification_factory
+        )
+        observed = factory.build(
+            minimum_mapping_quality=1,
+            features=frozenset(),
+            total_number_of_reads=None,
+        )
+        assert isinstance(observed, read_callers.TemplateReadsCaller)
+
 
 class TestRearrangementCallerFactory:
     def test_build(self, rearrangemet_caller_factory):
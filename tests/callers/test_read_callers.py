@@ -1,6 +1,8 @@
+from unittest import mock
+
 import pytest
 
-from ilmn.pelops import entities, stores
+from ilmn.pelops import entities, notifications, stores
 from ilmn.pelops.callers import caller_factories, read_callers
 from tests import stubs
 
@@ -49,6 +51,19 @@ class TestNotifyReadsCaller:
         expected = ["Finding evidence for rearrangement."]
         assert expected == observed
 
+    def test_get_spanning_evidence(self):
+        notification_service = mock.Mock()
+        inner = mock.Mock(spec=read_callers.ReadsCaller)
+        inner.get_spanning_evidence.return_value = iter(["first", "second"])
+        read_caller = notifications.NotifyReadsCaller(inner, notification_service)
+        evidence = read_caller.get_spanning_evidence(frozenset(), [frozenset()] * 2)
+        # one notification as each evidence is found
+        notification_service.notify.assert_not_called()
+        assert next(evidence) == "first"
+        assert notification_service.notify.call_count == 1
+        assert list(evidence) == ["second"]
+        assert notification_service.notify.call_count == 2
+
 
 class TestSpanningReadsCaller:
     def test_get_segment_count(self, read_caller, core_dux4_regions, igh_regions):
@@ -64,6 +79,38 @@ class TestSpanningReadsCaller:
         observed = list(read_caller.get_segments_of_spanning_reads())
         assert len(observed) == 2
 
+    def test_get_segments_of_spanning_reads_mates(self, core_dux4_regions, igh_regions):
+        # mates missing from the regions are retrieved at once
+        R1 = entities.ReadOrder.ONE
+        R2 = entities.ReadOrder.TWO
+        repo = stubs.StubPlacedSegmentRepository()
+        for name in ["foo", "bar"]:
+            repo.add_read(entities.PlacedSegment(name, core_dux4_regions, R1))
+            repo.add_read(entities.PlacedSegment(name, igh_regions, R1))
+        mate = entities.PlacedSegment("foo", frozenset(), R2)
+        repo.get_mates = mock.Mock(return_value=[mate, None])
+        read_caller = read_callers.SpanningReadsCaller(repo, [])
+        read_caller.detect_reads_spanning_regions(core_dux4_regions, igh_regions)
+        observed = list(read_caller.get_segments_of_spanning_reads())
+        repo.get_mates.assert_called_once()
+        assert len(repo.get_mates.call_args[0][0]) == 4
+        assert len(observed) == 5
+        assert observed[-1] is mate
+
+    def test_detect_reads_spanning_regions_compact_store(self, segment_repo_factory):
+        # same evidence whichever store holds the read pairs
+        repo = segment_repo_factory.build(frozenset(), None)
+        a_regions = frozenset([entities.GenomicRegion("chr4", 190066935, 190093279)])
+        b_regions = frozenset([entities.GenomicRegion("chr4", 190069300, 190092000)])
+        observed = []
+        for store in (stores.PairedReadStore(), stores.CompactPairedReadStore()):
+            caller = read_callers.SpanningReadsCaller(repo, [], 0, store)
+            caller.detect_reads_spanning_regions(a_regions, b_regions)
+            segments = set(caller.get_segments_of_spanning_reads())
+            observed.append((caller.get_segment_count(), segments))
+        assert observed[0] == observed[1]
+        assert observed[1][0].split == 2359
+
     @pytest.fixture
     def unnamed_region(self):
         result = tuple([entities.GenomicRegion("chr9", 1, 1000)])
@@ -108,3 +155,75 @@ class TestSpanningReadsCaller:
         observed = read_caller.get_segment_count()
         expected = entities.ClassifiedSegmentCount(paired=2, split=0, spanning=2)
         assert observed == expected
+
+
+class TestBaitSpanningReadsCaller:
+    def test_get_spanning_evidence(self, segment_repo_factory, core_dux4_regions):
+        # same evidence as detecting each region pair, reading the bait once
+        repo = segment_repo_factory.build(frozenset(), None)
+        all_b_regions = [
+            frozenset([entities.GenomicRegion("chr14", 105586937, 106879844)]),
+            frozenset([entities.GenomicRegion("chr4", 190069300, 190092000)]),
+            frozenset([entities.GenomicRegion("chr6", 74140000, 74141000)]),
+        ]
+        a_regions = frozenset(core_dux4_regions)
+        caller = read_callers.SpanningReadsCaller(repo, [], 0)
+        expected = list(
+            read_callers.ReadsCaller.get_spanning_evidence(
+                caller, a_regions, all_b_regions
+            )
+        )
+        get = mock.Mock(side_effect=repo.get)
+        with mock.patch.object(repo, "get", get):
+            caller = read_callers.BaitSpanningReadsCaller(repo, [], 0)
+            observed = list(caller.get_spanning_evidence(a_regions, all_b_regions))
+        assert observed == expected
+        assert [counts.spanning for counts, _ in observed] == [1, 2359, 0]
+        assert get.call_count == 1 + len(all_b_regions)
+
+    def test_get_spanning_evidence_notifications(
+        self, read_caller_factory, core_dux4_regions, igh_regions
+    ):
+        features = frozenset([caller_factories.CallerFeature.WITH_NOTIFICATIONS])
+        read_caller = read_caller_factory.build(
+            minimum_mapping_quality=0, features=features, total_number_of_reads=None
+        )
+        list(read_caller.get_spanning_evidence(core_dux4_regions, [igh_regions] * 2))
+        observed = read_caller.notification_service.get_notifications()
+        assert observed == ["Finding evidence for rearrangement."] * 2
+
+
+class TestTagSpanningReadsCaller:
+    @pytest.mark.parametrize("minimum_mapping_quality, split", [(0, 2359), (20, 0)])
+    def test_detect_reads_spanning_regions(
+        self, segment_repo_factory, minimum_mapping_quality, split
+    ):
+        # same evidence as when reading both regions, for reads with tags
+        repo = segment_repo_factory.build(frozenset(), None)
+        a_regions = frozenset([entities.GenomicRegion("chr4", 190066935, 190093279)])
+        b_regions = frozenset([entities.GenomicRegion("chr4", 190069300, 190092000)])
+        callers = [
+            caller_class(repo, [], minimum_mapping_quality)
+            for caller_class in (
+                read_callers.SpanningReadsCaller,
+                read_callers.TagSpanningReadsCaller,
+            )
+        ]
+        for caller in callers:
+            caller.detect_reads_spanning_regions(a_regions, b_regions)
+        expected, observed = [caller.get_segment_count() for caller in callers]
+        assert observed == expected
+        assert observed.split == split
+
+    def test_detect_reads_spanning_regions_without_reading_b(
+        self, segment_repo_factory
+    ):
+        # the supplementary alignment on chr6 is known from the SA tag
+        repo = segment_repo_factory.build(frozenset(), None)
+        repo.get = mock.Mock(side_effect=AssertionError("region read"))
+        a_regions = frozenset([entities.GenomicRegion("chr4", 190066935, 190093279)])
+        b_regions = frozenset([entities.GenomicRegion("chr6", 74140000, 74141000)])
+        caller = read_callers.TagSpanningReadsCaller(repo, [])
+        caller.detect_reads_spanning_regions(a_regions, b_regions)
+        observed = caller.get_segment_count()
+        assert observed == entities.ClassifiedSegmentCount(0, 1, 1)
@@ -1,3 +1,4 @@
+import functools
 import pathlib
 from unittest import mock
 
@@ -6,6 +7,7 @@ import pytest
 from ilmn.pelops import entities, notifications, repositories, selectors
 from ilmn.pelops.callers import (
     caller_factories,
+    read_callers,
     rearrangement_callers,
     region_pair_callers,
     sorters,
@@ -135,6 +137,58 @@ class TestBaitRegionPairCaller:
         assert observed == expected
 
 
+class TestRegionRearrangementCaller:
+    @pytest.fixture
+    def calls(self):
+        """Record the order of calls across mocks"""
+        return mock.Mock()
+
+    @pytest.fixture
+    def caller(self, calls, an_unnamed_genomic_region_set):
+        region_pair = entities.CompoundRegionPair(
+            an_unnamed_genomic_region_set, an_unnamed_genomic_region_set
+        )
+        region_pair_caller = mock.Mock(
+            spec=region_pair_callers.CompoundRegionPairCaller
+        )
+        region_pair_caller.get_compound_region_pairs = mock.Mock(
+            return_value=[region_pair, region_pair]
+        )
+        read_caller = mock.Mock(spec=read_callers.ReadsCaller)
+        read_caller.get_segments_of_spanning_reads = mock.Mock(return_value=[])
+        read_caller.get_segment_count = mock.Mock(
+            return_value=entities.ClassifiedSegmentCount(1, 2, 3)
+        )
+        # region pairs detected one after the other, as by default
+        read_caller.get_spanning_evidence = functools.partial(
+            read_callers.ReadsCaller.get_spanning_evidence, read_caller
+        )
+        reads_counter = mock.Mock(spec=repositories.SegmentCounter)
+        reads_counter.get_number_of_segments = mock.Mock(return_value=1_000_000_000)
+        reads_counter.get_relative_error = mock.Mock(return_value=0.1)
+        calls.attach_mock(read_caller.detect_reads_spanning_regions, "detect")
+        calls.attach_mock(reads_counter.get_number_of_segments, "count")
+        result = rearrangement_callers.RegionRearrangementCaller(
+            read_caller, region_pair_caller, reads_counter
+        )
+        return result
+
+    def test_get_rearrangements(self, caller, calls):
+        observed = list(caller.get_rearrangements())
+        assert [item.srpb for item in observed] == [3, 3]
+        assert [item.srpb_error for item in observed] == pytest.approx([0.3, 0.3])
+        # reads are counted once, after all evidence is collected
+        called = [name for name, _, _ in calls.mock_calls]
+        assert called == ["detect", "detect", "count"]
+
+    def test_collect_evidence(self, caller, calls):
+        multi_caller = rearrangement_callers.MultiRearrangementCaller([caller])
+        multi_caller.collect_evidence()
+        list(multi_caller.get_rearrangements())
+        called = [name for name, _, _ in calls.mock_calls]
+        assert called == ["detect", "detect", "count"]
+
+
 class TestSelectableRearrangementCaller:
     @pytest.fixture
     def provided(self, an_unnamed_genomic_region_set):
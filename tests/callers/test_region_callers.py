@@ -1,3 +1,4 @@
+import collections
 from unittest import mock
 
 import pytest
@@ -7,12 +8,12 @@ from ilmn.pelops.callers import read_callers, region_callers
 from tests import stubs
 
 
-class TestContiguousRegionsCaller:
-    find_contiguous_data = [
-        pytest.param([["chr1", 1001, 2000]], [], id="one region"),
+class TestRegionConsolidationService:
+    merge_data = [
+        pytest.param([["chr1", 1001, 2000]], [["chr1", 1001, 2000]], id="one region"),
         pytest.param(
             [("chr1", 1001, 2000), ("chr1", 2000, 3000)],
-            [[("chr1", 1001, 2000), ("chr1", 2000, 3000)]],
+            [("chr1", 1001, 3000)],
             id="two contiguous regions, overlapping one position",
         ),
         pytest.param(
@@ -22,24 +23,29 @@ class TestContiguousRegionsCaller:
                 ("chr1", 8001, 9000),
                 ("chr1", 12001, 13001),
             ],
-            [[("chr1", 7001, 8000), ("chr1", 8001, 9000)]],
+            [("chr1", 5001, 6000), ("chr1", 7001, 9000), ("chr1", 12001, 13001)],
             id="two contiguous regions, with non contiguous region preceeding and following",
         ),
         pytest.param(
             [("chr1", 1000, 1999), ("chr1", 2000, 3000)],
-            [[("chr1", 1000, 1999), ("chr1", 2000, 3000)]],
+            [("chr1", 1000, 3000)],
             id="two contiguous regions, not overlapping",
         ),
         pytest.param(
             [("chr1", 1000, 1999), ("chrX", 2000, 3000)],
-            [],
+            [("chr1", 1000, 1999), ("chrX", 2000, 3000)],
             id="two regions on different chromosomes, but with contiguous positions",
         ),
         pytest.param(
             (("chr1", 1001, 2000), ("chr1", 2001, 3000), ("chr1", 3001, 4000)),
-            [[("chr1", 1001, 2000), ("chr1", 2001, 3000), ("chr1", 3001, 4000)]],
+            [("chr1", 1001, 4000)],
             id="three contiguous regions",
         ),
+        pytest.param(
+            (("chr1", 3001, 4000), ("chr1", 1001, 2000), ("chr1", 2001, 3000)),
+            [("chr1", 1001, 4000)],
+            id="three unsorted contiguous regions",
+        ),
         pytest.param(
             (
                 ("chr1", 1001, 2000),
@@ -48,10 +54,7 @@ class TestContiguousRegionsCaller:
                 ("chr7", 5001, 6000),
                 ("chr7", 6001, 7000),
             ),
-            [
-                [("chr1", 1001, 2000), ("chr1", 2001, 3000)],
-                [("chr7", 5001, 6000), ("chr7", 6001, 7000)],
-            ],
+            [("chr1", 1001, 3000), ("chr1", 10001, 11000), ("chr7", 5001, 7000)],
             id="two sets of contiguous regions",
         ),
         pytest.param(
@@ -61,26 +64,23 @@ class TestContiguousRegionsCaller:
                 ("chr7", 3001, 4000),
                 ("chr7", 4001, 5000),
             ),
-            [
-                [("chr1", 1001, 2000), ("chr1", 2001, 3000)],
-                [("chr7", 3001, 4000), ("chr7", 4001, 5000)],
-            ],
+            [("chr1", 1001, 3000), ("chr7", 3001, 5000)],
             id="two sets of contiguous regions on different chromosomes",
         ),
+        pytest.param(
+            [("chr1", 1001, 2000), ("chr1", 2002, 3000)],
+            [("chr1", 1001, 2000), ("chr1", 2002, 3000)],
+            id="two regions one base apart",
+        ),
     ]
 
-    @pytest.mark.parametrize("provided, expected", find_contiguous_data)
-    def test_find_contiguous(self, provided, expected):
-        caller = region_callers.ContiguousRegionsCaller()
-        provided_regions = [entities.GenomicRegion(*item) for item in provided]
-        expected_regions = []
-        for block in expected:
-            expected_regions.append([entities.GenomicRegion(*item) for item in block])
-        observed = list(caller.find_contiguous(provided_regions))
-        assert observed == expected_regions
-
+    @pytest.mark.parametrize("provided, expected", merge_data)
+    def test_consolidate_merge(self, provided, expected):
+        counted_regions = [(entities.GenomicRegion(*item), 2) for item in provided]
+        service = region_callers.RegionConsolidationService()
+        observed = service.consolidate(counted_regions)
+        assert observed == [entities.GenomicRegion(*item) for item in expected]
 
-class TestRegionConsolidationService:
     consolidate_data = [
         pytest.param([["chr1", 1000, 2000]], [], id="one region once"),
         pytest.param(
@@ -103,15 +103,24 @@ class TestRegionConsolidationService:
 
     @pytest.mark.parametrize("provided, expected", consolidate_data)
     def test_consolidate(self, provided, expected):
-        provided_regions = [entities.GenomicRegion(*item) for item in provided]
+        counts = collections.Counter(entities.GenomicRegion(*item) for item in provided)
         expected_regions = [entities.GenomicRegion(*item) for item in expected]
         service = region_callers.RegionConsolidationService()
-        for candidate in provided_regions:
-            service.add(candidate)
-        service.consolidate()
-        observed = list(service.get_regions())
+        observed = service.consolidate(counts.items())
         assert observed == expected_regions
 
+    def test_consolidate_parameters(self):
+        counted_regions = [
+            (entities.GenomicRegion("chr1", 1001, 2000), 3),
+            (entities.GenomicRegion("chr1", 3001, 4000), 5),
+            (entities.GenomicRegion("chr1", 6001, 7000), 4),
+        ]
+        service = region_callers.RegionConsolidationService(
+            low_pass_filter=4, merge_gap=2000
+        )
+        observed = service.consolidate(counted_regions)
+        assert observed == [entities.GenomicRegion("chr1", 3001, 7000)]
+
 
 class TestCandidateRegionCaller:
     locationA = frozenset([entities.GenomicRegion("chr4", 190066935, 190093279)])
@@ -260,3 +269,32 @@ class TestCandidateRegionCaller:
         )
         observed = set(caller.get_candidates_regions(provided))
         assert observed == expected
+
+    def test_get_candidate_selects_each_bin_once(self):
+        segment_repo = stubs.StubPlacedSegmentRepository()
+        for position in [12340, 12350, 12360, 44000, 44001]:
+            segment_repo.add_read(self.build_mates("chr1", position))
+        selector = mock.Mock(return_value=True)
+        caller = region_callers.CandidateRegionCaller(segment_repo, [selector])
+        provided = entities.CompoundRegion(
+            name=entities.RegionsName.CoreDUX4, regions=self.locationA
+        )
+        observed = set(caller.get_candidates_regions(provided))
+        assert observed == {
+            entities.GenomicRegion("chr1", 12001, 13000),
+            entities.GenomicRegion("chr1", 44001, 45000),
+        }
+        assert selector.call_count == 2
+
+    def test_get_candidate_region_size(self):
+        segment_repo = stubs.StubPlacedSegmentRepository()
+        for position in [12340, 12350, 13600]:
+            segment_repo.add_read(self.build_mates("chr1", position))
+        caller = region_callers.CandidateRegionCaller(
+            segment_repo, [], region_size=5000, low_pass_filter=3
+        )
+        provided = entities.CompoundRegion(
+            name=entities.RegionsName.CoreDUX4, regions=self.locationA
+        )
+        observed = set(caller.get_candidates_regions(provided))
+        assert observed == {entities.GenomicRegion("chr1", 10001, 15000)}
@@ -1,7 +1,7 @@
 import pytest
 
 from ilmn.pelops.factories import interactor_factories
-from ilmn.pelops.interactors import classify_interactor
+from ilmn.pelops.interactors import classify_interactor, extract_interactor
 from ilmn.pelops.ui.cli.presenters import cli_presenter
 
 
@@ -35,6 +35,23 @@ class TestInteractorFactory:
         )
         assert isinstance(observed, classify_interactor.ClassifyInteractor)
 
+    def test_build_streaming_classify_interactor(self, bam_file, output_json, cli_args):
+        factory = interactor_factories.InteractorFactory()
+        observed = factory.build(
+            bam_file=bam_file,
+            output_json=output_json,
+            cli_args=cli_args,
+            streaming=True,
+        )
+        assert isinstance(observed, classify_interactor.ClassifyInteractor)
+
+    def test_build_extract_interactor(self, bam_file, tmp_path):
+        factory = interactor_factories.InteractorFactory()
+        observed = factory.build_extract_interactor(
+            bam_file=bam_file, evidence_file=tmp_path / "evidence.bam"
+        )
+        assert isinstance(observed, extract_interactor.ExtractInteractor)
+
     def test_build_introspection_interactor(self):
         factory = interactor_factories.InteractorFactory()
         observed = factory.build_introspection_interactor()
@@ -0,0 +1,66 @@
+import os
+
+import pytest
+
+from ilmn.pelops.infrastructure import alignment_files
+
+
+@pytest.fixture
+def region():
+    return ("chr14", 105586437, 106879844)
+
+
+class TestOpenAlignmentFile:
+    def test_open(self, alignment_file, region):
+        with alignment_files.open_alignment_file(alignment_file, "rb", 2) as handle:
+            read = next(handle.fetch(*region))
+        assert read.query_sequence is not None
+
+    def test_open_required_fields(self, alignment_file, region):
+        with alignment_files.open_alignment_file(
+            alignment_file, required_fields=alignment_files.CALLING_FIELDS
+        ) as handle:
+            reads = list(handle.fetch(*region))
+        with alignment_files.open_alignment_file(alignment_file) as handle:
+            expected = list(handle.fetch(*region))
+        assert [(read.query_name, read.flag, read.cigarstring) for read in reads] == [
+            (read.query_name, read.flag, read.cigarstring) for read in expected
+        ]
+        assert [read.get_tags() for read in reads] == [
+            read.get_tags() for read in expected
+        ]
+        # sequences are only skipped when decoding CRAM
+        skipped = [read.query_sequence is None for read in reads]
+        if alignment_file.suffix == ".cram":
+            assert all(skipped)
+        else:
+            assert not any(skipped)
+
+
+class TestGetViewArguments:
+    def test_fasta_file(self, tmp_path):
+        reference = tmp_path / "reference.fa"
+        reference.touch()
+        assert alignment_files.get_view_arguments(reference) == ["-T", str(reference)]
+
+    def test_ref_cache_folder(self, tmp_path):
+        assert alignment_files.get_view_arguments(tmp_path) == []
+        assert alignment_files.get_view_arguments() == []
+
+
+class TestUseLocalReferences:
+    def test_ref_cache_folder(self, tmp_path, monkeypatch):
+        monkeypatch.delenv("REF_PATH", raising=False)
+        monkeypatch.delenv("REF_CACHE", raising=False)
+        alignment_files.use_local_references(tmp_path)
+        expected = f"{tmp_path}/%2s/%2s/%s"
+        assert os.environ["REF_CACHE"] == expected
+        assert os.environ["REF_PATH"] == expected
+
+    def test_fasta_file(self, tmp_path, monkeypatch):
+        fasta = tmp_path / "reference.fa"
+        fasta.touch()
+        monkeypatch.delenv("REF_PATH", raising=False)
+        monkeypatch.setenv("REF_CACHE", "/cache/%2s/%2s/%s")
+        alignment_files.use_local_references(fasta)
+        assert os.environ["REF_PATH"] == "/cache/%2s/%2s/%s"
@@ -0,0 +1,69 @@
+import gzip
+
+import pytest
+
+from ilmn.pelops.infrastructure import alignment_index
+
+# fixtures bam_file, test_folder are located in conftest.py
+
+
+@pytest.fixture
+def bai_file(bam_file):
+    return bam_file.with_name(bam_file.name + ".bai")
+
+
+@pytest.fixture
+def crai_file(test_folder):
+    return test_folder / "data" / "HCC1187BL_IGH_DUX4.cram.crai"
+
+
+class TestReadBaiSamplingUnits:
+    def test_read(self, bai_file):
+        observed = alignment_index.read_bai_sampling_units(bai_file)
+        assert len(observed) == 18054
+        for unit in observed:
+            assert unit.end - unit.start == alignment_index.BAI_WINDOW_SIZE
+            assert unit.start % alignment_index.BAI_WINDOW_SIZE == 0
+            assert unit.size >= 0
+        assert sum(unit.size for unit in observed) > 0
+
+    def test_read_invalid(self, bam_file):
+        with pytest.raises(alignment_index.InvalidIndexError, match="BAI"):
+            alignment_index.read_bai_sampling_units(bam_file)
+
+    def test_read_truncated(self, bai_file, tmp_path):
+        truncated_file = tmp_path / bai_file.name
+        truncated_file.write_bytes(bai_file.read_bytes()[:1000])
+        with pytest.raises(alignment_index.InvalidIndexError, match="truncated"):
+            alignment_index.read_bai_sampling_units(truncated_file)
+
+
+class TestReadCraiSamplingUnits:
+    def test_read(self, crai_file):
+        observed = alignment_index.read_crai_sampling_units(crai_file)
+        assert len(observed) == 2
+        assert all(unit.end > unit.start for unit in observed)
+
+    def test_read_merges_slices_with_same_start(self, tmp_path):
+        crai_file = tmp_path / "test.cram.crai"
+        with gzip.open(crai_file, "wt") as fh:
+            fh.write("0\t101\t50\t0\t0\t10\n")
+            fh.write("0\t101\t80\t0\t0\t20\n")
+            fh.write("0\t201\t50\t0\t0\t30\n")
+            fh.write("-1\t0\t0\t0\t0\t40\n")
+        observed = alignment_index.read_crai_sampling_units(crai_file)
+        expected = [
+            alignment_index.SamplingUnit(0, 100, 200, 30),
+            alignment_index.SamplingUnit(0, 200, 250, 30),
+        ]
+        assert observed == expected
+
+    def test_read_invalid(self, bam_file):
+        with pytest.raises(alignment_index.InvalidIndexError, match="CRAI"):
+            alignment_index.read_crai_sampling_units(bam_file)
+
+
+class TestReadSamplingUnits:
+    def test_unsupported(self, bam_file):
+        with pytest.raises(alignment_index.InvalidIndexError, match="supported"):
+            alignment_index.read_sampling_units(bam_file)
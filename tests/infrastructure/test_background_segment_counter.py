@@ -0,0 +1,34 @@
+from unittest import mock
+
+from ilmn.pelops import repositories
+from ilmn.pelops.infrastructure import background_segment_counter, pysam_repositories
+
+# fixtures bam_file, exclude_flags are located in conftest.py
+
+
+class TestBackgroundSegmentCounter:
+    def test_get_number_of_segments(self, bam_file, exclude_flags):
+        counter = background_segment_counter.BackgroundSegmentCounter(
+            pysam_repositories.BamFileSegmentCounter(bam_file)
+        )
+        counter.start_counting(exclude_flags)
+        assert counter.get_number_of_segments(list(reversed(exclude_flags))) == 9061
+        assert counter.get_relative_error(exclude_flags) is None
+        # not started
+        assert counter.get_number_of_segments([]) == 9216
+
+    def test_start_counting_once(self, bam_file):
+        counter = background_segment_counter.BackgroundSegmentCounter(
+            pysam_repositories.BamFileSegmentCounter(bam_file)
+        )
+        with mock.patch("concurrent.futures.ProcessPoolExecutor") as executor:
+            counter.start_counting()
+            counter.start_counting()
+        executor.return_value.submit.assert_called_once()
+
+    def test_get_number_of_segments_not_started(self):
+        inner_counter = mock.Mock(spec=repositories.SegmentCounter)
+        inner_counter.get_number_of_segments = mock.Mock(return_value=1234)
+        counter = background_segment_counter.BackgroundSegmentCounter(inner_counter)
+        assert counter.get_number_of_segments() == 1234
+        inner_counter.get_number_of_segments.assert_called_once_with(None)
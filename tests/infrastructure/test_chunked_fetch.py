@@ -0,0 +1,67 @@
+import pathlib
+
+import pysam
+import pytest
+
+from ilmn.pelops.infrastructure import chunked_fetch
+
+
+class TestChunkedRegionFetcher:
+    @pytest.fixture
+    def fetcher(self, alignment_file):
+        result = chunked_fetch.ChunkedRegionFetcher(alignment_file, 3)
+        # small chunks, so that many reads straddle chunk boundaries
+        result.chunk_size = 1024
+        yield result
+        result.close()
+
+    @pytest.fixture
+    def spans(self):
+        result = [
+            ("chr4", 190066935, 190093279),
+            ("chr10", 135200000, 135500000),
+            ("chr14", 105586437, 106879844),
+        ]
+        return result
+
+    def get_expected(self, alignment_file, contig, start, end):
+        with pysam.AlignmentFile(str(alignment_file)) as bam_file:
+            result = [
+                segment.to_string() for segment in bam_file.fetch(contig, start, end)
+            ]
+        return result
+
+    @pytest.mark.parametrize(
+        "start, end, expected",
+        [
+            (100, 200, [(100, 200)]),
+            (1000, 3000, [(1000, 1024), (1024, 2048), (2048, 3000)]),
+            (1024, 2048, [(1024, 2048)]),
+        ],
+    )
+    def test_get_chunks(self, start, end, expected):
+        fetcher = chunked_fetch.ChunkedRegionFetcher(pathlib.Path("unused.bam"), 2)
+        fetcher.chunk_size = 1024
+        assert fetcher.get_chunks(start, end) == expected
+
+    def test_fetch(self, fetcher, spans, alignment_file):
+        # every segment once, in file order
+        for span, segments in zip(spans, fetcher.fetch(spans)):
+            observed = [segment.to_string() for _, segment in segments]
+            assert observed == self.get_expected(alignment_file, *span)
+
+    def test_fetch_offsets(self, spans, bam_file):
+        fetcher = chunked_fetch.ChunkedRegionFetcher(bam_file, 3)
+        fetcher.chunk_size = 1024
+        with pysam.AlignmentFile(str(bam_file)) as alignment_file:
+            for segments in fetcher.fetch(spans[:1]):
+                for offset, segment in segments:
+                    alignment_file.seek(offset)
+                    loaded = next(alignment_file)
+                    assert loaded.to_string() == segment.to_string()
+        fetcher.close()
+
+    def test_fetch_skipped_span(self, fetcher, spans, alignment_file):
+        fetched = list(fetcher.fetch(spans))
+        observed = [segment.to_string() for _, segment in fetched[2]]
+        assert observed == self.get_expected(alignment_file, *spans[2])
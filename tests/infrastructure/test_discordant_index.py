@@ -0,0 +1,118 @@
+import pysam
+import pytest
+
+from ilmn.pelops import entities, repositories
+from ilmn.pelops.infrastructure import discordant_index, pysam_repositories
+
+
+@pytest.fixture
+def index_file(tmp_path):
+    return tmp_path / "sample.pelops-discordant.idx"
+
+
+@pytest.fixture
+def discordant_index_file(alignment_file, index_file):
+    return discordant_index.DiscordantIndexFile(alignment_file, index_file)
+
+
+@pytest.fixture
+def core_dux4():
+    regions = repositories.BuiltinRegionRepository().get(entities.RegionsName.CoreDUX4)
+    return regions.regions
+
+
+@pytest.fixture
+def exclude():
+    result = [
+        repositories.ReadQuery.is_duplicate,
+        repositories.ReadQuery.is_not_paired,
+        repositories.ReadQuery.is_proper_pair,
+        repositories.ReadQuery.is_qcfail,
+    ]
+    return result
+
+
+def test_build_and_load(discordant_index_file, alignment_file, index_file):
+    built = discordant_index_file.get()
+    assert index_file.exists()
+    loaded = discordant_index.DiscordantIndexFile(alignment_file, index_file)._load()
+    assert loaded is not None
+    assert len(loaded) == len(built) > 0
+    for name, _ in discordant_index.COLUMNS:
+        assert list(loaded.columns[name]) == list(built.columns[name])
+
+
+def test_load_other_file(discordant_index_file, test_folder, index_file):
+    discordant_index_file.get()
+    other_file = test_folder / "data" / "unmapped_mate_test.bam"
+    index = discordant_index.DiscordantIndexFile(other_file, index_file)
+    assert index._load() is None
+
+
+def test_read_invalid_index(tmp_path):
+    index_file = tmp_path / "invalid.idx"
+    index_file.write_bytes(b"not an index")
+    assert discordant_index.read_index(index_file) is None
+
+
+@pytest.mark.parametrize(
+    "region",
+    [
+        ("chr4", 190066935, 190093279),
+        ("chr10", 133663429, 133685936),
+        ("chr14", 105586437, 106879844),
+    ],
+)
+def test_get_overlapping(discordant_index_file, alignment_file, region):
+    index = discordant_index_file.get()
+    with pysam.AlignmentFile(str(alignment_file)) as handle:
+        tid = handle.get_tid(region[0])
+        expected = [
+            (segment.reference_start, segment.flag, segment.next_reference_start)
+            for segment in handle.fetch(*region)
+            if discordant_index.is_discordant_or_split(
+                segment.flag, segment.has_tag("SA")
+            )
+        ]
+    rows = index.get_overlapping(tid, region[1], region[2])
+    observed = [
+        (
+            index.columns["pos"][row],
+            index.columns["flag"][row],
+            index.columns["mate_pos"][row],
+        )
+        for row in rows
+    ]
+    assert observed == expected
+
+
+def test_get_overlapping_unknown_contig(discordant_index_file):
+    assert discordant_index_file.get().get_overlapping(-1, 0, 100) == []
+
+
+def test_get_mate_positions(discordant_index_file, alignment_file, core_dux4, exclude):
+    counter = pysam_repositories.BamFileSegmentCounter(alignment_file)
+    without_index = pysam_repositories.FilePlacedSegmentRepository(
+        alignment_file, counter
+    )
+    with_index = pysam_repositories.FilePlacedSegmentRepository(
+        alignment_file, counter, discordant_index_file=discordant_index_file
+    )
+    expected = list(without_index.get_mate_positions(core_dux4, exclude))
+    observed = list(with_index.get_mate_positions(core_dux4, exclude))
+    assert len(expected) > 0
+    assert observed == expected
+
+
+def test_build_unsorted(tmp_path, bam_file):
+    unsorted_file = tmp_path / "unsorted.bam"
+    with pysam.AlignmentFile(str(bam_file)) as handle:
+        segments = list(handle.fetch(until_eof=True))
+        with pysam.AlignmentFile(
+            str(unsorted_file), "wb", header=handle.header
+        ) as output:
+            for segment in reversed(segments):
+                output.write(segment)
+    index = discordant_index.DiscordantIndexFile(unsorted_file, tmp_path / "i.idx")
+    with pytest.raises(discordant_index.DiscordantIndexError):
+        index.get()
@@ -0,0 +1,102 @@
+import pysam
+import pytest
+
+from ilmn.pelops import entities, repositories
+from ilmn.pelops.infrastructure import evidence_files, pysam_repositories
+
+
+class TestEvidenceCount:
+    test_cases = [
+        evidence_files.EvidenceCount(9061, 0.0, "EXACT"),
+        evidence_files.EvidenceCount(9000, None, "INDEX"),
+    ]
+
+    @pytest.mark.parametrize("count", test_cases)
+    def test_comment(self, count):
+        comment = count.to_comment()
+        assert evidence_files.EvidenceCount.from_comment(comment) == count
+
+    def test_from_other_comment(self):
+        assert evidence_files.EvidenceCount.from_comment("a comment") is None
+
+
+def test_read_evidence_count_of_alignment_file(alignment_file):
+    assert evidence_files.read_evidence_count(alignment_file) is None
+
+
+class TestEvidenceFileWriter:
+    @pytest.fixture
+    def locations(self):
+        return frozenset([entities.GenomicRegion("chr4", 190066935, 190093279)])
+
+    @pytest.fixture
+    def evidence_file(self, alignment_file, locations, tmp_path):
+        result = tmp_path / "evidence.bam"
+        writer = evidence_files.EvidenceFileWriter(alignment_file, result)
+        writer.add(locations)
+        writer.save(9061, None, "EXACT")
+        return result
+
+    def test_save(self, evidence_file, alignment_file, locations):
+        with pysam.AlignmentFile(str(alignment_file)) as original:
+            region = ("chr4", 190066935, 190093279)
+            names = {segment.query_name for segment in original.fetch(*region)}
+            expected = [
+                segment.to_string()
+                for segment in original.fetch()
+                if segment.query_name in names
+            ]
+        with pysam.AlignmentFile(str(evidence_file)) as evidence:
+            observed = [segment.to_string() for segment in evidence.fetch()]
+        # mates and supplementary alignments out of the locations are saved, in
+        # the test file all alignments of the read pairs
+        assert observed == expected
+        assert len(observed) < 9216
+        count = evidence_files.read_evidence_count(evidence_file)
+        assert count == evidence_files.EvidenceCount(9061, None, "EXACT")
+
+    def test_repository_factory(self, evidence_file, notification_factory):
+        factory = pysam_repositories.PysamSegmentRepositoryFactory(
+            evidence_file, notification_factory
+        )
+        features = frozenset([repositories.SegmentRepoFeature.WITH_NOTIFICATION])
+        counter = factory.build_counter(features, None)
+        assert counter.get_number_of_segments() == 9061
+        assert counter.get_relative_error() is None
+        assert counter.get_count_mode() == "EXACT"
+        assert notification_factory.build().get_notifications() == [
+            "Counting number of unique and mapped reads."
+        ]
+
+    @pytest.mark.parametrize(
+        "feature",
+        [
+            repositories.SegmentRepoFeature.INDEX_STATISTICS,
+            repositories.SegmentRepoFeature.METRICS_FILE,
+        ],
+    )
+    def test_repository_factory_other_count(
+        self, evidence_file, notification_factory, tmp_path, feature
+    ):
+        factory = pysam_repositories.PysamSegmentRepositoryFactory(
+            evidence_file, notification_factory, metrics_file=tmp_path / "metrics"
+        )
+        with pytest.raises(evidence_files.EvidenceFileError, match="count mode exact"):
+            factory.build_counter(frozenset([feature]), None)
+
+
+class TestEvidenceFileSegmentCounter:
+    @pytest.fixture
+    def counter(self, tmp_path):
+        count = evidence_files.EvidenceCount(1000, 0.01, "ESTIMATE")
+        result = evidence_files.EvidenceFileSegmentCounter(tmp_path / "a.bam", count)
+        return result
+
+    def test_get_number_of_segments(self, counter, exclude_flags):
+        assert counter.get_number_of_segments() == 1000
+        assert counter.get_number_of_segments(exclude_flags) == 1000
+        assert counter.get_relative_error() == 0.01
+
+    def test_other_filters(self, counter):
+        with pytest.raises(evidence_files.EvidenceFileError, match="is_duplicate"):
+            counter.get_number_of_segments([repositories.ReadQuery.is_duplicate])
@@ -0,0 +1,138 @@
+import pysam
+import pytest
+
+from ilmn.pelops import repositories
+from ilmn.pelops.infrastructure import metrics_segment_counter
+
+# fixtures alignment_file, bam_file, exclude_flags are located in conftest.py
+
+DRAGEN_METRICS = """MAPPING/ALIGNING SUMMARY,,Total input reads,9196,100.00
+MAPPING/ALIGNING SUMMARY,,Number of duplicate marked reads,118,1.28
+MAPPING/ALIGNING SUMMARY,,Number of unique & mapped reads (excl. duplicate marked reads),9061,98.53
+MAPPING/ALIGNING SUMMARY,,QC-failed reads,0,0.00
+MAPPING/ALIGNING SUMMARY,,Mapped reads,9158,99.59
+MAPPING/ALIGNING SUMMARY,,Unmapped reads,38,0.41
+MAPPING/ALIGNING SUMMARY,,Secondary alignments,0,0.00
+MAPPING/ALIGNING SUMMARY,,Supplementary (chimeric) alignments,20,0.22
+MAPPING/ALIGNING PER RG,HCC1187BL_L1,Total reads in RG,2299,100.00
+MAPPING/ALIGNING PER RG,HCC1187BL_L2,Total reads in RG,2299,100.00
+MAPPING/ALIGNING PER RG,HCC1187BL_L3,Total reads in RG,2299,100.00
+MAPPING/ALIGNING PER RG,HCC1187BL_L4,Total reads in RG,2299,100.00
+"""
+
+
+@pytest.fixture(params=["flagstat", "stats"])
+def samtools_metrics_file(request, alignment_file, tmp_path):
+    command = getattr(pysam, request.param)
+    result = tmp_path / f"metrics.{request.param}"
+    result.write_text(command(str(alignment_file)))
+    return result
+
+
+@pytest.fixture
+def dragen_metrics_file(tmp_path):
+    result = tmp_path / "HCC1187BL.mapping_metrics.csv"
+    result.write_text(DRAGEN_METRICS)
+    return result
+
+
+class TestGetBounds:
+    test_cases = [
+        pytest.param((100, 0, 10), (90, 90), id="no unmapped"),
+        pytest.param((100, 5, 10), (90, 95), id="unmapped may be excluded"),
+        pytest.param((100, 20, 10), (90, 100), id="all excluded may be unmapped"),
+        pytest.param((100, 5, 10, 3), (87, 95), id="several excluded sets"),
+        pytest.param((5, 100, 10), (0, 5), id="more excluded than mapped"),
+    ]
+
+    @pytest.mark.parametrize("provided, expected", test_cases)
+    def test_get_bounds(self, provided, expected):
+        assert metrics_segment_counter.get_bounds(*provided) == expected
+
+
+class TestReadMetrics:
+    def test_read_dragen(self, dragen_metrics_file):
+        observed = metrics_segment_counter.read_metrics(dragen_metrics_file)
+        expected = metrics_segment_counter.AlignmentMetrics(
+            9061,
+            9061,
+            mapped_records=9178,
+            read_groups=frozenset(f"HCC1187BL_L{i}" for i in range(1, 5)),
+        )
+        assert observed == expected
+
+    def test_read_samtools(self, samtools_metrics_file):
+        observed = metrics_segment_counter.read_metrics(samtools_metrics_file)
+        # 21 of the 118 duplicates are unmapped, which neither tool reports
+        expected = metrics_segment_counter.AlignmentMetrics(
+            9040, 9078, total_records=9216, mapped_records=9178
+        )
+        assert observed == expected
+
+    def test_read_samtools_flagstat_before_1_13(self, tmp_path):
+        metrics_file = tmp_path / "metrics.flagstat"
+        metrics_file.write_text(
+            "9216 + 0 in total (QC-passed reads + QC-failed reads)\n"
+            "0 + 0 secondary\n"
+            "20 + 0 supplementary\n"
+            "118 + 0 duplicates\n"
+            "9178 + 0 mapped (99.59% : N/A)\n"
+        )
+        observed = metrics_segment_counter.read_metrics(metrics_file)
+        assert (observed.minimum, observed.maximum) == (9040, 9078)
+
+    def test_read_unknown_format(self, test_folder):
+        bed_file = test_folder / "data" / "blacklist.bed"
+        with pytest.raises(metrics_segment_counter.MetricsFileError, match="format"):
+            metrics_segment_counter.read_metrics(bed_file)
+
+    def test_read_missing_metric(self, tmp_path):
+        metrics_file = tmp_path / "metrics.csv"
+        metrics_file.write_text("MAPPING/ALIGNING SUMMARY,,Total input reads,1,1\n")
+        with pytest.raises(metrics_segment_counter.MetricsFileError, match="missing"):
+            metrics_segment_counter.read_metrics(metrics_file)
+
+
+class TestMetricsFileSegmentCounter:
+    def test_get_number_of_segments_dragen(self, bam_file, dragen_metrics_file):
+        counter = metrics_segment_counter.MetricsFileSegmentCounter(
+            bam_file, dragen_metrics_file
+        )
+        assert counter.get_number_of_segments() == 9061
+        assert counter.get_relative_error() is None
+
+    def test_get_number_of_segments_samtools(
+        self, alignment_file, samtools_metrics_file, exclude_flags
+    ):
+        counter = metrics_segment_counter.MetricsFileSegmentCounter(
+            alignment_file, samtools_metrics_file
+        )
+        observed = counter.get_number_of_segments(exclude_flags)
+        relative_error = counter.get_relative_error(exclude_flags)
+        assert observed == 9059
+        assert abs(observed - 9061) <= observed * relative_error
+
+    def test_get_number_of_segments_other_filters(self, bam_file, dragen_metrics_file):
+        counter = metrics_segment_counter.MetricsFileSegmentCounter(
+            bam_file, dragen_metrics_file
+        )
+        with pytest.raises(metrics_segment_counter.MetricsFileError, match="is_"):
+            counter.get_number_of_segments([repositories.ReadQuery.is_duplicate])
+
+    def test_mismatched_index(self, bam_file, dragen_metrics_file):
+        content = DRAGEN_METRICS.replace("Mapped reads,9158", "Mapped reads,9000")
+        dragen_metrics_file.write_text(content)
+        counter = metrics_segment_counter.MetricsFileSegmentCounter(
+            bam_file, dragen_metrics_file
+        )
+        with pytest.raises(metrics_segment_counter.MetricsFileError, match="9178"):
+            counter.get_number_of_segments()
+
+    def test_mismatched_read_groups(self, bam_file, dragen_metrics_file):
+        content = DRAGEN_METRICS.replace("HCC1187BL_L4", "OTHER_L4")
+        dragen_metrics_file.write_text(content)
+        counter = metrics_segment_counter.MetricsFileSegmentCounter(
+            bam_file, dragen_metrics_file
+        )
+        with pytest.raises(metrics_segment_counter.MetricsFileError, match="OTHER_L4"):
+            counter.get_number_of_segments()
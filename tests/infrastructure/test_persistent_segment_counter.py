@@ -0,0 +1,140 @@
+import concurrent.futures
+import shutil
+from unittest import mock
+
+import pytest
+
+from ilmn.pelops import repositories
+from ilmn.pelops.infrastructure import persistent_segment_counter
+
+# fixtures bam_file, exclude_flags are located in conftest.py
+
+
+@pytest.fixture
+def alignment_file(bam_file, tmp_path):
+    """A copy of the test BAM file and its index we are free to modify"""
+    input_dir = tmp_path / "input"
+    input_dir.mkdir()
+    result = input_dir / bam_file.name
+    shutil.copy(bam_file, result)
+    shutil.copy(str(bam_file) + ".bai", str(result) + ".bai")
+    return result
+
+
+@pytest.fixture
+def cache_dir(tmp_path):
+    result = tmp_path / "cache"
+    result.mkdir()
+    return result
+
+
+def build_counter(count, relative_error=0.0):
+    result = mock.Mock(spec=repositories.SegmentCounter)
+    result.get_number_of_segments = mock.Mock(return_value=count)
+    result.get_relative_error = mock.Mock(return_value=relative_error)
+    return result
+
+
+class TestFindIndexFile:
+    def test_find_index_file(self, alignment_file):
+        observed = persistent_segment_counter.find_index_file(alignment_file)
+        assert observed == alignment_file.with_name(alignment_file.name + ".bai")
+
+    def test_find_no_index_file(self, tmp_path):
+        observed = persistent_segment_counter.find_index_file(tmp_path / "x.bam")
+        assert observed is None
+
+
+class TestPersistentSegmentCounter:
+    def test_get_number_of_segments(self, alignment_file, cache_dir, exclude_flags):
+        first_counter = build_counter(1234)
+        counter = persistent_segment_counter.PersistentSegmentCounter(
+            first_counter, alignment_file, cache_dir, "exact"
+        )
+        assert counter.get_number_of_segments(exclude_flags) == 1234
+        assert len(list(cache_dir.iterdir())) == 1
+
+        # a new run does not count again
+        second_counter = build_counter(5678)
+        counter = persistent_segment_counter.PersistentSegmentCounter(
+            second_counter, alignment_file, cache_dir, "exact"
+        )
+        assert counter.get_number_of_segments(list(reversed(exclude_flags))) == 1234
+        second_counter.get_number_of_segments.assert_not_called()
+
+    def test_get_relative_error(self, alignment_file, cache_dir, exclude_flags):
+        counter = persistent_segment_counter.PersistentSegmentCounter(
+            build_counter(1234, 0.05), alignment_file, cache_dir, "estimate"
+        )
+        assert counter.get_relative_error(exclude_flags) == 0.05
+
+        second_counter = build_counter(5678, 0.5)
+        counter = persistent_segment_counter.PersistentSegmentCounter(
+            second_counter, alignment_file, cache_dir, "estimate"
+        )
+        assert counter.get_number_of_segments(exclude_flags) == 1234
+        assert counter.get_relative_error(exclude_flags) == 0.05
+        second_counter.get_relative_error.assert_not_called()
+
+    invalidation_test_cases = [
+        pytest.param("exclude", id="different exclude"),
+        pytest.param("method", id="different counting method"),
+        pytest.param("alignment", id="modified alignment file"),
+        pytest.param("index", id="modified index file"),
+    ]
+
+    @pytest.mark.parametrize("change", invalidation_test_cases)
+    def test_get_number_of_segments_invalidated(
+        self, alignment_file, cache_dir, exclude_flags, change
+    ):
+        counter = persistent_segment_counter.PersistentSegmentCounter(
+            build_counter(1234), alignment_file, cache_dir, "exact"
+        )
+        counter.get_number_of_segments(exclude_flags)
+
+        method = "exact"
+        if change == "exclude":
+            exclude_flags = exclude_flags[:-1]
+        elif change == "method":
+            method = "index"
+        elif change == "alignment":
+            with open(alignment_file, "ab") as fh:
+                fh.write(b"\0")
+        elif change == "index":
+            with open(str(alignment_file) + ".bai", "ab") as fh:
+                fh.write(b"\0")
+        counter = persistent_segment_counter.PersistentSegmentCounter(
+            build_counter(5678), alignment_file, cache_dir, method
+        )
+        assert counter.get_number_of_segments(exclude_flags) == 5678
+
+    def test_get_number_of_segments_corrupted_cache(self, alignment_file, cache_dir):
+        counter = persistent_segment_counter.PersistentSegmentCounter(
+            build_counter(1234), alignment_file, cache_dir, "exact"
+        )
+        counter.get_number_of_segments()
+        for cache_file in cache_dir.iterdir():
+            cache_file.write_text("{not json")
+        counter = persistent_segment_counter.PersistentSegmentCounter(
+            build_counter(5678), alignment_file, cache_dir, "exact"
+        )
+        assert counter.get_number_of_segments() == 5678
+
+    def test_get_number_of_segments_missing_cache_dir(self, alignment_file, tmp_path):
+        counter = persistent_segment_counter.PersistentSegmentCounter(
+            build_counter(1234), alignment_file, tmp_path / "missing", "exact"
+        )
+        assert counter.get_number_of_segments() == 1234
+
+    def test_get_number_of_segments_concurrent(self, alignment_file, cache_dir):
+        def count(_):
+            counter = persistent_segment_counter.PersistentSegmentCounter(
+                build_counter(1234), alignment_file, cache_dir, "exact"
+            )
+            return counter.get_number_of_segments()
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=8) as executor:
+            observed = list(executor.map(count, range(32)))
+        assert observed == [1234] * 32
+        # no temporary file is left behind
+        assert len(list(cache_dir.iterdir())) == 1
@@ -1,11 +1,22 @@
+import shutil
 import time
 from typing import List
+from unittest import mock
 
 import pysam
 import pytest
 
 from ilmn.pelops import entities, repositories
-from ilmn.pelops.infrastructure import pysam_repositories
+from ilmn.pelops.callers import caller_factories
+from ilmn.pelops.infrastructure import (
+    alignment_files,
+    chunked_fetch,
+    metrics_segment_counter,
+    persistent_segment_counter,
+    pysam_repositories,
+    segment_cache,
+    segment_records,
+)
 
 # fixtures exclude_flags, alignment_file, segment_repo_factory,
 # test_folder  are located in conftest.py
@@ -68,6 +79,102 @@ class TestAnySegmentSelector:
         assert not selector(properly_paired_segment)  # it has no properties queried
 
 
+class TestSegmentFilter:
+    test_cases = [
+        ([], 0, 0, 0),
+        (
+            [repositories.ReadQuery.is_duplicate, repositories.ReadQuery.is_qcfail],
+            0x600,
+            0,
+            0,
+        ),
+        (
+            [repositories.ReadQuery.is_not_paired, repositories.ReadQuery.is_unmapped],
+            0x4,
+            0x1,
+            20,
+        ),
+    ]
+
+    @pytest.mark.parametrize("exclude, excluded, required, quality", test_cases)
+    def test_init(self, exclude, excluded, required, quality):
+        segment_filter = pysam_repositories.SegmentFilter(exclude, quality)
+        assert segment_filter.excluded_flags == excluded
+        assert segment_filter.required_flags == required
+        assert segment_filter.min_quality == quality
+
+    @pytest.fixture
+    def reads(self, alignment_file):
+        with pysam.AlignmentFile(str(alignment_file)) as bam_file:
+            result = list(bam_file.fetch(until_eof=True))
+        return result
+
+    exclude_cases = [
+        [],
+        [repositories.ReadQuery.is_duplicate, repositories.ReadQuery.is_qcfail],
+        [
+            repositories.ReadQuery.is_duplicate,
+            repositories.ReadQuery.is_not_paired,
+            repositories.ReadQuery.is_proper_pair,
+        ],
+    ]
+
+    @pytest.mark.parametrize("exclude", exclude_cases)
+    def test_call(self, reads, exclude):
+        # same selection as the per-read selectors
+        exclude_selector = pysam_repositories.AnySegmentSelector(exclude)
+        quality_selector = pysam_repositories.MapQSelector(minimum_quality=20)
+        expected = [
+            read
+            for read in reads
+            if not exclude_selector(read) and quality_selector(read)
+        ]
+        segment_filter = pysam_repositories.SegmentFilter(exclude, min_quality=20)
+        observed = [read for read in reads if segment_filter(read)]
+        assert observed == expected
+        assert 0 < len(observed) < len(reads)
+
+    @pytest.mark.parametrize("exclude", exclude_cases)
+    def test_matches(self, reads, exclude):
+        segment_filter = pysam_repositories.SegmentFilter(exclude, min_quality=20)
+        expected = [segment_filter(read) for read in reads]
+        observed = [
+            segment_filter.matches(read.flag, read.mapping_quality) for read in reads
+        ]
+        assert observed == expected
+
+    @pytest.mark.benchmark
+    def test_call_performance(self, reads):
+        """Micro-benchmark of the compiled filter against the per-read selectors"""
+        exclude = [
+            repositories.ReadQuery.is_duplicate,
+            repositories.ReadQuery.is_qcfail,
+            repositories.ReadQuery.is_not_paired,
+        ]
+        tic = time.perf_counter()
+        exclude_selector = pysam_repositories.AnySegmentSelector(exclude)
+        quality_selector = pysam_repositories.MapQSelector(minimum_quality=20)
+        for read in reads:
+            not exclude_selector(read) and quality_selector(read)
+        selectors_time = time.perf_counter() - tic
+
+        tic = time.perf_counter()
+        segment_filter = pysam_repositories.SegmentFilter(exclude, min_quality=20)
+        for read in reads:
+            segment_filter(read)
+        filter_time = time.perf_counter() - tic
+        # compiled filter is at least 5 times faster
+        assert filter_time < selectors_time / 5
+
+
+class TestGetReferenceLength:
+    test_cases = [("101M", 101), ("27M74H", 27), ("10S20M5D3I10M2N5S", 37)]
+
+    @pytest.mark.parametrize("cigar, expected", test_cases)
+    def test_get_reference_length(self, cigar, expected):
+        assert pysam_repositories.get_reference_length(cigar) == expected
+
+
 class TestPysamPropertyError:
     def test_message(self):
         with pytest.raises(pysam_repositories.PysamPropertyError) as exc:
@@ -117,6 +224,202 @@ class TestCachedSegmentCounter:
         assert second_time < first_time / 10
 
 
+class TestIndexSegmentCounter:
+    def test_get_number_of_segments(self, alignment_file, exclude_flags):
+        counter = pysam_repositories.IndexSegmentCounter(alignment_file)
+        observed = counter.get_number_of_segments(exclude=exclude_flags)
+        # upper bound of the exact count (9061), as the index only knows
+        # about mapped and unmapped segments
+        assert observed == 9178
+
+    def test_get_number_of_segments_all(self, alignment_file):
+        counter = pysam_repositories.IndexSegmentCounter(alignment_file)
+        observed = counter.get_number_of_segments(exclude=[])
+        assert observed == 9216
+
+
+class TestParallelBamFileSegmentCounter:
+    exclude_test_cases = [
+        pytest.param([], id="nothing"),
+        pytest.param(
+            pysam_repositories.BamFileSegmentCounter.default_filters, id="default"
+        ),
+        pytest.param(
+            [
+                repositories.ReadQuery.is_duplicate,
+                repositories.ReadQuery.is_proper_pair,
+            ],
+            id="duplicates and proper pairs",
+        ),
+    ]
+
+    @pytest.mark.parametrize("exclude", exclude_test_cases)
+    def test_get_number_of_segments(self, alignment_file, exclude):
+        serial = pysam_repositories.BamFileSegmentCounter(alignment_file)
+        parallel = pysam_repositories.ParallelBamFileSegmentCounter(
+            alignment_file, number_of_threads=2
+        )
+        expected = serial.get_number_of_segments(exclude=exclude)
+        observed = parallel.get_number_of_segments(exclude=exclude)
+        assert observed == expected
+
+    def test_count_segments_in_contig(self, bam_file):
+        observed = pysam_repositories.count_segments_in_contig(
+            str(bam_file), 0, "chr14"
+        )
+        assert observed == 3646
+        observed = pysam_repositories.count_segments_in_contig(
+            str(bam_file), 0, "HLA-DRB1*16:02:01"
+        )
+        assert observed == 0
+
+
+class TestSamFlagHistogram:
+    @pytest.fixture
+    def histogram(self):
+        result = pysam_repositories.SamFlagHistogram(mapq_bin_size=10)
+        # flag, mapping quality, contig, count
+        result.add(99, 60, "chr1", 5)  # paired, proper pair
+        result.add(97, 3, "chr1", 2)  # paired, not proper pair
+        result.add(1121, 60, "chr2", 3)  # paired, duplicate
+        result.add(0, 25, "chr2", 1)  # not paired
+        return result
+
+    test_cases = [
+        pytest.param([], 0, None, 11, id="everything"),
+        pytest.param([repositories.ReadQuery.is_duplicate], 0, None, 8, id="dup"),
+        pytest.param(
+            [repositories.ReadQuery.is_not_paired], 0, None, 10, id="not paired"
+        ),
+        pytest.param(
+            [repositories.ReadQuery.is_not_proper_pair], 0, None, 5, id="proper only"
+        ),
+        pytest.param(
+            [
+                repositories.ReadQuery.is_proper_pair,
+                repositories.ReadQuery.is_not_paired,
+            ],
+            0,
+            None,
+            5,
+            id="improper pairs",
+        ),
+        pytest.param([], 20, None, 9, id="minimum mapq"),
+        pytest.param([], 0, {"chr2"}, 4, id="one contig"),
+    ]
+
+    @pytest.mark.parametrize("exclude, min_mapq, contigs, expected", test_cases)
+    def test_count(self, histogram, exclude, min_mapq, contigs, expected):
+        observed = histogram.count(exclude, min_mapq, contigs)
+        assert observed == expected
+
+    def test_count_mapq_not_multiple_of_bin_size(self, histogram):
+        with pytest.raises(ValueError):
+            histogram.count([], minimum_mapping_quality=5)
+
+    def test_update(self, histogram):
+        other = pysam_repositories.SamFlagHistogram(mapq_bin_size=10)
+        other.add(99, 61, "chr1", 1)
+        histogram.update(other)
+        assert histogram.count([]) == 12
+        with pytest.raises(ValueError):
+            histogram.update(pysam_repositories.SamFlagHistogram(mapq_bin_size=1))
+
+    def test_dict_roundtrip(self, histogram):
+        content = histogram.to_dict()
+        observed = pysam_repositories.SamFlagHistogram.from_dict(content)
+        assert observed == histogram
+
+
+class TestFlagHistogramSegmentCounter:
+    exclude_test_cases = [
+        pytest.param([], id="nothing"),
+        pytest.param(
+            pysam_repositories.BamFileSegmentCounter.default_filters, id="default"
+        ),
+        pytest.param(
+            [
+                repositories.ReadQuery.is_duplicate,
+                repositories.ReadQuery.is_proper_pair,
+            ],
+            id="duplicates and proper pairs",
+        ),
+    ]
+
+    @pytest.mark.parametrize("number_of_threads", [1, 2])
+    def test_get_number_of_segments(self, alignment_file, number_of_threads):
+        serial = pysam_repositories.BamFileSegmentCounter(alignment_file)
+        counter = pysam_repositories.FlagHistogramSegmentCounter(
+            alignment_file, number_of_threads
+        )
+        for exclude in [item.values[0] for item in self.exclude_test_cases]:
+            expected = serial.get_number_of_segments(exclude=exclude)
+            observed = counter.get_number_of_segments(exclude=exclude)
+            assert observed == expected
+
+    def test_get_histogram_minimum_mapping_quality(self, bam_file):
+        with pysam.AlignmentFile(str(bam_file)) as fh:
+            expected = len([read for read in fh.fetch() if read.mapping_quality >= 20])
+        counter = pysam_repositories.FlagHistogramSegmentCounter(bam_file)
+        observed = counter.get_histogram().count([], minimum_mapping_quality=20)
+        assert observed == expected
+
+    def test_get_histogram_from_file(self, bam_file, tmp_path):
+        histogram_file = tmp_path / "histogram.json"
+        counter = pysam_repositories.FlagHistogramSegmentCounter(
+            bam_file, histogram_file=histogram_file
+        )
+        expected = counter.get_histogram()
+        assert histogram_file.exists()
+
+        counter = pysam_repositories.FlagHistogramSegmentCounter(
+            bam_file, histogram_file=histogram_file
+        )
+        with mock.patch.object(counter, "_build_histogram") as build_histogram:
+            observed = counter.get_histogram()
+        build_histogram.assert_not_called()
+        assert observed == expected
+
+
+class TestSampledSegmentCounter:
+    @pytest.mark.parametrize("exclude", [[], "default"])
+    def test_get_number_of_segments(self, alignment_file, exclude_flags, exclude):
+        if exclude == "default":
+            exclude = exclude_flags
+        expected = pysam_repositories.BamFileSegmentCounter(
+            alignment_file
+        ).get_number_of_segments(exclude)
+        counter = pysam_repositories.SampledSegmentCounter(alignment_file)
+        observed = counter.get_number_of_segments(exclude)
+        relative_error = counter.get_relative_error(exclude)
+        assert 0 <= relative_error < 0.01
+        assert abs(observed - expected) <= expected * relative_error
+
+    def test_get_number_of_segments_reproducible(self, bam_file):
+        first = pysam_repositories.SampledSegmentCounter(bam_file, 50, seed=1)
+        second = pysam_repositories.SampledSegmentCounter(bam_file, 50, seed=1)
+        assert first.get_number_of_segments() == second.get_number_of_segments()
+        assert first.get_relative_error() == second.get_relative_error()
+
+    def test_get_number_of_segments_without_index(self, bam_file, tmp_path):
+        unindexed_file = tmp_path / bam_file.name
+        shutil.copy(bam_file, unindexed_file)
+        counter = pysam_repositories.SampledSegmentCounter(unindexed_file)
+        with pytest.raises(pysam_repositories.EstimationError, match="index"):
+            counter.get_number_of_segments()
+
+    @pytest.mark.parametrize(
+        "counter_type",
+        [
+            pysam_repositories.BamFileSegmentCounter,
+            pysam_repositories.FlagHistogramSegmentCounter,
+            pysam_repositories.IndexSegmentCounter,
+        ],
+    )
+    def test_get_relative_error_of_exact_counters(self, bam_file, counter_type):
+        assert counter_type(bam_file).get_relative_error() is None
+
+
 class TestPlacedSegmentRepository:
     @pytest.fixture
     def locations(self):
@@ -142,10 +445,154 @@ class TestPlacedSegmentRepository:
         observed = list(segment_repository.get(locations, exclude=query))
         assert len(observed) == 146
 
+    def test_get_records(self, locations, segment_repository, alignment_file):
+        # slim records are returned, and the full reads can be fetched again
+        observed = list(segment_repository.get(locations, exclude=[]))
+        assert all(
+            isinstance(item.content, segment_records.SegmentRecord) for item in observed
+        )
+        with pysam.AlignmentFile(str(alignment_file)) as bam_file:
+            loader = segment_records.SegmentRecordLoader(bam_file)
+            reads = loader.load(item.content for item in observed)
+        assert [item.read_name for item in observed] == [
+            read.query_name for read in reads
+        ]
+
+    def test_get_with_threads(self, locations, segment_repository, alignment_file):
+        fetcher = chunked_fetch.ChunkedRegionFetcher(
+            alignment_file, 4, required_fields=alignment_files.CALLING_FIELDS
+        )
+        repository = pysam_repositories.FilePlacedSegmentRepository(
+            alignment_file, mock.Mock(), chunked_fetcher=fetcher
+        )
+        expected = list(segment_repository.get(locations, exclude=[]))
+        observed = list(repository.get(locations, exclude=[]))
+        fetcher.close()
+        assert observed == expected
+
+    @pytest.mark.benchmark
+    def test_get_throughput_by_threads(self, alignment_file, record_property):
+        """Region fetches return the same reads whatever the number of threads.
+        The throughput is recorded in the properties of the test report"""
+        locations = frozenset(
+            [
+                entities.GenomicRegion("chr14", 105586437, 106879844),
+                entities.GenomicRegion("chr4", 190020000, 190200000),
+                entities.GenomicRegion("chr10", 135200000, 135500000),
+            ]
+        )
+        counts = {}
+        for number_of_threads in [1, 2, 4]:
+            fetcher = None
+            if number_of_threads > 1:
+                fetcher = chunked_fetch.ChunkedRegionFetcher(
+                    alignment_file, number_of_threads
+                )
+            repository = pysam_repositories.FilePlacedSegmentRepository(
+                alignment_file, mock.Mock(), chunked_fetcher=fetcher
+            )
+            tic = time.perf_counter()
+            for _ in range(5):
+                counts[number_of_threads] = len(list(repository.get(locations, [])))
+            elapsed = time.perf_counter() - tic
+            throughput = 5 * counts[number_of_threads] / elapsed
+            record_property(f"reads_per_second_{number_of_threads}", throughput)
+            if fetcher is not None:
+                fetcher.close()
+        assert len(set(counts.values())) == 1
+
+    def test_get_cram_calling_fields(self, test_folder):
+        """CRAM records are decoded without sequences and qualities"""
+        cram_file = test_folder / "data" / "HCC1187BL_IGH_DUX4.cram"
+        region = entities.GenomicRegion("chr14", 105586437, 106879844)
+        handles = []
+        open_file = alignment_files.open_alignment_file
+
+        def open_alignment_file(*args, **kwargs):
+            handle = open_file(*args, **kwargs)
+            handles.append(handle)
+            return handle
+
+        with mock.patch.object(
+            alignment_files,
+            "open_alignment_file",
+            side_effect=open_alignment_file,
+        ):
+            repository = pysam_repositories.FilePlacedSegmentRepository(
+                cram_file, mock.Mock()
+            )
+            assert list(repository.get(frozenset([region]), exclude=[]))
+        assert handles
+        for handle in handles:
+            reads = list(handle.fetch(region.chrom, region.start, region.end))
+            assert reads
+            assert all(read.query_sequence is None for read in reads)
+            assert all(read.query_qualities is None for read in reads)
+
     def test_get_proper_pair_min_quality(self, locations, segment_repository):
         observed = list(segment_repository.get(locations, exclude=[], min_quality=20))
         assert len(observed) == 13
 
+    merge_test_cases = [
+        pytest.param(
+            [("chr4", 190066935, 190080000), ("chr4", 190070000, 190093279)],
+            id="overlapping",
+        ),
+        pytest.param(
+            [("chr4", 190066935, 190080000), ("chr4", 190080500, 190093279)],
+            id="close",
+        ),
+        pytest.param(
+            [("chr4", 190080500, 190093279), ("chr14", 105586937, 105600000)],
+            id="different contigs",
+        ),
+    ]
+
+    @pytest.mark.parametrize("regions", merge_test_cases)
+    def test_get_merged_regions(self, regions, segment_repository):
+        def get_keys(segments):
+            return [
+                (item.read_name, item.content.flag, item.content.pos)
+                for item in segments
+            ]
+
+        regions = [entities.GenomicRegion(*item) for item in regions]
+        expected = set()
+        for region in regions:
+            expected.update(get_keys(segment_repository.get(frozenset([region]), [])))
+        observed = get_keys(segment_repository.get(frozenset(regions), []))
+        assert len(observed) == len(set(observed))
+        assert set(observed) == expected
+
+    def test_get_fetch_blocks(self, segment_repository):
+        regions = [
+            entities.GenomicRegion("chr14", 1000, 2000),
+            entities.GenomicRegion("chr4", 5000, 6000),
+            entities.GenomicRegion("chr4", 1000, 2000),
+            entities.GenomicRegion("chr4", 2500, 3000),
+        ]
+        observed = segment_repository._get_fetch_blocks(frozenset(regions))
+        expected = [[regions[2], regions[3]], [regions[1]], [regions[0]]]
+        assert observed == expected
+
+    def test_get_cached(self, locations, reads_counter, alignment_file):
+        cache = segment_cache.SegmentCache(max_size=100 * 1024 * 1024)
+        first_repository, second_repository = [
+            pysam_repositories.FilePlacedSegmentRepository(
+                alignment_file, reads_counter, cache
+            )
+            for _ in range(2)
+        ]
+        query = [repositories.ReadQuery.is_duplicate]
+        expected = list(first_repository.get(locations, exclude=query))
+        observed = list(second_repository.get(locations, exclude=list(query)))
+        assert observed == expected
+        statistics = cache.get_statistics()
+        assert (statistics.hits, statistics.misses) == (1, 1)
+        # a different query is not served from the cache
+        second_repository.get(locations, exclude=query, min_quality=20)
+        assert cache.get_statistics().misses == 2
+
     test_cases = [
         pytest.param(
             # this is supplementary, so should return None
@@ -236,7 +683,91 @@ class TestPlacedSegmentRepository:
         if observed is None:
             assert expected == observed
         else:
-            assert observed.content == expected
+            assert observed.content == segment_records.SegmentRecord.from_segment(
+                expected
+            )
+
+    def test_get_mate_of_record(self, repository, expected, provided):
+        record = segment_records.SegmentRecord.from_segment(provided.content)
+        provided = entities.PlacedSegment(
+            provided.read_name, frozenset(), provided.read_order, record
+        )
+        observed = repository.get_mate(provided)
+        if observed is None:
+            assert expected == observed
+        else:
+            assert observed.content == segment_records.SegmentRecord.from_segment(
+                expected
+            )
+
+    def test_get_mates(self, segment_repository, locations, alignment_file):
+        # the mate is the primary segment at the mate position
+        reads = list(segment_repository.get(locations, exclude=[]))
+        observed = segment_repository.get_mates(reads)
+        primary = {}
+        with pysam.AlignmentFile(str(alignment_file)) as bam_file:
+            for read in bam_file.fetch(until_eof=True):
+                if not read.is_secondary and not read.is_supplementary:
+                    key = (read.query_name, read.is_read1)
+                    primary[key] = segment_records.SegmentRecord.from_segment(read)
+        assert len(observed) == len(reads)
+        for read, mate in zip(reads, observed):
+            record = read.content
+            expected = primary.get((record.name, not record.flag & 0x40))
+            if (
+                record.flag & pysam_repositories.SamFlag.is_supplementary
+                or expected is None
+                or (expected.tid, expected.pos) != (record.mate_tid, record.mate_pos)
+            ):
+                assert mate is None
+            else:
+                assert mate.content == expected
+        assert any(mate is not None for mate in observed)
+
+    def test_get_with_partners(self, segment_repository, locations):
+        # the mate of this read has no MC tag and is looked up, its supplementary
+        # alignment is known from the SA tag
+        partner_locations = frozenset(
+            [
+                entities.GenomicRegion("chr4", 190069300, 190069320),
+                entities.GenomicRegion("chr4", 190069940, 190069960),
+            ]
+        )
+        observed = [
+            item
+            for item in segment_repository.get_with_partners(
+                frozenset(locations), partner_locations, exclude=[]
+            )
+            if item.location == partner_locations
+        ]
+        names = {item.read_name for item in observed}
+        assert {
+            "HSQ1008:146:C0JD1ACXX:1:1304:12356:58167",
+            "HSQ1008:146:C0JD1ACXX:2:2103:15014:153709",
+        }.issubset(names)
+        contents = {type(item.content) for item in observed}
+        assert contents == {
+            segment_records.SegmentRecord,
+            segment_records.PartnerRecord,
+        }
+
+    def test_get_with_partners_min_quality(self, segment_repository, locations):
+        partner_locations = frozenset([entities.GenomicRegion("chr6", 1, 100000000)])
+        observed = [
+            item
+            for item in segment_repository.get_with_partners(
+                frozenset(locations), partner_locations, [], partner_min_quality=1
+            )
+            if item.location == partner_locations
+        ]
+        assert observed == []
+
+    def test_get_mate_fetch_blocks(self, bam_file):
+        mate_positions = [(3, 5000), (3, 100), (3, 1100), (2, 5100), (3, 100)]
+        with pysam.AlignmentFile(str(bam_file)) as alignment_file:
+            finder = pysam_repositories.PysamMateFinder(alignment_file)
+            observed = finder._get_fetch_blocks(mate_positions)
+        assert observed == [(2, 5100, 5101), (3, 100, 1101), (3, 5000, 5001)]
 
     def test_get_mate_exact_position(self, segment_repository, locations):
         # get a specific read we know about
@@ -271,6 +802,12 @@ class TestSegmentCounterFactory:
             repositories.ProvidedSegmentCounter,
             id="provided counts",
         ),
+        pytest.param(
+            frozenset([repositories.SegmentRepoFeature.INDEX_STATISTICS]),
+            None,
+            repositories.CachedSegmentCounter,
+            id="index statistics",
+        ),
         pytest.param(
             frozenset(
                 [
@@ -293,6 +830,160 @@ class TestSegmentCounterFactory:
         repo = segment_repo_factory.build_counter(features, total_number_of_reads)
         assert isinstance(repo, expected)
 
+    @pytest.mark.parametrize(
+        "features, number_of_threads, counter_name",
+        [
+            (frozenset(), 1, "BamFileSegmentCounter"),
+            (frozenset(), 2, "ParallelBamFileSegmentCounter"),
+            (
+                frozenset([repositories.SegmentRepoFeature.FLAG_HISTOGRAM]),
+                1,
+                "FlagHistogramSegmentCounter",
+            ),
+            (
+                frozenset([repositories.SegmentRepoFeature.SAMPLING]),
+                1,
+                "SampledSegmentCounter",
+            ),
+        ],
+    )
+    def test_build_counter_reference(
+        self,
+        bam_file,
+        notification_factory,
+        tmp_path,
+        features,
+        number_of_threads,
+        counter_name,
+    ):
+        reference = tmp_path / "reference.fa"
+        factory = pysam_repositories.PysamSegmentRepositoryFactory(
+            bam_file, notification_factory, number_of_threads, reference=reference
+        )
+        with mock.patch.object(pysam_repositories, counter_name) as counter:
+            factory.build_counter(features, None)
+        args, kwargs = counter.call_args
+        assert reference in [*args, *kwargs.values()]
+
+    def test_build_counter_metrics_reference(
+        self, bam_file, notification_factory, tmp_path
+    ):
+        reference = tmp_path / "reference.fa"
+        factory = pysam_repositories.PysamSegmentRepositoryFactory(
+            bam_file,
+            notification_factory,
+            metrics_file=tmp_path / "metrics.csv",
+            reference=reference,
+        )
+        features = frozenset([repositories.SegmentRepoFeature.METRICS_FILE])
+        with mock.patch.object(
+            metrics_segment_counter, "MetricsFileSegmentCounter"
+        ) as counter:
+            factory.build_counter(features, None)
+        counter.assert_called_once_with(bam_file, tmp_path / "metrics.csv", reference)
+
+    def test_build_counter_multiple_threads(self, bam_file, notification_factory):
+        factory = pysam_repositories.PysamSegmentRepositoryFactory(
+            bam_file, notification_factory, number_of_threads=2
+        )
+        repo = factory.build_counter(frozenset(), None)
+        assert isinstance(
+            repo.counter.counter, pysam_repositories.ParallelBamFileSegmentCounter
+        )
+        assert repo.get_number_of_segments() == 9061
+
+    def test_build_shares_chunked_fetcher(self, bam_file, notification_factory):
+        factory = pysam_repositories.PysamSegmentRepositoryFactory(
+            bam_file, notification_factory, number_of_threads=2
+        )
+        region = entities.GenomicRegion("chr14", 105586437, 106879844)
+        with mock.patch.object(
+            chunked_fetch.ChunkedRegionFetcher, "close", autospec=True
+        ) as close:
+            first, second = [factory.build(frozenset(), 100) for _ in range(2)]
+            assert list(first.get(frozenset([region]), exclude=[]))
+            assert list(second.get(frozenset([region]), exclude=[]))
+            factory.close()
+        assert close.call_count == 1
+
+    @pytest.mark.parametrize(
+        "features, expected",
+        [
+            (
+                frozenset([repositories.SegmentRepoFeature.WITH_NOTIFICATION]),
+                ["Segment cache: 1 hits, 1 misses, 0 evictions."],
+            ),
+            (frozenset(), []),
+        ],
+    )
+    def test_close_notifies_cache_statistics(
+        self, bam_file, notification_factory, features, expected
+    ):
+        factory = pysam_repositories.PysamSegmentRepositoryFactory(
+            bam_file, notification_factory
+        )
+        region = entities.GenomicRegion("chr14", 105586437, 106879844)
+        for _ in range(2):
+            repository = factory.build(features, 100)
+            list(repository.get(frozenset([region]), exclude=[]))
+        factory.close()
+        notifications = notification_factory.build().get_notifications()
+        assert [item for item in notifications if "cache" in item] == expected
+
+    def test_build_counter_persistent(self, bam_file, notification_factory, tmp_path):
+        factory = pysam_repositories.PysamSegmentRepositoryFactory(
+            bam_file, notification_factory, count_cache_dir=tmp_path
+        )
+        repo = factory.build_counter(frozenset(), None)
+        assert repo.get_number_of_segments() == 9061
+        assert len(list(tmp_path.iterdir())) == 1
+
+    def test_build_counter_flag_histogram(
+        self, bam_file, notification_factory, tmp_path
+    ):
+        factory = pysam_repositories.PysamSegmentRepositoryFactory(
+            bam_file, notification_factory, count_cache_dir=tmp_path
+        )
+        features = frozenset([repositories.SegmentRepoFeature.FLAG_HISTOGRAM])
+        repo = factory.build_counter(features, None)
+        assert isinstance(
+            repo.counter.counter, persistent_segment_counter.PersistentSegmentCounter
+        )
+        assert repo.get_number_of_segments() == 9061
+        histogram_file = tmp_path / f"{bam_file.name}.pelops-flag-histogram.json"
+        assert histogram_file.exists()
+
+    def test_build_counter_index_statistics(self, segment_repo_factory):
+        features = frozenset([repositories.SegmentRepoFeature.INDEX_STATISTICS])
+        repo = segment_repo_factory.build_counter(features, None)
+        assert repo.get_number_of_segments() == 9178
+
+    def test_build_counter_metrics_file(self, bam_file, notification_factory, tmp_path):
+        metrics_file = tmp_path / "metrics.flagstat"
+        metrics_file.write_text(pysam.flagstat(str(bam_file)))
+        factory = pysam_repositories.PysamSegmentRepositoryFactory(
+            bam_file, notification_factory, metrics_file=metrics_file
+        )
+        features = frozenset([repositories.SegmentRepoFeature.METRICS_FILE])
+        repo = factory.build_counter(features, None)
+        assert isinstance(
+            repo.counter, metrics_segment_counter.MetricsFileSegmentCounter
+        )
+
+    def test_build_counter_metrics_file_missing(self, segment_repo_factory):
+        features = frozenset([repositories.SegmentRepoFeature.METRICS_FILE])
+        with pytest.raises(caller_factories.MissingArgumentError):
+            segment_repo_factory.build_counter(features, None)
+
+    def test_build_counter_sampling(self, segment_repo_factory):
+        features = frozenset([repositories.SegmentRepoFeature.SAMPLING])
+        repo = segment_repo_factory.build_counter(features, None)
+        assert isinstance(
+            repo.counter.counter, pysam_repositories.SampledSegmentCounter
+        )
+        relative_error = repo.get_relative_error()
+        assert abs(repo.get_number_of_segments() - 9061) <= 9061 * relative_error
+
     test_cases = [
         pytest.param(
             frozenset(),
@@ -319,3 +1010,42 @@ class TestSegmentCounterFactory:
     ):
         repo = segment_repo_factory.build(features, total_number_of_reads)
         assert isinstance(repo, expected)
+
+    def test_build_discordant_index(self, bam_file, notification_factory, tmp_path):
+        factory = pysam_repositories.PysamSegmentRepositoryFactory(
+            bam_file, notification_factory, count_cache_dir=tmp_path
+        )
+        features = frozenset([repositories.SegmentRepoFeature.DISCORDANT_INDEX])
+        region = entities.GenomicRegion("chr4", 190066935, 190093279)
+        exclude = [
+            repositories.ReadQuery.is_not_paired,
+            repositories.ReadQuery.is_proper_pair,
+            repositories.ReadQuery.is_duplicate,
+        ]
+        for _ in range(2):
+            repo = factory.build(features, None)
+            assert list(repo.get_mate_positions(frozenset([region]), exclude))
+        index_file = tmp_path / f"{bam_file.name}.pelops-discordant.idx"
+        assert list(tmp_path.iterdir()) == [index_file]
+
+    def test_load_segments(self, alignment_file, notification_factory):
+        factory = pysam_repositories.PysamSegmentRepositoryFactory(
+            alignment_file, notification_factory
+        )
+        region = entities.GenomicRegion("chr4", 190066935, 190067935)
+        segments = list(factory.build(frozenset(), 100).get(frozenset([region]), []))
+        missing = entities.PlacedSegment(
+            "missing",
+            frozenset([region]),
+            entities.ReadOrder.ONE,
+            segment_records.PartnerRecord("missing", 0x41, 3, 190066935),
+        )
+        observed = factory.load_segments(segments + [missing])
+        # the partner missing from the file is left out
+        assert [item.read_name for item in observed] == [
+            item.read_name for item in segments
+        ]
+        assert all(isinstance(item.content, pysam.AlignedSegment) for item in observed)
+        assert [item.content.query_name for item in observed] == [
+            item.read_name for item in segments
+        ]
@@ -0,0 +1,53 @@
+import pytest
+
+from ilmn.pelops import entities, repositories
+from ilmn.pelops.infrastructure import segment_cache
+
+
+def build_key(chrom):
+    locations = frozenset([entities.GenomicRegion(chrom, 1, 100)])
+    return locations, frozenset([repositories.ReadQuery.is_duplicate]), 0
+
+
+def build_segments(number):
+    result = [
+        entities.PlacedSegment("read", frozenset(), entities.ReadOrder.ONE)
+        for _ in range(number)
+    ]
+    return result
+
+
+@pytest.fixture
+def segment_size():
+    return segment_cache.estimate_size(build_segments(1)[0])
+
+
+class TestSegmentCache:
+    def test_get(self, segment_size):
+        cache = segment_cache.SegmentCache(10 * segment_size)
+        segments = build_segments(2)
+        assert cache.get(build_key("chr1")) is None
+        cache.put(build_key("chr1"), segments)
+        assert cache.get(build_key("chr1")) is segments
+        expected = segment_cache.CacheStatistics(
+            hits=1, misses=1, evictions=0, size=2 * segment_size
+        )
+        assert cache.get_statistics() == expected
+
+    def test_put_evicts_least_recently_used(self, segment_size):
+        cache = segment_cache.SegmentCache(5 * segment_size)
+        cache.put(build_key("chr1"), build_segments(2))
+        cache.put(build_key("chr2"), build_segments(2))
+        cache.get(build_key("chr1"))
+        cache.put(build_key("chr3"), build_segments(2))
+        assert cache.get(build_key("chr2")) is None
+        assert cache.get(build_key("chr1")) is not None
+        assert cache.get(build_key("chr3")) is not None
+        assert cache.get_statistics().evictions == 1
+        assert cache.get_statistics().size == 4 * segment_size
+
+    def test_put_too_large(self, segment_size):
+        cache = segment_cache.SegmentCache(segment_size)
+        cache.put(build_key("chr1"), build_segments(2))
+        assert cache.get(build_key("chr1")) is None
+        assert cache.get_statistics().size == 0
@@ -0,0 +1,102 @@
+import pysam
+import pytest
+
+from ilmn.pelops.infrastructure import segment_records
+
+# fixtures alignment_file, bam_file are located in conftest.py
+
+
+@pytest.fixture
+def reads(alignment_file):
+    with pysam.AlignmentFile(str(alignment_file)) as bam_file:
+        result = list(bam_file.fetch("chr4", 190066935, 190093279))
+    return result
+
+
+class TestSegmentRecord:
+    def test_from_segment(self, reads):
+        read = reads[0]
+        observed = segment_records.SegmentRecord.from_segment(read, offset=12)
+        assert observed.name == read.query_name
+        assert observed.flag == read.flag
+        assert observed.tid == read.reference_id
+        assert observed.pos == read.reference_start
+        assert observed.mate_tid == read.next_reference_id
+        assert observed.mate_pos == read.next_reference_start
+        assert observed.mapq == read.mapping_quality
+        assert observed.offset == 12
+        assert observed.matches(read)
+        assert not observed.matches(reads[1])
+
+    def test_eq(self):
+        record = segment_records.SegmentRecord("read", 99, 1, 100, offset=1)
+        same = segment_records.SegmentRecord("read", 99, 1, 100, 1, 300, 60, 2)
+        mate = segment_records.SegmentRecord("read", 147, 1, 300)
+        assert record == same
+        assert hash(record) == hash(same)
+        assert record != mate
+        assert len({record, same, mate}) == 2
+
+    def test_slots(self):
+        record = segment_records.SegmentRecord("read", 99, 1, 100)
+        with pytest.raises(AttributeError):
+            record.sequence = "ACGT"
+
+
+class TestSegmentRecordLoader:
+    @pytest.fixture
+    def records(self, alignment_file):
+        result = []
+        with pysam.AlignmentFile(str(alignment_file)) as bam_file:
+            reads = bam_file.fetch("chr4", 190066935, 190093279)
+            while True:
+                offset = -1 if bam_file.is_cram else bam_file.tell()
+                read = next(reads, None)
+                if read is None:
+                    break
+                record = segment_records.SegmentRecord.from_segment(read, offset)
+                result.append(record)
+        return result
+
+    def test_load(self, alignment_file, reads, records):
+        provided = list(reversed(records)) + ["not a record"]
+        with pysam.AlignmentFile(str(alignment_file)) as bam_file:
+            loader = segment_records.SegmentRecordLoader(bam_file)
+            observed = loader.load(provided)
+        assert observed == list(reversed(reads)) + ["not a record"]
+
+    def test_load_wrong_offset(self, alignment_file, reads, records):
+        # the record is found from its position
+        record = records[1]
+        record.offset = records[0].offset
+        with pysam.AlignmentFile(str(alignment_file)) as bam_file:
+            loader = segment_records.SegmentRecordLoader(bam_file)
+            observed = loader.load([record])
+        assert observed == [reads[1]]
+
+    def test_get_fetch_blocks(self, bam_file):
+        records = [
+            segment_records.SegmentRecord("c", 99, 1, 5000),
+            segment_records.SegmentRecord("a", 99, 1, 100),
+            segment_records.SegmentRecord("b", 99, 1, 1100),
+            segment_records.SegmentRecord("d", 99, 2, 5100),
+        ]
+        with pysam.AlignmentFile(str(bam_file)) as alignment_file:
+            loader = segment_records.SegmentRecordLoader(alignment_file)
+            observed = loader._get_fetch_blocks(records)
+        names = [[record.name for record in block] for block in observed]
+        assert names == [["a", "b"], ["c"], ["d"]]
+
+    def test_load_missing(self, bam_file):
+        record = segment_records.SegmentRecord("missing", 99, 3, 190066935)
+        with pysam.AlignmentFile(str(bam_file)) as alignment_file:
+            loader = segment_records.SegmentRecordLoader(alignment_file)
+            with pytest.raises(LookupError):
+                loader.load([record])
+
+    def test_load_missing_partner(self, bam_file):
+        record = segment_records.PartnerRecord("missing", 99, 3, 190066935)
+        with pysam.AlignmentFile(str(bam_file)) as alignment_file:
+            loader = segment_records.SegmentRecordLoader(alignment_file)
+            observed = loader.load([record])
+        assert observed == []
@@ -0,0 +1,189 @@
+import pysam
+import pytest
+
+from ilmn.pelops import entities, repositories
+from ilmn.pelops.callers import read_callers
+from ilmn.pelops.infrastructure import pysam_repositories, streaming_repositories
+
+
+@pytest.fixture
+def unsorted_file(bam_file, tmp_path):
+    """Records of `bam_file` in reverse order, without index"""
+    result = tmp_path / "unsorted.bam"
+    with pysam.AlignmentFile(str(bam_file)) as handle:
+        segments = list(handle.fetch(until_eof=True))
+        with pysam.AlignmentFile(str(result), "wb", header=handle.header) as output:
+            for segment in reversed(segments):
+                output.write(segment)
+    return result
+
+
+@pytest.fixture
+def streaming_factory(unsorted_file, notification_factory):
+    result = streaming_repositories.StreamingSegmentRepositoryFactory(
+        unsorted_file, notification_factory
+    )
+    return result
+
+
+class TestRegionIntervals:
+    @pytest.fixture
+    def intervals(self):
+        regions = [
+            entities.GenomicRegion("chr1", 100, 200),
+            entities.GenomicRegion("chr1", 150, 300),
+            entities.GenomicRegion("chr1", 500, 600),
+        ]
+        return streaming_repositories.RegionIntervals(regions)
+
+    test_cases = [
+        ("chr1", 0, 100, False),
+        ("chr1", 0, 101, True),
+        ("chr1", 250, 260, True),
+        ("chr1", 300, 500, False),
+        ("chr1", 599, 700, True),
+        ("chr2", 100, 200, False),
+    ]
+
+    @pytest.mark.parametrize("chrom, start, end, expected", test_cases)
+    def test_overlaps(self, intervals, chrom, start, end, expected):
+        assert intervals.overlaps(chrom, start, end) == expected
+
+    def test_overlaps_with_margin(self):
+        regions = [entities.GenomicRegion("chr1", 1000, 2000)]
+        intervals = streaming_repositories.RegionIntervals(regions, margin=100)
+        assert intervals.overlaps("chr1", 950, 951)
+        assert not intervals.overlaps("chr1", 2100, 2101)
+
+
+class TestStreamingSegmentRepositoryFactory:
+    def test_build_counter(self, streaming_factory):
+        counter = streaming_factory.build_counter(frozenset(), None)
+        assert counter.get_number_of_segments() == 9061
+        assert counter.get_number_of_segments(exclude=[]) == 9216
+        assert counter.get_relative_error() is None
+        assert counter.get_count_mode() == "EXACT"
+
+    def test_build_counter_provided(self, streaming_factory):
+        features = frozenset([repositories.SegmentRepoFeature.BUILTIN])
+        counter = streaming_factory.build_counter(features, 1234)
+        assert counter.get_number_of_segments() == 1234
+
+    @pytest.mark.parametrize(
+        "name",
+        [
+            entities.RegionsName.CoreDUX4,
+            entities.RegionsName.ExtendedDUX4,
+            entities.RegionsName.IGH,
+        ],
+    )
+    def test_get(self, streaming_factory, bam_file, name):
+        regions = repositories.BuiltinRegionRepository().get(name).regions
+        exclude = [
+            repositories.ReadQuery.is_duplicate,
+            repositories.ReadQuery.is_not_paired,
+            repositories.ReadQuery.is_qcfail,
+        ]
+        counter = pysam_repositories.BamFileSegmentCounter(bam_file)
+        indexed = pysam_repositories.FilePlacedSegmentRepository(bam_file, counter)
+        streamed = streaming_factory.build(frozenset(), None)
+        expected = [item.content.key for item in indexed.get(regions, exclude)]
+        observed = [
+            (
+                item.read_name,
+                item.content.flag,
+                item.content.reference_id,
+                item.content.reference_start,
+            )
+            for item in streamed.get(regions, exclude)
+        ]
+        assert sorted(observed) == sorted(expected)
+
+    def test_get_mate(self, streaming_factory):
+        repository = streaming_factory.build(frozenset(), None)
+        regions = frozenset([entities.GenomicRegion("chr4", 190066935, 190093279)])
+        segments = [
+            item
+            for item in repository.get(regions, [])
+            if not item.content.is_supplementary and item.content.is_paired
+        ]
+        mate = repository.get_mate(segments[0])
+        assert mate is not None
+        assert mate.read_name == segments[0].read_name
+        assert mate.read_order != segments[0].read_order
+
+
+def sort_by_name(bam_file, output_dir):
+    result = output_dir / f"{bam_file.stem}.name_sorted.bam"
+    pysam.sort("-n", "-o", str(result), str(bam_file))
+    return result
+
+
+class TestTemplatePlacedSegmentRepository:
+    @pytest.fixture
+    def template_factory(self, bam_file, tmp_path, notification_factory):
+        result = streaming_repositories.StreamingSegmentRepositoryFactory(
+            sort_by_name(bam_file, tmp_path),
+            notification_factory,
+            grouped_by_name=True,
+        )
+        return result
+
+    @pytest.mark.parametrize(
+        "a_name, b_name",
+        [
+            (entities.RegionsName.CoreDUX4, entities.RegionsName.IGH),
+            (entities.RegionsName.ExtendedDUX4, entities.RegionsName.IGH),
+        ],
+    )
+    def test_get_read_pairs(self, template_factory, bam_file, a_name, b_name):
+        region_repo = repositories.BuiltinRegionRepository()
+        a_regions = region_repo.get(a_name).regions
+        b_regions = region_repo.get(b_name).regions
+        counter = pysam_repositories.BamFileSegmentCounter(bam_file)
+        indexed = read_callers.SpanningReadsCaller(
+            pysam_repositories.FilePlacedSegmentRepository(bam_file, counter),
+            reads_to_exclude=[repositories.ReadQuery.is_duplicate],
+            minimum_mapping_quality=0,
+        )
+        grouped = read_callers.TemplateReadsCaller(
+            template_factory.build(frozenset(), None),
+            reads_to_exclude=[repositories.ReadQuery.is_duplicate],
+            minimum_mapping_quality=0,
+        )
+        for caller in (indexed, grouped):
+            caller.detect_reads_spanning_regions(a_regions, b_regions)
+        assert grouped.get_segment_count() == indexed.get_segment_count()
+        assert grouped.get_segment_count().spanning > 0
+
+    def test_get_unmapped_mate(self, test_folder, tmp_path, notification_factory):
+        bam_file = test_folder / "data" / "unmapped_mate_test.bam"
+        factory = streaming_repositories.StreamingSegmentRepositoryFactory(
+            sort_by_name(bam_file, tmp_path),
+            notification_factory,
+            grouped_by_name=True,
+        )
+        repository = factory.build(frozenset(), None)
+        regions = frozenset([entities.GenomicRegion("chr4", 190174000, 190175000)])
+        (supplementary,) = repository.get(regions, [])
+        mate = repository.get_mate(supplementary)
+        assert mate is not None
+        assert mate.content.is_unmapped
+
+    def test_not_grouped(self, bam_file, notification_factory):
+        factory = streaming_repositories.StreamingSegmentRepositoryFactory(
+            bam_file, notification_factory, grouped_by_name=True
+        )
+        repository = factory.build(frozenset(), None)
+        regions = repositories.BuiltinRegionRepository().get(entities.RegionsName.IGH)
+        with pytest.raises(streaming_repositories.TemplateGroupingError):
+            list(repository.get(regions.regions, []))
+
+
+def test_stream_too_many_segments(unsorted_file):
+    regions = repositories.BuiltinRegionRepository().get(entities.RegionsName.IGH)
+    stream = streaming_repositories.AlignmentStream(
+        unsorted_file, regions.regions, max_segments=10
+    )
+    with pytest.raises(streaming_repositories.StreamingBufferError):
+        stream.get()
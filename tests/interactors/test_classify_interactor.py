@@ -106,6 +106,71 @@ class TestClassifyInteractor:
                     supporting_reads=set(),
                 ),
             ],
+            count_mode=result_models.CountMode.PROVIDED,
         )
         observed = interactor.get_rearrangement_evidence(request)
         assert observed == expected
+
+    @pytest.mark.parametrize(
+        "features, expected",
+        [
+            (frozenset(), None),
+            (frozenset([request_models.Feature.EXPORT_SEGMENTS]), "full content"),
+        ],
+    )
+    def test_get_rearrangement_evidence_loads_segments(
+        self, interactor, segment_repo_factory, features, expected
+    ):
+        # segments are only loaded with their full content to be exported
+        def load_segments(segments):
+            result = [
+                entities.PlacedSegment(
+                    item.read_name, item.location, item.read_order, "full content"
+                )
+                for item in segments
+            ]
+            return result
+
+        segment_repo_factory.load_segments = mock.Mock(side_effect=load_segments)
+        request = request_models.ClassifyRequest(
+            features=features | {request_models.Feature.PROVIDED_READ_COUNT},
+            total_number_of_reads=2_000_000_000,
+        )
+        observed = interactor.get_rearrangement_evidence(request)
+        contents = {
+            item.content
+            for rearrangement in observed.rearrangements
+            for item in rearrangement.supporting_reads
+        }
+        assert contents == {expected}
+
+    def test_get_rearrangement_evidence_counts_in_background(self):
+        calls = mock.Mock()
+        reads_counter = mock.Mock(spec=repositories.SegmentCounter)
+        reads_counter.get_number_of_segments = mock.Mock(return_value=1000)
+        reads_counter.get_relative_error = mock.Mock(return_value=None)
+        reads_counter.get_count_mode = mock.Mock(return_value=None)
+        repo_factory = mock.Mock(spec=repositories.SegmentRepositoryFactory)
+        repo_factory.build_counter = mock.Mock(return_value=reads_counter)
+        caller_factory = mock.Mock(spec=caller_factories.RearrangementCallerFactory)
+        caller_factory.build.return_value.get_rearrangements.return_value = []
+        calls.attach_mock(reads_counter.start_counting, "start_counting")
+        calls.attach_mock(caller_factory.build, "build")
+        interactor = classify_interactor.ClassifyInteractor(
+            mock.Mock(), caller_factory, repo_factory
+        )
+        interactor.get_rearrangement_evidence(request_models.ClassifyRequest())
+        called = [name for name, _, _ in calls.mock_calls]
+        assert called[:2] == ["start_counting", "build"]
+
+    def test_get_rearrangement_evidence_closes_repositories(self):
+        repo_factory = mock.Mock(spec=repositories.SegmentRepositoryFactory)
+        caller_factory = mock.Mock(spec=caller_factories.RearrangementCallerFactory)
+        rearrangement_caller = caller_factory.build.return_value
+        rearrangement_caller.get_rearrangements.side_effect = OSError
+        interactor = classify_interactor.ClassifyInteractor(
+            mock.Mock(), caller_factory, repo_factory
+        )
+        with pytest.raises(OSError):
+            interactor.get_rearrangement_evidence(request_models.ClassifyRequest())
+        repo_factory.close.assert_called_once_with()
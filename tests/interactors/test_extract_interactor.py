@@ -0,0 +1,45 @@
+from unittest import mock
+
+from ilmn.pelops import repositories, request_models
+from ilmn.pelops.interactors import extract_interactor
+from tests import stubs
+
+
+class TestExtractInteractor:
+    def test_extract_evidence(self):
+        calls = mock.Mock()
+        reads_counter = mock.Mock(spec=repositories.SegmentCounter)
+        reads_counter.get_number_of_segments = mock.Mock(return_value=1000)
+        reads_counter.get_relative_error = mock.Mock(return_value=None)
+        reads_counter.get_count_mode = mock.Mock(return_value=None)
+        repo_factory = mock.Mock(spec=repositories.SegmentRepositoryFactory)
+        repo_factory.build_counter = mock.Mock(return_value=reads_counter)
+        evidence_repo = mock.Mock(spec=repositories.EvidenceRepository)
+        calls.attach_mock(reads_counter.start_counting, "start_counting")
+        calls.attach_mock(evidence_repo.add, "add")
+        calls.attach_mock(evidence_repo.save, "save")
+        interactor = extract_interactor.ExtractInteractor(
+            repo_factory, stubs.SmallRegionRepository(), evidence_repo
+        )
+        request = request_models.ExtractRequest(
+            features=frozenset([request_models.Feature.INDEX_READ_COUNT])
+        )
+        interactor.extract_evidence(request)
+
+        repo_factory.build_counter.assert_called_with(
+            frozenset([repositories.SegmentRepoFeature.INDEX_STATISTICS]), None
+        )
+        expected_locations = (
+            stubs.SmallRegionRepository.locationA
+            | stubs.SmallRegionRepository.locationB
+            | stubs.SmallRegionRepository.locationC
+        )
+        # reads are counted while evidence is collected
+        assert [name for name, _, _ in calls.mock_calls] == [
+            "start_counting",
+            "add",
+            "save",
+        ]
+        evidence_repo.add.assert_called_with(expected_locations)
+        evidence_repo.save.assert_called_with(1000, None, "INDEX")
+        repo_factory.close.assert_called_once_with()
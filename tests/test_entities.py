@@ -1,4 +1,5 @@
 import dataclasses
+import random
 from typing import FrozenSet
 
 import pytest
@@ -150,6 +151,23 @@ class TestCompoundRegion:
         with pytest.raises(TypeError):
             assert an_unnamed_genomic_region_set.contains(self.dux4)
 
+    def test_overlap_genomic_region(self):
+        regions = frozenset([self.region_a, self.region_c])
+        region_set = entities.CompoundRegion(self.unnamed, regions)
+        assert region_set.overlaps(entities.GenomicRegion("chr1", 200, 300))
+        assert not region_set.overlaps(entities.GenomicRegion("chr1", 201, 300))
+        assert not region_set.overlaps(entities.GenomicRegion("chr3", 100, 150))
+
+    def test_contain_nested(self):
+        # a long region starting before a short one still contains the query
+        regions = [
+            entities.GenomicRegion("chr1", 1, 10000),
+            entities.GenomicRegion("chr1", 500, 600),
+        ]
+        genome = entities.CompoundRegion(self.unnamed, frozenset(regions))
+        assert genome.contains(entities.GenomicRegion("chr1", 550, 5000))
+        assert not genome.contains(entities.GenomicRegion("chr1", 550, 10001))
+
     def test_is_hashable(self, a_region_set, another_region_set):
         A = entities.CompoundRegion(
             self.dux4, frozenset([self.region_a, self.region_c])
@@ -445,6 +463,35 @@ class TestReadPair:
         assert read_pair.has_improper_pair_across(region_a, region_b) == is_paired
 
 
+class TestRegionIndex:
+    def test_queries_as_linear_scan(self):
+        generator = random.Random(0)
+        regions = []
+        for _ in range(300):
+            start = generator.randrange(10000)
+            regions.append(
+                entities.GenomicRegion(
+                    generator.choice(["chr1", "chr2"]),
+                    start,
+                    start + generator.randrange(500),
+                )
+            )
+        index = entities.RegionIndex(regions)
+        for _ in range(1000):
+            start = generator.randrange(-100, 10600)
+            query = entities.GenomicRegion(
+                generator.choice(["chr1", "chr2", "chr3"]),
+                start,
+                start + generator.randrange(100),
+            )
+            assert index.overlaps(query) == any(
+                query.overlaps(region) for region in regions
+            )
+            assert index.contains(query) == any(
+                query.within(region) for region in regions
+            )
+
+
 class TestCompoundRegionPair:
     def test_get_names(self):
         region_repo = repositories.BuiltinRegionRepository()
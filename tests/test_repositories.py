@@ -1,6 +1,7 @@
 import pytest
 
 from ilmn.pelops import entities, notifications, repositories
+from tests import stubs
 
 # fixuture exclude_flags are located in conftest.py
 
@@ -41,6 +42,23 @@ class TestNotifySegmentCounter:
         assert observed == 1234
 
 
+class TestPlacedSegmentRepository:
+    def test_get_with_partners(self):
+        a = frozenset([entities.GenomicRegion("chr4", 100, 200)])
+        b = frozenset([entities.GenomicRegion("chr14", 100, 200)])
+        repository = stubs.StubPlacedSegmentRepository()
+        segment = entities.PlacedSegment("read", a, entities.ReadOrder.ONE)
+        mate = entities.PlacedSegment("read", b, entities.ReadOrder.TWO)
+        other = entities.PlacedSegment("other", b, entities.ReadOrder.TWO)
+        repository.add_read(segment)
+        repository.add_read(mate, mapping_quality=20)
+        repository.add_read(other, mapping_quality=20)
+        observed = list(
+            repository.get_with_partners(a, b, exclude=[], partner_min_quality=20)
+        )
+        assert observed == [segment, mate]
+
+
 class TestBuiltinRegionRepository:
     @pytest.fixture
     def region_repository(self):
@@ -1,5 +1,8 @@
 import dataclasses
+import gc
+import tracemalloc
 from typing import FrozenSet
+from unittest import mock
 
 import pytest
 
@@ -70,60 +73,90 @@ class TestPairedReadStore:
         )
 
 
-class TestRegionStore:
-    roundtrip_data = [
-        pytest.param(
-            [("chr1", 1000, 2000)], [(("chr1", 1000, 2000), 1)], id="just one region"
-        ),
-        pytest.param(
-            [("chr1", 1000, 2000), ("chr2", 1000, 2000)],
-            [(("chr1", 1000, 2000), 1), (("chr2", 1000, 2000), 1)],
-            id="two sorted regions",
-        ),
-        pytest.param(
-            [("chr2", 1000, 2000), ("chr1", 1000, 2000)],
-            [(("chr1", 1000, 2000), 1), (("chr2", 1000, 2000), 1)],
-            id="two unsorted regions. Different chromosomes",
-        ),
-        pytest.param(
-            [("chr2", 1000, 2000), ("chr1", 1000, 2000), ("chr2", 0, 1000)],
-            [
-                (("chr1", 1000, 2000), 1),
-                (("chr2", 0, 1000), 1),
-                (("chr2", 1000, 2000), 1),
-            ],
-            id="three unsorted regions. Different chromosomes and starts",
-        ),
-        pytest.param(
-            [("chr2", 1000, 2000), ("chr2", 1000, 2000)],
-            [(("chr2", 1000, 2000), 2)],
-            id="one repeted region",
-        ),
-        pytest.param(
-            [
-                ("chr2", 1000, 2000),
-                ("chr2", 0, 1000),
-                ("chr2", 0, 1000),
-                ("chr1", 1000, 2000),
-                ("chr2", 0, 1000),
-            ],
-            [
-                (("chr1", 1000, 2000), 1),
-                (("chr2", 0, 1000), 3),
-                (("chr2", 1000, 2000), 1),
-            ],
-            id="unsorted and repeted regions",
-        ),
-    ]
-
-    @pytest.mark.parametrize("provided, expected", roundtrip_data)
-    def test_add_get_roundtrip(self, provided, expected):
-        provided_regions = [entities.GenomicRegion(*item) for item in provided]
-        expected_counted_regions = [
-            (entities.GenomicRegion(*item), counts) for item, counts in expected
+class TestCompactPairedReadStore(TestPairedReadStore):
+    @pytest.fixture
+    def store(self):
+        result = stores.CompactPairedReadStore()
+        return result
+
+    def test_get_update_read_pair(self, store, paired_segments):
+        # read pairs are built again, with the same segments
+        with pytest.raises(stores.UnknowReadPairError):
+            store.get_read_pair("ABCD")
+        with pytest.raises(stores.UnnamedReadPairError):
+            store.update(entities.ReadPair())
+
+        segment1, segment2 = paired_segments
+        read_pair = entities.ReadPair()
+        read_pair.allocate(segment1)
+        store.update(read_pair)
+        read_pair.allocate(segment2)
+        store.update(read_pair)
+        observed = store.get_read_pair("ABCD")
+        assert set(observed.get_segments()) == {segment1, segment2}
+        assert "ABCD" in store.get_read_names()
+        assert "foobar" not in store.get_read_names()
+
+    def test_update_replaces_segments(self, store, paired_segments):
+        segment1, segment2 = paired_segments
+        read_pair = entities.ReadPair()
+        read_pair.allocate(segment1)
+        read_pair.allocate(segment2)
+        store.update(read_pair)
+        read_pair = entities.ReadPair()
+        read_pair.allocate(segment2)
+        store.update(read_pair)
+        observed = store.get_read_pair("ABCD")
+        assert list(observed.get_segments()) == [segment2]
+        # updating with the same segments keeps them once
+        store.update(observed)
+        assert list(store.get_read_pair("ABCD").get_segments()) == [segment2]
+
+    def test_hash_collision(self, store, paired_segments):
+        segment1, _ = paired_segments
+        other = entities.PlacedSegment("EFGH", segment1.location, segment1.read_order)
+        with mock.patch("ilmn.pelops.stores.hash", create=True, return_value=0):
+            for segment in (segment1, other):
+                read_pair = entities.ReadPair()
+                read_pair.allocate(segment)
+                store.update(read_pair)
+            store.mark_as_spanning(store.get_read_pair("EFGH"))
+            assert list(store.get_read_pair("ABCD").get_segments()) == [segment1]
+            assert list(store.get_read_pair("EFGH").get_segments()) == [other]
+            spanning = [item.get_name() for item in store.get_spanning_reads()]
+        assert spanning == ["EFGH"]
+
+    def test_clear(self, store, paired_segments):
+        read_pair = entities.ReadPair()
+        read_pair.allocate(paired_segments[0])
+        store.update(read_pair)
+        store.mark_as_split(read_pair)
+        store.clear()
+        assert list(store) == []
+        assert store.get_segment_count() == entities.ClassifiedSegmentCount(0, 0, 0)
+
+    def test_memory(self):
+        """Fewer allocations than PairedReadStore for the same read pairs"""
+        region = frozenset([entities.GenomicRegion("chr4", 190066935, 190093279)])
+        segments = [
+            entities.PlacedSegment(
+                f"HSQ1008:146:C0JD1ACXX:3:1304:{i}:174281", region, order
+            )
+            for i in range(5000)
+            for order in (entities.ReadOrder.ONE, entities.ReadOrder.TWO)
         ]
-        store = stores.RegionStore()
-        for region in provided_regions:
-            store.add(region)
-        observed = list(store.get_counted_regions())
-        assert observed == expected_counted_regions
+        peaks = []
+        for store in (stores.PairedReadStore(), stores.CompactPairedReadStore()):
+            tracemalloc.start()
+            for segment in segments:
+                try:
+                    read_pair = store.get_read_pair(segment.read_name)
+                except stores.UnknowReadPairError:
+                    read_pair = entities.ReadPair()
+                read_pair.allocate(segment)
+                store.update(read_pair)
+            gc.collect()
+            peaks.append(tracemalloc.get_traced_memory()[0])
+            tracemalloc.stop()
+        plain, compact = peaks
+        assert compact < plain / 2
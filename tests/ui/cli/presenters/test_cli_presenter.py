@@ -104,7 +104,10 @@ class TestClassificationPresenter:
     def result_model(self):
         evidence = result_models.ReadsEvidence(1, 0, 100)
         result = result_models.ClassifyResult(
-            result_models.ReferenceGenome.GRCh38, 1000000, []
+            result_models.ReferenceGenome.GRCh38,
+            1000000,
+            [],
+            count_mode=result_models.CountMode.INDEX,
         )
         return result
 
@@ -118,6 +121,7 @@ class TestClassificationPresenter:
             program_name="pelops",
             version="0.1.2",
             cli_command="/somewhere/pelops dux4r data/input.bam --json output/results.json",
+            count_mode="index",
         )
         presenter = cli_presenter.ClassificationPresenter(
             classification_view, cli_introspection
@@ -160,6 +164,16 @@ class TestMultiPresenter:
                 {"paired_reads": 1, "split_reads": 0, "SRPB": 100.01},
                 id="2_decimal_rounding",
             ),
+            pytest.param(
+                result_models.ReadsEvidence(1, 0, 100.0099, 1.2345),
+                {
+                    "paired_reads": 1,
+                    "split_reads": 0,
+                    "SRPB": 100.01,
+                    "SRPB_error": 1.23,
+                },
+                id="with_error",
+            ),
         ],
     )
     def test_present_reads_classification(
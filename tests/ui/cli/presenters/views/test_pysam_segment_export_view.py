@@ -10,6 +10,7 @@ at the display does not require running all the business logic side
 
 import copy
 
+import pysam
 import pytest
 
 from ilmn.pelops.ui.cli.presenters import cli_presenter
@@ -72,6 +73,25 @@ class TestPysamReadsView:
         ]
         view.update_reads_model(provided)
 
+    def test_update_reads_model_with_threads(self, bam_file, output_dir):
+        view = pysamview.PysamReadsView(bam_file, output_dir, number_of_threads=2)
+        with pysam.AlignmentFile(str(bam_file)) as alignment_file:
+            segments = list(alignment_file.fetch("chr4", 190066935, 190067935))
+        provided = [
+            cli_presenter.ReadViewModel(
+                id="01",
+                region_names=("foo", "bar"),
+                segments=segments,
+                program_name="pelops",
+                program_version="1.2.42",
+                cli_command="pelops dux4r /path/to/a/file.bam",
+            )
+        ]
+        view.update_reads_model(provided)
+        with pysam.AlignmentFile(str(output_dir / "01_foo-bar.sam")) as exported:
+            observed = [segment.query_name for segment in exported]
+        assert observed == [segment.query_name for segment in segments]
+
 
 class TestHeaderManipulator:
     test_cases = [
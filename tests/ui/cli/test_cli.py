@@ -1,5 +1,8 @@
 """End-to-end test"""
 
+import json
+
+import pysam
 import pytest
 
 from ilmn.pelops import cli
@@ -7,6 +10,18 @@ from ilmn.pelops import cli
 # bam_file is define in conftest
 
 
+def normalise(result):
+    """Results without command line and identifiers, and with lists in a stable
+    order"""
+    if isinstance(result, dict):
+        return {
+            k: normalise(v) for k, v in result.items() if k not in ("cli_command", "id")
+        }
+    if isinstance(result, list):
+        return sorted((normalise(item) for item in result), key=json.dumps)
+    return result
+
+
 class TestMain:
     test_cases = [
         pytest.param({"--export": "output_folder"}, id="with_output_folder"),
@@ -52,3 +67,64 @@ class TestMain:
         provided = ["pelops", "dux4r", str(bam_file)] + json_out + extra_args
         result = cli.main_from_args(provided)
         assert result == 0
+
+    def test_extract_then_call(self, bam_file, tmp_path):
+        evidence_file = tmp_path / "evidence.bam"
+        provided = ["pelops", "extract", "--output", str(evidence_file), str(bam_file)]
+        assert cli.main_from_args(provided) == 0
+        assert evidence_file.with_suffix(".bam.bai").exists()
+        json_out = ["--json", str(tmp_path / "output.json")]
+        provided = ["pelops", "dux4r", str(evidence_file)] + json_out
+        assert cli.main_from_args(provided) == 0
+
+    @pytest.mark.parametrize("mode", ["--streaming", "--grouped-by-name"])
+    def test_streaming_unsorted(self, bam_file, tmp_path, mode):
+        unsorted_file = tmp_path / "unsorted.bam"
+        with pysam.AlignmentFile(str(bam_file)) as handle:
+            segments = list(handle.fetch(until_eof=True))
+            # grouped by read name, in reverse order of their first segment
+            segments.sort(key=lambda item: item.query_name)
+            with pysam.AlignmentFile(
+                str(unsorted_file), "wb", header=handle.header
+            ) as output:
+                for segment in reversed(segments):
+                    output.write(segment)
+        results = []
+        for name, args in [
+            ("indexed.json", [str(bam_file)]),
+            ("streamed.json", [mode, str(unsorted_file)]),
+        ]:
+            json_file = tmp_path / name
+            provided = ["pelops", "dux4r", "--json", str(json_file)] + args
+            assert cli.main_from_args(provided) == 0
+            results.append(json.loads(json_file.read_text()))
+        indexed, streamed = [normalise(result) for result in results]
+        assert streamed == indexed
+
+    def test_streaming_with_index_counts(self, bam_file, tmp_path, capsys):
+        # the index is not read in streaming mode, so its counts are refused
+        json_file = tmp_path / "results.json"
+        provided = ["pelops", "dux4r", "--streaming", "--count-mode", "index"]
+        provided += ["--json", str(json_file), str(bam_file)]
+        with pytest.raises(SystemExit) as exc:
+            cli.main_from_args(provided)
+        assert exc.value.code == 2
+        assert "--count-mode index cannot be used" in capsys.readouterr().err
+        assert not json_file.exists()
+
+    @pytest.mark.parametrize(
+        "count_args, with_errors",
+        [([], False), (["--count-mode", "estimate"], True)],
+    )
+    def test_errors_of_estimates_only(
+        self, bam_file, tmp_path, count_args, with_errors
+    ):
+        json_file = tmp_path / "results.json"
+        provided = ["pelops", "dux4r", "--json", str(json_file), str(bam_file)]
+        assert cli.main_from_args(provided + count_args) == 0
+        result = json.loads(json_file.read_text())
+        assert ("unique_mapped_reads_error" in result) == with_errors
+        assert all(
+            ("SRPB_error" in item["evidence"]) == with_errors
+            for item in result["rearrangements"]
+        )
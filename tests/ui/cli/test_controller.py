@@ -95,6 +95,7 @@ class TestController:
                             request_models.Feature.DUX4_OTHER,
                             request_models.Feature.PROVIDED_READ_COUNT,
                             request_models.Feature.WITH_BLACKLIST,
+                            request_models.Feature.EXPORT_SEGMENTS,
                         ]
                     ),
                     srpb_threshold=5.2,
@@ -119,6 +120,324 @@ class TestController:
             ),
             id="no_dux4_other",
         ),
+        pytest.param(
+            (
+                ["pelops", "dux4r", "bamfile.bam", "--count-mode", "index"],
+                {
+                    "bam_file": pathlib.Path("bamfile.bam"),
+                    "output_json": pathlib.Path("pelops_results.json"),
+                    "number_of_threads": 1,
+                    "silent": False,
+                },
+                request_models.ClassifyRequest(
+                    features=frozenset(
+                        [
+                            request_models.Feature.DUX4_OTHER,
+                            request_models.Feature.INDEX_READ_COUNT,
+                            request_models.Feature.WITH_NOTIFICATIONS,
+                        ]
+                    ),
+                    srpb_threshold=20.0,
+                    minimum_mapping_quality=10,
+                ),
+            ),
+            id="count_from_index",
+        ),
+        pytest.param(
+            (
+                ["pelops", "dux4r", "bamfile.bam", "--count-mode", "histogram"],
+                {
+                    "bam_file": pathlib.Path("bamfile.bam"),
+                    "output_json": pathlib.Path("pelops_results.json"),
+                    "number_of_threads": 1,
+                    "silent": False,
+                },
+                request_models.ClassifyRequest(
+                    features=frozenset(
+                        [
+                            request_models.Feature.DUX4_OTHER,
+                            request_models.Feature.HISTOGRAM_READ_COUNT,
+                            request_models.Feature.WITH_NOTIFICATIONS,
+                        ]
+                    ),
+                    srpb_threshold=20.0,
+                    minimum_mapping_quality=10,
+                ),
+            ),
+            id="count_from_histogram",
+        ),
+        pytest.param(
+            (
+                ["pelops", "dux4r", "bamfile.bam", "--count-mode", "estimate"],
+                {
+                    "bam_file": pathlib.Path("bamfile.bam"),
+                    "output_json": pathlib.Path("pelops_results.json"),
+                    "number_of_threads": 1,
+                    "silent": False,
+                },
+                request_models.ClassifyRequest(
+                    features=frozenset(
+                        [
+                            request_models.Feature.DUX4_OTHER,
+                            request_models.Feature.ESTIMATED_READ_COUNT,
+                            request_models.Feature.WITH_NOTIFICATIONS,
+                        ]
+                    ),
+                    srpb_threshold=20.0,
+                    minimum_mapping_quality=10,
+                ),
+            ),
+            id="count_from_estimate",
+        ),
+        pytest.param(
+            (
+                [
+                    "pelops",
+                    "dux4r",
+                    "bamfile.bam",
+                    "--read-count-from",
+                    "metrics.csv",
+                    "--count-mode",
+                    "estimate",
+                ],
+                {
+                    "bam_file": pathlib.Path("bamfile.bam"),
+                    "output_json": pathlib.Path("pelops_results.json"),
+                    "number_of_threads": 1,
+                    "silent": False,
+                    "metrics_file": pathlib.Path("metrics.csv"),
+                },
+                request_models.ClassifyRequest(
+                    features=frozenset(
+                        [
+                            request_models.Feature.DUX4_OTHER,
+                            request_models.Feature.METRICS_READ_COUNT,
+                            request_models.Feature.WITH_NOTIFICATIONS,
+                        ]
+                    ),
+                    srpb_threshold=20.0,
+                    minimum_mapping_quality=10,
+                ),
+            ),
+            id="count_from_metrics",
+        ),
+        pytest.param(
+            (
+                ["pelops", "dux4r", "file.cram", "--reference", "hg38.fa"],
+                {
+                    "bam_file": pathlib.Path("file.cram"),
+                    "output_json": pathlib.Path("pelops_results.json"),
+                    "number_of_threads": 1,
+                    "silent": False,
+                    "reference": pathlib.Path("hg38.fa"),
+                },
+                request_models.ClassifyRequest(
+                    features=frozenset(
+                        [
+                            request_models.Feature.DUX4_OTHER,
+                            request_models.Feature.WITH_NOTIFICATIONS,
+                        ]
+                    ),
+                    srpb_threshold=20.0,
+                    minimum_mapping_quality=10,
+                ),
+            ),
+            id="reference",
+        ),
+        pytest.param(
+            (
+                ["pelops", "dux4r", "bamfile.bam", "--segment-cache-size", "64"],
+                {
+                    "bam_file": pathlib.Path("bamfile.bam"),
+                    "output_json": pathlib.Path("pelops_results.json"),
+                    "number_of_threads": 1,
+                    "silent": False,
+                    "segment_cache_size": 64 * 1024 * 1024,
+                },
+                request_models.ClassifyRequest(
+                    features=frozenset(
+                        [
+                            request_models.Feature.DUX4_OTHER,
+                            request_models.Feature.WITH_NOTIFICATIONS,
+                        ]
+                    ),
+                    srpb_threshold=20.0,
+                    minimum_mapping_quality=10,
+                ),
+            ),
+            id="segment_cache_size",
+        ),
+        pytest.param(
+            (
+                ["pelops", "dux4r", "bamfile.bam", "--discordant-index"],
+                {
+                    "bam_file": pathlib.Path("bamfile.bam"),
+                    "output_json": pathlib.Path("pelops_results.json"),
+                    "number_of_threads": 1,
+                    "silent": False,
+                },
+                request_models.ClassifyRequest(
+                    features=frozenset(
+                        [
+                            request_models.Feature.DUX4_OTHER,
+                            request_models.Feature.WITH_NOTIFICATIONS,
+                            request_models.Feature.DISCORDANT_INDEX,
+                        ]
+                    ),
+                    srpb_threshold=20.0,
+                    minimum_mapping_quality=10,
+                ),
+            ),
+            id="discordant_index",
+        ),
+        pytest.param(
+            (
+                ["pelops", "dux4r", "bamfile.bam", "--streaming"],
+                {
+                    "bam_file": pathlib.Path("bamfile.bam"),
+                    "output_json": pathlib.Path("pelops_results.json"),
+                    "number_of_threads": 1,
+                    "silent": False,
+                    "streaming": True,
+                },
+                request_models.ClassifyRequest(
+                    features=frozenset(
+                        [
+                            request_models.Feature.DUX4_OTHER,
+                            request_models.Feature.WITH_NOTIFICATIONS,
+                        ]
+                    ),
+                    srpb_threshold=20.0,
+                    minimum_mapping_quality=10,
+                ),
+            ),
+            id="streaming",
+        ),
+        pytest.param(
+            (
+                ["pelops", "dux4r", "-"],
+                {
+                    "bam_file": pathlib.Path("-"),
+                    "output_json": pathlib.Path("pelops_results.json"),
+                    "number_of_threads": 1,
+                    "silent": False,
+                    "streaming": True,
+                },
+                request_models.ClassifyRequest(
+                    features=frozenset(
+                        [
+                            request_models.Feature.DUX4_OTHER,
+                            request_models.Feature.WITH_NOTIFICATIONS,
+                        ]
+                    ),
+                    srpb_threshold=20.0,
+                    minimum_mapping_quality=10,
+                ),
+            ),
+            id="stdin",
+        ),
+        pytest.param(
+            (
+                ["pelops", "dux4r", "bamfile.bam", "--grouped-by-name"],
+                {
+                    "bam_file": pathlib.Path("bamfile.bam"),
+                    "output_json": pathlib.Path("pelops_results.json"),
+                    "number_of_threads": 1,
+                    "silent": False,
+                    "grouped_by_name": True,
+                },
+                request_models.ClassifyRequest(
+                    features=frozenset(
+                        [
+                            request_models.Feature.DUX4_OTHER,
+                            request_models.Feature.WITH_NOTIFICATIONS,
+                        ]
+                    ),
+                    srpb_threshold=20.0,
+                    minimum_mapping_quality=10,
+                ),
+            ),
+            id="grouped_by_name",
+        ),
+        pytest.param(
+            (
+                # fmt: off
+                [
+                    "pelops", "dux4r", "bamfile.bam",
+                    "--with-experimental-features", "SPLIT_FROM_TAGS",
+                ],
+                # fmt: on
+                {
+                    "bam_file": pathlib.Path("bamfile.bam"),
+                    "output_json": pathlib.Path("pelops_results.json"),
+                    "number_of_threads": 1,
+                    "silent": False,
+                },
+                request_models.ClassifyRequest(
+                    features=frozenset(
+                        [
+                            request_models.Feature.DUX4_OTHER,
+                            request_models.Feature.SPLIT_FROM_TAGS,
+                            request_models.Feature.WITH_NOTIFICATIONS,
+                        ]
+                    ),
+                    srpb_threshold=20.0,
+                    minimum_mapping_quality=10,
+                ),
+            ),
+            id="split_from_tags",
+        ),
+        pytest.param(
+            (
+                ["pelops", "dux4r", "/data/bamfile.bam", "--cache-counts"],
+                {
+                    "bam_file": pathlib.Path("/data/bamfile.bam"),
+                    "output_json": pathlib.Path("pelops_results.json"),
+                    "number_of_threads": 1,
+                    "silent": False,
+                    "count_cache_dir": pathlib.Path("/data"),
+                },
+                request_models.ClassifyRequest(
+                    features=frozenset(
+                        [
+                            request_models.Feature.DUX4_OTHER,
+                            request_models.Feature.WITH_NOTIFICATIONS,
+                        ]
+                    ),
+                    srpb_threshold=20.0,
+                    minimum_mapping_quality=10,
+                ),
+            ),
+            id="cache_counts_next_to_input",
+        ),
+        pytest.param(
+            (
+                # fmt: off
+                [
+                    "pelops", "dux4r", "/data/bamfile.bam",
+                    "--cache-counts", "--count-cache-dir", "/cache",
+                ],
+                # fmt: on
+                {
+                    "bam_file": pathlib.Path("/data/bamfile.bam"),
+                    "output_json": pathlib.Path("pelops_results.json"),
+                    "number_of_threads": 1,
+                    "silent": False,
+                    "count_cache_dir": pathlib.Path("/cache"),
+                },
+                request_models.ClassifyRequest(
+                    features=frozenset(
+                        [
+                            request_models.Feature.DUX4_OTHER,
+                            request_models.Feature.WITH_NOTIFICATIONS,
+                        ]
+                    ),
+                    srpb_threshold=20.0,
+                    minimum_mapping_quality=10,
+                ),
+            ),
+            id="cache_counts_in_folder",
+        ),
     ]
 
     @pytest.fixture(params=dispatch_test_cases)
@@ -164,9 +483,104 @@ class TestController:
         with pytest.raises(SystemExit) as exc:
             controller.dispatch(provided)
 
+    def test_negative_segment_cache_size(self, interactor_factory, capsys):
+        provided = ["pelops", "dux4r", "bamfile.bam", "--segment-cache-size", "-1"]
+        controller = controllers.CliController(interactor_factory)
+        with pytest.raises(SystemExit):
+            controller.dispatch(provided)
+        assert "-1 is negative" in capsys.readouterr().err
+        interactor_factory.build.assert_not_called()
+
+    def test_export_from_stdin(self, interactor_factory):
+        provided = ["pelops", "dux4r", "-", "--export", "output_dir"]
+        controller = controllers.CliController(interactor_factory)
+        with pytest.raises(SystemExit):
+            controller.dispatch(provided)
+
+    @pytest.mark.parametrize(
+        "options",
+        [
+            ["--count-mode", "index"],
+            ["--read-count-from", "metrics.csv"],
+            ["--cache-counts"],
+            ["--count-cache-dir", "cache"],
+            ["--discordant-index"],
+            ["--segment-cache-size", "10"],
+        ],
+    )
+    @pytest.mark.parametrize(
+        "infile",
+        [["bamfile.bam", "--streaming"], ["bamfile.bam", "--grouped-by-name"], ["-"]],
+    )
+    def test_streaming_conflicts(self, interactor_factory, infile, options, capsys):
+        provided = ["pelops", "dux4r"] + infile + options
+        controller = controllers.CliController(interactor_factory)
+        with pytest.raises(SystemExit):
+            controller.dispatch(provided)
+        assert options[0] in capsys.readouterr().err
+        interactor_factory.build.assert_not_called()
+
     def test_version(self, interactor_factory, introspection_interactor):
         controller = controllers.CliController(interactor_factory)
         provided = ["pelops", "version"]
         controller.dispatch(provided)
         interactor_factory.build_introspection_interactor.assert_called_with()
         introspection_interactor.present_version.assert_called_once()
+
+    extract_test_cases = [
+        pytest.param(
+            (
+                ["pelops", "extract", "bamfile.bam"],
+                {
+                    "bam_file": pathlib.Path("bamfile.bam"),
+                    "evidence_file": pathlib.Path("pelops_evidence.bam"),
+                    "number_of_threads": 1,
+                },
+                request_models.ExtractRequest(
+                    features=frozenset([request_models.Feature.WITH_NOTIFICATIONS])
+                ),
+            ),
+            id="default",
+        ),
+        pytest.param(
+            (
+                [
+                    "pelops",
+                    "extract",
+                    "bamfile.cram",
+                    "--output",
+                    "evidence.bam",
+                    "--count-mode",
+                    "histogram",
+                    "--cache-counts",
+                    "--threads",
+                    "4",
+                    "--reference",
+                    "hg38.fa",
+                    "--silent",
+                ],
+                {
+                    "bam_file": pathlib.Path("bamfile.cram"),
+                    "evidence_file": pathlib.Path("evidence.bam"),
+                    "number_of_threads": 4,
+                    "count_cache_dir": pathlib.Path("."),
+                    "reference": pathlib.Path("hg38.fa"),
+                },
+                request_models.ExtractRequest(
+                    features=frozenset([request_models.Feature.HISTOGRAM_READ_COUNT])
+                ),
+            ),
+            id="all_options",
+        ),
+    ]
+
+    @pytest.mark.parametrize("extract_test_case", extract_test_cases)
+    def test_dispatch_extract(self, extract_test_case, interactor_factory):
+        provided, interactor_factory_args, request_model = extract_test_case
+        controller = controllers.CliController(interactor_factory)
+        controller.dispatch(provided)
+        interactor_factory.build_extract_interactor.assert_called_with(
+            **interactor_factory_args
+        )
+        extractor = interactor_factory.build_extract_interactor.return_value
+        extractor.extract_evidence.assert_called_with(request_model)